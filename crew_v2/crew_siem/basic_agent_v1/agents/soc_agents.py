@@ -1,6 +1,5 @@
 
 from crewai import Agent, LLM
-from langchain_google_genai import ChatGoogleGenerativeAI
 import os
 
 
@@ -1,16 +1,19 @@
-from crewai import Crew
-from tasks.siem_tasks import tasks
-from agents.soc_agents import investigator, correlator, responder, reporter
+def build_crew():
+    # crewai, the agents/tasks and their Gemini LLM are only loaded when the crew is built
+    from crewai import Crew
+    from tasks.siem_tasks import tasks
+    from agents.soc_agents import investigator, correlator, responder, reporter
 
-# Define the Crew (team of agents)
-siem_crew = Crew(
-    agents=[investigator, correlator, responder, reporter],
-    tasks=tasks,
-    verbose=True
-)
+    # Define the Crew (team of agents)
+    return Crew(
+        agents=[investigator, correlator, responder, reporter],
+        tasks=tasks,
+        verbose=True
+    )
 
 if __name__ == "__main__":
     print("\n🚀 Starting SIEM Incident Investigation Crew...\n")
+    siem_crew = build_crew()
     result = siem_crew.kickoff()
     print("\n✅ Final Output:\n")
-    print(result)
\ No newline at end of file
+    print(result)
@@ -0,0 +1,87 @@
+"""
+Cold-start import budget for every entry point.
+
+Each entry module is imported in a fresh interpreter (with its own project
+directory on the path, the way `uv run python <entry>.py` sees it) and the
+wall time is compared against its budget. The probe runs in a scratch working
+directory, so import-time side effects such as the siem_tasks log file
+handler don't touch the tree. Heavy dependencies (torch/sentence-transformers,
+pymilvus, crewai/litellm) must stay deferred until first use, so a regression
+shows up here as a blown budget.
+
+Usage:
+    python check_import_budget.py            # exit code 1 if any entry point is over budget
+    python check_import_budget.py --runs 5   # best-of-N timing
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# (project dir, module, budget in seconds on top of a bare interpreter start)
+ENTRY_POINTS = [
+    ("soc_automation_v2", "tasks.siem_tasks", 1.0),
+    ("soc_automation_v2", "query_milvus", 0.5),
+    ("milvus_rag_v3", "main_rag", 0.5),
+    ("soc_rag_llm_v4", "main", 0.5),
+    ("siem_rag_llm_v5", "main", 0.5),
+]
+
+# Modules that must not be imported as a side effect of importing an entry point
+FORBIDDEN = ("torch", "sentence_transformers", "onnxruntime", "pymilvus", "crewai", "litellm")
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+loaded = [m for m in {forbidden!r} if m in sys.modules]
+print(json.dumps([elapsed, loaded]))
+"""
+
+def measure(project, module, runs):
+    path = os.path.join(HERE, project)
+    best = None
+    loaded = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as scratch:
+            proc = subprocess.run(
+                [sys.executable, "-c", PROBE.format(module=module, forbidden=FORBIDDEN)],
+                cwd=scratch, capture_output=True, text=True,
+                env={**os.environ, "PYTHONPATH": path, "PYTHONDONTWRITEBYTECODE": "1"},
+            )
+        if proc.returncode != 0:
+            err = proc.stderr.strip().splitlines()
+            raise RuntimeError(err[-1] if err else f"exit code {proc.returncode}")
+        # The last line is the probe's; the import itself may have printed before it
+        elapsed, loaded = json.loads(proc.stdout.strip().splitlines()[-1])
+        best = elapsed if best is None else min(best, elapsed)
+    return best, loaded
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    failures = 0
+    for project, module, budget in ENTRY_POINTS:
+        label = f"{project}/{module}"
+        try:
+            elapsed, loaded = measure(project, module, args.runs)
+        except RuntimeError as e:
+            print(f"ERROR {label}: {e}")
+            failures += 1
+            continue
+        ok = elapsed <= budget and not loaded
+        failures += not ok
+        extra = f"  eager imports: {', '.join(loaded)}" if loaded else ""
+        print(f"{'OK   ' if ok else 'FAIL '} {label:40s} {elapsed:6.3f}s (budget {budget:.1f}s){extra}")
+
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Shared-module copy check.
+
+Each sub-app runs standalone from its own directory (`uv run python
+<entry>.py`) with its own top-level import names, and there is no
+installable package they could all import from. Modules shared between
+sub-apps are therefore copied. This check keeps the copies identical: the
+first file of each group is canonical, and every copy must match it apart
+from the leading `# <path>` header comment.
+
+Usage:
+    python check_module_copies.py     # exit code 1 if any copy has drifted
+"""
+import difflib
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# canonical file first, then its copies
+GROUPS = [
+    ("milvus_rag_v3/embeddings/cache.py", "siem_rag_llm_v5/embed_cache.py"),
+    ("milvus_rag_v3/milvus_client/connection.py", "soc_automation_v2/tools/milvus_conn.py",
+     "soc_rag_llm_v4/tools/milvus_conn.py", "siem_rag_llm_v5/milvus_conn.py"),
+    ("milvus_rag_v3/embeddings/engines.py", "soc_rag_llm_v4/tools/embed_engines.py",
+     "siem_rag_llm_v5/embed_engines.py"),
+    ("soc_rag_llm_v4/tools/rule_engine.py", "siem_rag_llm_v5/rule_engine.py"),
+    ("soc_rag_llm_v4/tools/rules.json", "siem_rag_llm_v5/rules.json"),
+    ("soc_rag_llm_v4/tools/dedup.py", "siem_rag_llm_v5/dedup.py"),
+    ("soc_rag_llm_v4/tools/templates.py", "siem_rag_llm_v5/templates.py"),
+    ("soc_rag_llm_v4/tools/log_stream.py", "siem_rag_llm_v5/log_stream.py"),
+]
+
+def body(path):
+    with open(os.path.join(HERE, path), encoding="utf-8") as f:
+        lines = f.read().splitlines(keepends=True)
+    if lines and lines[0].startswith("# ") and lines[0].rstrip().endswith((".py", ".json")):
+        lines = lines[1:]
+    return lines
+
+def main():
+    failures = 0
+    for canonical, *copies in GROUPS:
+        expected = body(canonical)
+        for copy in copies:
+            diff = list(difflib.unified_diff(expected, body(copy), canonical, copy))
+            if diff:
+                failures += 1
+                print(f"FAIL  {copy} differs from {canonical}")
+                sys.stdout.writelines(diff[:40])
+            else:
+                print(f"OK    {copy}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,141 @@
 # agents/ingestor.py
+import csv
+import json
 import logging
-from embeddings.embedder import embed_text
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from embeddings.embedder import embed_texts
 logger = logging.getLogger("Ingestor")
 
+def _text_for_embedding(incident):
+    return f"{incident.get('incident_type','')} {incident.get('summary','')} {incident.get('raw','')}"
+
+def iter_incidents(source):
+    """
+    Yield incident dicts from a .jsonl/.ndjson/.csv path or any iterable of dicts.
+    """
+    if not isinstance(source, (str, os.PathLike)):
+        yield from source
+        return
+    path = os.fspath(source)
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+def _read_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return int(json.load(f).get("offset", 0))
+
+def _write_checkpoint(path, offset):
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"offset": offset, "updated_at": time.time()}, f)
+    os.replace(tmp, path)
+
 class IngestorAgent:
     def __init__(self, milvus_handler):
         self.milvus = milvus_handler
 
     def ingest(self, incident):
         # incident: dict with keys: incident_id, incident_type, summary, raw
-        text_for_embedding = f"{incident.get('incident_type','')} {incident.get('summary','')} {incident.get('raw','')}"
-        vec = embed_text(text_for_embedding)
-        incident_obj = {
-            "incident_id": incident["incident_id"],
-            "incident_type": incident.get("incident_type",""),
-            "summary": incident.get("summary",""),
-            "raw": incident.get("raw",""),
-            "vector": vec
-        }
-        count = self.milvus.insert_incidents([incident_obj])
+        count = self.ingest_many([incident])
         logger.info(f"Ingestor: ingested {incident['incident_id']}")
-        return count
\ No newline at end of file
+        return count
+
+    def _build_records(self, incidents, batch_size=None):
+        kwargs = {"batch_size": batch_size} if batch_size else {}
+        vecs = embed_texts([_text_for_embedding(inc) for inc in incidents], **kwargs)
+        incident_objs = []
+        for incident, vec in zip(incidents, vecs):
+            incident_objs.append({
+                "incident_id": incident["incident_id"],
+                "incident_type": incident.get("incident_type",""),
+                "summary": incident.get("summary",""),
+                "raw": incident.get("raw",""),
+                "vector": vec.tolist()
+            })
+        return incident_objs
+
+    def ingest_many(self, incidents, batch_size=None):
+        """Embed a list of incidents in mini-batches and insert them in one call."""
+        incidents = list(incidents)
+        if not incidents:
+            return 0
+        count = self.milvus.insert_incidents(self._build_records(incidents, batch_size))
+        logger.info(f"Ingestor: ingested {len(incidents)} incidents")
+        return count
+
+    def _insert_durable(self, incident_objs):
+        # The checkpoint may only advance past rows that actually left the write buffer
+        count = self.milvus.insert_incidents(incident_objs)
+        flush = getattr(self.milvus, "flush", None)
+        if flush:
+            flush()
+        return count
+
+    def ingest_stream(self, source, batch_size=1000, embed_batch_size=None,
+                      max_in_flight=2, checkpoint_path=None, log_every=10000):
+        """
+        Bulk-ingest incidents from a JSONL/CSV path or any iterator of dicts.
+
+        Incidents are embedded and inserted `batch_size` at a time. Embedding of the
+        next batch overlaps with up to `max_in_flight` pending inserts. When
+        `checkpoint_path` is set, the number of incidents durably inserted is
+        recorded after every batch and a rerun resumes from that offset.
+        Returns {"ingested", "skipped", "seconds", "rows_per_sec"}.
+        """
+        start_offset = _read_checkpoint(checkpoint_path)
+        records = iter_incidents(source)
+        if start_offset:
+            logger.info(f"Ingestor: resuming from checkpoint offset {start_offset}")
+            skipped = sum(1 for _ in islice(records, start_offset))
+        else:
+            skipped = 0
+
+        offset = start_offset
+        ingested = 0
+        next_log = log_every
+        in_flight = deque()
+        t0 = time.perf_counter()
+
+        def settle(fut_and_size):
+            # Batches are settled in submit order so the checkpoint never skips a gap
+            nonlocal offset, ingested, next_log
+            fut, size = fut_and_size
+            fut.result()
+            offset += size
+            ingested += size
+            _write_checkpoint(checkpoint_path, offset)
+            if ingested >= next_log:
+                elapsed = time.perf_counter() - t0
+                logger.info(f"Ingestor: {ingested} incidents, {ingested / elapsed:.0f} rows/sec")
+                next_log += log_every
+
+        with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            while True:
+                batch = list(islice(records, batch_size))
+                if not batch:
+                    break
+                incident_objs = self._build_records(batch, embed_batch_size)
+                while len(in_flight) >= max_in_flight:
+                    settle(in_flight.popleft())
+                in_flight.append((pool.submit(self._insert_durable, incident_objs), len(batch)))
+            while in_flight:
+                settle(in_flight.popleft())
+
+        elapsed = time.perf_counter() - t0
+        rate = ingested / elapsed if elapsed > 0 else 0.0
+        logger.info(f"Ingestor: stream done, {ingested} incidents in {elapsed:.1f}s ({rate:.0f} rows/sec)")
+        return {"ingested": ingested, "skipped": skipped, "seconds": elapsed, "rows_per_sec": rate}
@@ -1,6 +1,6 @@
 # agents/retriever.py
 import logging
-from embeddings.embedder import embed_text
+from embeddings.embedder import embed_texts
 logger = logging.getLogger("Retriever")
 
 class RetrieverAgent:
@@ -8,7 +8,14 @@ class RetrieverAgent:
         self.milvus = milvus_handler
 
     def retrieve_by_text(self, text_query, top_k=5):
-        vec = embed_text(text_query)
-        hits = self.milvus.search_similar(vec, top_k=top_k)
-        logger.info(f"Retriever: found {len(hits)} hits for query")
-        return hits
\ No newline at end of file
+        return self.retrieve_many([text_query], top_k=top_k)[0]
+
+    def retrieve_many(self, texts, top_k=5, filter=None):
+        """Embed a whole window of texts and search them in one round trip."""
+        texts = list(texts)
+        if not texts:
+            return []
+        vecs = embed_texts(texts)
+        hits = self.milvus.search_many(vecs, top_k=top_k, filter=filter)
+        logger.info(f"Retriever: {len(texts)} queries, {sum(len(h) for h in hits)} hits")
+        return hits
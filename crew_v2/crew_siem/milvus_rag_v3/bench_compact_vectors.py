@@ -0,0 +1,100 @@
+# bench_compact_vectors.py
+"""
+Recall / latency / memory report for MILVUS_VECTOR_STORAGE=float16|binary
+against the float32 layout.
+
+Runs offline on clustered synthetic 384-dim vectors (one cluster per incident
+family), using the same conversion and rerank code
+as milvus_handler: the candidate stage scores the compact vectors by brute
+force, then the top `top_k * rerank_factor` candidates are re-scored from
+the float32 side store. Recall@k is measured against exact float32 search.
+This models the quantization loss, not Milvus' ANN index. Latency is local
+numpy time per query, and memory is vector bytes only, projected to
+--project rows.
+
+Usage:
+    uv run python bench_compact_vectors.py
+    uv run python bench_compact_vectors.py --n 200000 --queries 500 --rerank-factors 4 8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from milvus_client.compact import (STORAGE_MODES, FullPrecisionStore, binarize, bytes_per_vector,
+                                   normalize, rerank)
+
+def clustered_vectors(n, dim, clusters, rng, spread=2.8):
+    centers = normalize(rng.standard_normal((clusters, dim)))
+    labels = rng.integers(0, clusters, n)
+    return normalize(centers[labels] + spread * rng.standard_normal((n, dim)) / np.sqrt(dim))
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def candidate_scores(mode, db, q):
+    """ANN-stage scores (higher is better) of queries q against the stored form of db."""
+    if mode == "float32":
+        return q @ db.T
+    if mode == "float16":
+        # db holds float16-rounded values widened back to float32 (numpy has no fast f16 matmul)
+        return q.astype(np.float16).astype(np.float32) @ db.T
+    # db is packed sign bits; score = -hamming distance
+    qb = binarize(q)
+    return -_POPCOUNT[np.bitwise_xor(qb[:, None, :], db[None, :, :])].sum(axis=2, dtype=np.int32)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rerank-factors", type=int, nargs="+", default=[4, 16, 64, 256])
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--project", type=int, default=50_000_000, help="rows for the memory projection")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    base = clustered_vectors(args.n, args.dim, args.clusters, rng)
+    # Queries are perturbed copies of stored incidents (a repeat of a known attack)
+    queries = normalize(base[rng.integers(0, args.n, args.queries)]
+                        + 0.4 * rng.standard_normal((args.queries, args.dim)) / np.sqrt(args.dim))
+    ids = [f"inc-{i}" for i in range(args.n)]
+    truth = np.argsort(-(queries @ base.T), axis=1)[:, :args.top_k]
+
+    stored = {"float32": base, "float16": base.astype(np.float16).astype(np.float32), "binary": binarize(base)}
+    tmp = tempfile.mkdtemp()
+    store = FullPrecisionStore(os.path.join(tmp, "rerank.sqlite"))
+    store.put_many(ids, base)
+
+    print(f"{args.n} vectors x {args.dim} dims, {args.queries} queries, top_k={args.top_k}")
+    print(f"{'storage':8s} {'rerank':>6s} {'recall@k':>9s} {'ms/query':>9s} {'B/vector':>9s} "
+          f"{'GiB @ ' + format(args.project, ','):>18s} {'vs f32':>7s}")
+    f32_bytes = bytes_per_vector("float32", args.dim)
+    for mode in STORAGE_MODES:
+        for factor in ([0] if mode == "float32" else [0] + args.rerank_factors):
+            do_rerank = factor > 0
+            limit = args.top_k * factor if do_rerank else args.top_k
+            recall = 0.0
+            t0 = time.perf_counter()
+            for qi in range(args.queries):
+                scores = candidate_scores(mode, stored[mode], queries[qi:qi + 1])[0]
+                top = np.argpartition(-scores, limit - 1)[:limit]
+                top = top[np.argsort(-scores[top])]
+                if do_rerank:
+                    hits = [{"incident_id": ids[i], "score": float(scores[i])} for i in top]
+                    hits = rerank(queries[qi:qi + 1], [hits], store, args.top_k, mode, args.dim)[0]
+                    found = [int(h["incident_id"][4:]) for h in hits]
+                else:
+                    found = top[:args.top_k].tolist()
+                recall += len(set(found) & set(truth[qi].tolist())) / args.top_k
+            ms = (time.perf_counter() - t0) * 1000 / args.queries
+            b = bytes_per_vector(mode, args.dim)
+            # The float32 side store is on local disk, not in Milvus memory
+            gib = b * args.project / 2 ** 30
+            print(f"{mode:8s} {(str(factor) + 'x') if do_rerank else 'no':>6s} {recall / args.queries:9.3f} {ms:9.2f} "
+                  f"{b:9d} {gib:18.1f} {b / f32_bytes:6.1%}")
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# bench_embed_engines.py
+"""
+Microbenchmark of the embedding engines (EMBED_BACKEND=torch|onnx|onnx-int8).
+
+For each engine: single-text latency (p50/p95), batched throughput and the
+cosine drift of its vectors against torch on the same synthetic incidents.
+The embedding cache is bypassed so every text is really encoded.
+
+Usage:
+    uv run python bench_embed_engines.py
+    uv run python bench_embed_engines.py --engines torch onnx-int8 --n 4000 --batch-size 64
+    EMBED_ONNX_THREADS=4 uv run python bench_embed_engines.py
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+from embeddings.embedder import MODEL_NAME
+from embeddings.engines import BACKENDS, MAX_COSINE_DRIFT, cosine_drift, load_engine
+
+TEMPLATES = [
+    "{n} failed logins for user {user} from {ip} within {m} minutes",
+    "Trojan.{fam} detected in C:\\Users\\{user}\\AppData\\Local\\Temp\\{h}.exe",
+    "Outbound connection from {ip} to {ip2}:{port} flagged as C2 beacon",
+    "ransomware note dropped on host WS-{n}; {m} files renamed with .{fam} extension",
+    "powershell -enc {h} spawned by winword.exe on host WS-{n} (user {user})",
+    "DNS tunneling suspected: {n} TXT queries to {h}.example.net from {ip}",
+]
+
+def synthetic_texts(n, seed=7):
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        out.append(rng.choice(TEMPLATES).format(
+            n=rng.randint(3, 5000), m=rng.randint(1, 60),
+            user=rng.choice(["alice", "bob", "svc_backup", "admin"]),
+            ip=f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+            ip2=f"185.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+            port=rng.choice([443, 8080, 4444, 53]),
+            fam=rng.choice(["Emotet", "Qakbot", "LockBit", "AgentTesla"]),
+            h="%08x" % rng.getrandbits(32),
+        ))
+    return out
+
+def encode_all(engine, texts, batch_size):
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    out = np.empty((len(texts), engine.dim), dtype=np.float32)
+    for start in range(0, len(order), batch_size):
+        idx = order[start:start + batch_size]
+        out[idx] = engine.encode([texts[i] for i in idx])
+    return out
+
+def bench(engine, texts, batch_size, single_n):
+    encode_all(engine, texts[:batch_size], batch_size)  # warm-up
+
+    lat = []
+    for t in texts[:single_n]:
+        t0 = time.perf_counter()
+        engine.encode([t])
+        lat.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    vecs = encode_all(engine, texts, batch_size)
+    elapsed = time.perf_counter() - t0
+    return vecs, {
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p95_ms": float(np.percentile(lat, 95)),
+        "texts_per_sec": len(texts) / elapsed,
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--engines", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--n", type=int, default=2000, help="texts for the throughput run")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--single", type=int, default=200, help="texts for the single-text latency run")
+    args = parser.parse_args()
+
+    texts = synthetic_texts(args.n)
+    results = {}
+    vectors = {}
+    for name in args.engines:
+        t0 = time.perf_counter()
+        engine = load_engine(name, MODEL_NAME)
+        load_s = time.perf_counter() - t0
+        vectors[name], results[name] = bench(engine, texts, args.batch_size, args.single)
+        results[name]["load_s"] = load_s
+
+    print(f"\n{MODEL_NAME}, {args.n} texts, batch size {args.batch_size}")
+    print(f"{'engine':10s} {'load s':>7s} {'p50 ms':>8s} {'p95 ms':>8s} {'texts/s':>9s} {'speedup':>8s} {'max drift':>10s} {'mean drift':>10s}")
+    base = results.get("torch", {}).get("texts_per_sec")
+    for name, r in results.items():
+        speedup = f"{r['texts_per_sec'] / base:7.2f}x" if base else "      -"
+        if "torch" in vectors and name != "torch":
+            d = cosine_drift(vectors[name], vectors["torch"])
+            drift = f"{d.max():10.5f} {d.mean():10.5f}"
+            if d.max() > MAX_COSINE_DRIFT:
+                drift += f"  over EMBED_MAX_COSINE_DRIFT={MAX_COSINE_DRIFT}"
+        else:
+            drift = f"{'-':>10s} {'-':>10s}"
+        print(f"{name:10s} {r['load_s']:7.2f} {r['p50_ms']:8.2f} {r['p95_ms']:8.2f} "
+              f"{r['texts_per_sec']:9.0f} {speedup} {drift}")
+
+if __name__ == "__main__":
+    main()
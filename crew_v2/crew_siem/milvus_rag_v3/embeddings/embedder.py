@@ -1,23 +1,83 @@
 # embeddings/embedder.py
-from sentence_transformers import SentenceTransformer
+import numpy as np
 import os
+import time
 from dotenv import load_dotenv
+from embeddings.cache import get_cache
+from embeddings.engines import load_engine
 load_dotenv()
 
 MODEL_NAME = os.getenv("EMBED_MODEL", "all-MiniLM-L6-v2")
-_model = None
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# torch | onnx | onnx-int8 (see embeddings/engines.py)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+_engine = None
 
-def get_model():
-    global _model
-    if _model is None:
-        _model = SentenceTransformer(MODEL_NAME)
-    return _model
+def get_engine():
+    global _engine
+    if _engine is None:
+        # Model runtimes cost seconds to import; only pay it on first embed
+        _engine = load_engine(EMBED_BACKEND, MODEL_NAME)
+    return _engine
+
+def _cache_model_name():
+    # Quantized/ONNX vectors are close to, but not bit-identical with, torch ones
+    return MODEL_NAME if EMBED_BACKEND == "torch" else f"{MODEL_NAME}@{EMBED_BACKEND}"
 
 def embed_text(text):
     """
     Returns a list[float] of embedding vector (length matches VECTOR_DIM).
     """
-    model = get_model()
-    vec = model.encode(text)
-    # ensure python list
-    return vec.tolist()
\ No newline at end of file
+    return embed_texts([text])[0].tolist()
+
+def _encode(texts, batch_size):
+    # Length-sorted mini-batches keep padding per batch small
+    engine = get_engine()
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    out = None
+    for start in range(0, len(order), batch_size):
+        idx = order[start:start + batch_size]
+        vecs = engine.encode([texts[i] for i in idx])
+        if out is None:
+            out = np.empty((len(texts), vecs.shape[1]), dtype=np.float32)
+        out[idx] = vecs
+    return out
+
+def embed_texts(texts, batch_size=EMBED_BATCH_SIZE):
+    """
+    Embed many texts with one forward pass per mini-batch.
+    Inputs are sorted by length so each padded batch holds similarly sized
+    strings; rows of the result keep the original input order. Texts already
+    in the embedding cache are not re-encoded.
+    Returns a float32 array of shape (len(texts), dim).
+    """
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, get_engine().dim), dtype=np.float32)
+
+    cache = get_cache(_cache_model_name())
+    if cache is None:
+        return _encode(texts, batch_size)
+
+    cached = cache.get_many(texts)
+    miss_idx = [i for i, v in enumerate(cached) if v is None]
+    if not miss_idx:
+        return np.stack(cached).astype(np.float32, copy=False)
+
+    miss_texts = [texts[i] for i in miss_idx]
+    t0 = time.perf_counter()
+    fresh = _encode(miss_texts, batch_size)
+    cache.record_encode(len(miss_texts), time.perf_counter() - t0)
+    cache.put_many(miss_texts, fresh)
+
+    out = np.empty((len(texts), fresh.shape[1]), dtype=np.float32)
+    out[miss_idx] = fresh
+    for i, vec in enumerate(cached):
+        if vec is not None:
+            out[i] = vec
+    return out
+
+def cache_stats():
+    """Hit/miss counters of the embedding cache ({} when disabled)."""
+    cache = get_cache(_cache_model_name())
+    return cache.stats() if cache else {}
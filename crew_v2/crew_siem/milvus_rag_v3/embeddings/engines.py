@@ -0,0 +1,195 @@
+# embeddings/engines.py
+"""
+Selectable sentence-embedding engines (EMBED_BACKEND=torch|onnx|onnx-int8).
+
+`torch` runs the SentenceTransformer as before. `onnx` runs the same
+transformer exported to an ONNX graph under onnxruntime, and `onnx-int8`
+runs a dynamically int8-quantized copy of that graph. The ONNX engines
+tokenize with `tokenizers` and do the mean pooling / L2 normalization of the
+SentenceTransformer pipeline in numpy, so neither torch nor
+sentence-transformers is imported at run time.
+
+The export happens once per model into EMBED_ONNX_DIR and needs torch +
+sentence-transformers + onnxruntime; during the export the ONNX output is
+compared with the torch output on a fixed sample and the worst cosine drift
+is written to engine_meta.json. Loading a graph whose recorded drift exceeds
+EMBED_MAX_COSINE_DRIFT fails, so a bad quantization can't silently put
+incompatible vectors into an existing collection.
+"""
+import json
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger("embed_engines")
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_DIR = os.getenv("EMBED_ONNX_DIR", "onnx_models")
+# 0 = let onnxruntime pick (one thread per physical core)
+ONNX_THREADS = int(os.getenv("EMBED_ONNX_THREADS", "0"))
+MAX_COSINE_DRIFT = float(os.getenv("EMBED_MAX_COSINE_DRIFT", "0.02"))
+
+# Fixed sample for the torch vs ONNX compatibility check
+CALIBRATION_TEXTS = [
+    "Multiple failed SSH logins from 10.0.0.5 followed by a successful login",
+    "ransomware encrypted files on host WS-042 and dropped README_DECRYPT.txt",
+    "Outbound beacon to 185.220.101.7 every 60 seconds over port 443",
+    "powershell -enc JABzAD0ATgBlAHcALQBPAGIAagBlAGMAdAA= spawned by winword.exe",
+    "Trojan.GenericKD detected in C:\\Users\\bob\\AppData\\Local\\Temp\\inv.exe",
+    "user alice logged in",
+    "",
+    "DNS tunneling suspected: 4000 TXT queries to a single domain in 5 minutes",
+]
+
+def cosine_drift(a, b):
+    """Per-row 1 - cos(a, b) for two (n, dim) arrays."""
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    na = np.linalg.norm(a, axis=1)
+    nb = np.linalg.norm(b, axis=1)
+    denom = np.where((na == 0) | (nb == 0), 1.0, na * nb)
+    return 1.0 - np.sum(a * b, axis=1) / denom
+
+class TorchEngine:
+    name = "torch"
+
+    def __init__(self, model_name):
+        # torch + sentence_transformers cost seconds to import; only pay it here
+        from sentence_transformers import SentenceTransformer
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts):
+        return self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True,
+                                 show_progress_bar=False).astype(np.float32, copy=False)
+
+class OnnxEngine:
+    """Runs an exported graph; use load_onnx_engine() to get the drift-checked one."""
+
+    def __init__(self, path, meta, name="onnx", threads=ONNX_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.name = name
+        self.model_name = meta["model_name"]
+        self.dim = meta["dim"]
+        self.normalize = meta["normalize"]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(os.path.dirname(path), "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=meta["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=meta["pad_token_id"], pad_token=meta["pad_token"])
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        # One batch at a time per process: spend the cores inside each op
+        opts.intra_op_num_threads = threads
+        opts.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts):
+        encs = self.tokenizer.encode_batch(list(texts))
+        ids = np.array([e.ids for e in encs], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encs], dtype=np.int64)
+        feed = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self._inputs:
+            feed["token_type_ids"] = np.zeros_like(ids)
+        tokens = self.session.run(None, feed)[0]
+        # Mean pooling over real tokens, as in the SentenceTransformer Pooling module
+        m = mask[:, :, None].astype(np.float32)
+        vecs = (tokens * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            vecs /= np.clip(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12, None)
+        return vecs.astype(np.float32, copy=False)
+
+def _export_dir(model_dir, model_name):
+    return os.path.join(model_dir, model_name.replace("/", "__"))
+
+def export_onnx(model_name, model_dir=ONNX_DIR):
+    """
+    Export model_name to model.onnx + model_int8.onnx (+ tokenizer and
+    engine_meta.json) under model_dir, unless already done. Returns the
+    export directory.
+    """
+    export_dir = _export_dir(model_dir, model_name)
+    meta_path = os.path.join(export_dir, "engine_meta.json")
+    if os.path.exists(meta_path):
+        return export_dir
+
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(export_dir, exist_ok=True)
+    fp32_path = os.path.join(export_dir, "model.onnx")
+    int8_path = os.path.join(export_dir, "model_int8.onnx")
+    reference = TorchEngine(model_name)
+    st = reference.model
+    transformer, pooling = st[0], st[1]
+    if not getattr(pooling, "pooling_mode_mean_tokens", False):
+        raise ValueError(f"{model_name}: only mean-pooling models can be exported to ONNX")
+
+    logger.info(f"Exporting {model_name} to {fp32_path}")
+    tokenizer = transformer.tokenizer
+    tokenizer.save_pretrained(export_dir)
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    dynamic = {n: {0: "batch", 1: "seq"} for n in input_names + ["token_embeddings"]}
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer.auto_model.eval(), tuple(sample[n] for n in input_names), fp32_path,
+            input_names=input_names, output_names=["token_embeddings"],
+            dynamic_axes=dynamic, opset_version=14,
+        )
+    logger.info(f"Quantizing {fp32_path} -> {int8_path}")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    meta = {
+        "model_name": model_name,
+        "dim": reference.dim,
+        "max_seq_length": st.max_seq_length,
+        "normalize": any(type(m).__name__ == "Normalize" for m in st),
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+        "max_cosine_drift": {},
+    }
+    # Record how far each graph drifts from torch on the calibration sample
+    expected = reference.encode(CALIBRATION_TEXTS)
+    for name, path in (("onnx", fp32_path), ("onnx-int8", int8_path)):
+        drift = float(cosine_drift(OnnxEngine(path, meta, name).encode(CALIBRATION_TEXTS), expected).max())
+        meta["max_cosine_drift"][name] = drift
+        logger.info(f"{name}: max cosine drift vs torch {drift:.5f}")
+
+    tmp = f"{meta_path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, meta_path)
+    return export_dir
+
+def load_onnx_engine(model_name, quantized=False, model_dir=ONNX_DIR, threads=ONNX_THREADS,
+                     max_drift=MAX_COSINE_DRIFT):
+    export_dir = export_onnx(model_name, model_dir)
+    with open(os.path.join(export_dir, "engine_meta.json")) as f:
+        meta = json.load(f)
+    name = "onnx-int8" if quantized else "onnx"
+    drift = meta["max_cosine_drift"][name]
+    if drift > max_drift:
+        raise ValueError(
+            f"{name} graph for {model_name} drifts {drift:.4f} from torch "
+            f"(limit EMBED_MAX_COSINE_DRIFT={max_drift})"
+        )
+    path = os.path.join(export_dir, "model_int8.onnx" if quantized else "model.onnx")
+    engine = OnnxEngine(path, meta, name, threads)
+    logger.info(f"Loaded {name} embedding engine from {path} "
+                f"(recorded drift {drift:.4f}, intra-op threads {threads or 'auto'})")
+    return engine
+
+def load_engine(backend, model_name):
+    """Engine for EMBED_BACKEND value `backend`."""
+    if backend not in BACKENDS:
+        raise ValueError(f"EMBED_BACKEND must be one of {', '.join(BACKENDS)}, got {backend!r}")
+    if backend == "torch":
+        return TorchEngine(model_name)
+    return load_onnx_engine(model_name, quantized=(backend == "onnx-int8"))
@@ -1,9 +1,9 @@
 # main_rag.py
+import argparse
 import logging
-from milvus_client.milvus_handler import insert_incidents, collection, insert_incidents as _insert, insert_incidents as dummy
-from milvus_client.milvus_handler import insert_incidents as _
-from milvus_client import milvus_handler as mh  # easier access
+from milvus_client.backend import get_vector_store
 from llm.llm_wrapper import get_llm
+from embeddings.embedder import cache_stats
 from agents.ingestor import IngestorAgent
 from agents.retriever import RetrieverAgent
 from agents.rag_analyst import RAGAnalystAgent
@@ -13,8 +13,9 @@ logger = logging.getLogger("main")
 
 def main():
     llm = get_llm()
-    milvus = mh  # the module exposes functions collection, insert_incidents, search_similar
-    # Note: our milvus_handler exposes insert_incidents and search_similar as functions
+    # milvus_handler module or LocalIncidentStore (VECTOR_BACKEND); both expose
+    # insert_incidents, flush, search_similar, search_many and query_incidents
+    milvus = get_vector_store()
     ingestor = IngestorAgent(milvus)
     retriever = RetrieverAgent(milvus)
     rag = RAGAnalystAgent(llm, retriever)
@@ -35,9 +36,9 @@ def main():
         }
     ]
 
-    # ingest
-    for inc in incidents:
-        ingestor.ingest(inc)
+    # ingest (one batched embedding pass + one insert)
+    ingestor.ingest_many(incidents)
+    milvus.flush()  # read-your-writes for the query below
 
     # run a malware correlation query
     query = "Find ransomware-like activity: obfuscated PowerShell, C2 domains, and dropped EXE"
@@ -48,5 +49,27 @@ def main():
     for r in out["retrieved"]:
         print(r)
 
+    stats = cache_stats()
+    if stats:
+        logger.info(f"Embedding cache: {stats['hits']} hits / {stats['misses']} misses, "
+                    f"~{stats['est_seconds_saved']:.2f}s encode time saved")
+
+def backfill(path, checkpoint=None, batch_size=1000, max_in_flight=2):
+    """Bulk-load a historical incident archive (JSONL or CSV)."""
+    ingestor = IngestorAgent(get_vector_store())
+    stats = ingestor.ingest_stream(path, batch_size=batch_size, max_in_flight=max_in_flight,
+                                   checkpoint_path=checkpoint)
+    print(stats)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backfill", help="JSONL/CSV incident archive to bulk-ingest")
+    parser.add_argument("--checkpoint", help="checkpoint file used to resume an interrupted backfill")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--max-in-flight", type=int, default=2)
+    args = parser.parse_args()
+    if args.backfill:
+        backfill(args.backfill, args.checkpoint or f"{args.backfill}.ckpt",
+                 batch_size=args.batch_size, max_in_flight=args.max_in_flight)
+    else:
+        main()
\ No newline at end of file
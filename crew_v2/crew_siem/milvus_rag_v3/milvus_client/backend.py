@@ -0,0 +1,29 @@
+# milvus_client/backend.py
+"""
+Pick the vector store the agents talk to.
+
+VECTOR_BACKEND=milvus (default) -> milvus_client.milvus_handler (Zilliz / Milvus)
+VECTOR_BACKEND=local            -> LocalIncidentStore under LOCAL_VECTOR_DIR, no network
+Both expose insert_incidents / flush / search_similar / search_many / query_incidents.
+"""
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "milvus").lower()
+LOCAL_VECTOR_DIR = os.getenv("LOCAL_VECTOR_DIR", "local_vectors")
+
+_store = None
+
+def get_vector_store():
+    global _store
+    if _store is None:
+        if VECTOR_BACKEND == "local":
+            from milvus_client.local_store import LocalIncidentStore
+            _store = LocalIncidentStore(LOCAL_VECTOR_DIR)
+        elif VECTOR_BACKEND == "milvus":
+            from milvus_client import milvus_handler
+            _store = milvus_handler
+        else:
+            raise ValueError(f"Unknown VECTOR_BACKEND: {VECTOR_BACKEND}")
+    return _store
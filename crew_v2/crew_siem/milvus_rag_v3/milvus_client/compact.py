@@ -0,0 +1,124 @@
+# milvus_client/compact.py
+"""
+Compact vector storage for the ANN stage (MILVUS_VECTOR_STORAGE).
+
+  float32  FLOAT_VECTOR, 4 bytes/dim (default, unchanged layout)
+  float16  FLOAT16_VECTOR, 2 bytes/dim, COSINE
+  binary   BINARY_VECTOR of sign bits, 1 bit/dim, HAMMING
+
+In the compact modes Milvus only holds the reduced vectors. The float32
+vectors go to a local SQLite side store keyed by incident_id, and the top
+`top_k * rerank_factor` ANN candidates are re-scored with exact cosine
+similarity against them before the top_k are returned.
+
+Only the milvus_rag_v3 incident collection supports this. The
+soc_automation_v2 and v4/v5 collections keep FLOAT_VECTOR.
+"""
+import logging
+import math
+import sqlite3
+import threading
+
+import numpy as np
+
+logger = logging.getLogger("compact_vectors")
+
+STORAGE_MODES = ("float32", "float16", "binary")
+
+def check_mode(mode):
+    if mode not in STORAGE_MODES:
+        raise ValueError(f"MILVUS_VECTOR_STORAGE must be one of {', '.join(STORAGE_MODES)}, got {mode!r}")
+    return mode
+
+def bytes_per_vector(mode, dim):
+    return {"float32": 4 * dim, "float16": 2 * dim, "binary": dim // 8}[mode]
+
+def normalize(vectors):
+    vecs = np.asarray(vectors, dtype=np.float32)
+    if vecs.ndim == 1:
+        vecs = vecs[None, :]
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    return vecs / np.where(norms == 0, 1, norms)
+
+def binarize(vectors):
+    """Sign bit per dimension, packed 8 dims per byte -> uint8 array (n, dim // 8)."""
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+def to_storage(vectors, mode):
+    """Vectors in the form pymilvus expects for the given storage mode."""
+    if mode == "float32":
+        return [v.tolist() if hasattr(v, "tolist") else v for v in vectors]
+    vecs = normalize(vectors)
+    if mode == "float16":
+        return list(vecs.astype(np.float16))
+    return [row.tobytes() for row in binarize(vecs)]
+
+def hamming_to_cosine(distance, dim):
+    # Random-hyperplane estimate: angle ~= pi * hamming / dim
+    return math.cos(math.pi * float(distance) / dim)
+
+class FullPrecisionStore:
+    """float32 vectors keyed by incident_id, used to rerank compact ANN hits."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS vectors (incident_id TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._db.commit()
+
+    def put_many(self, ids, vectors):
+        vecs = normalize(vectors)
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO vectors (incident_id, vector) VALUES (?, ?)",
+                [(i, v.tobytes()) for i, v in zip(ids, vecs)],
+            )
+            self._db.commit()
+
+    def get_many(self, ids):
+        """Dict of incident_id -> normalized float32 vector for the ids that are present."""
+        ids = list(dict.fromkeys(ids))
+        out = {}
+        with self._lock:
+            # stay below SQLite's bound-parameter limit
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT incident_id, vector FROM vectors WHERE incident_id IN ({marks})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    out[key] = np.frombuffer(blob, dtype=np.float32)
+        return out
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+def rerank(query_vectors, candidates, store, top_k, mode, dim):
+    """
+    Re-score ANN candidates with exact cosine similarity.
+
+    candidates: one list of hit dicts per query (each with "incident_id" and
+    the ANN "score"). Hits whose full vector is missing from the store keep
+    their ANN score, converted to a cosine estimate for binary storage.
+    Returns the top_k hits per query, best first.
+    """
+    queries = normalize(query_vectors)
+    full = store.get_many(h["incident_id"] for hits in candidates for h in hits)
+    out = []
+    for q, hits in zip(queries, candidates):
+        for h in hits:
+            vec = full.get(h["incident_id"])
+            if vec is not None:
+                h["score"] = float(q @ vec)
+            elif mode == "binary":
+                h["score"] = hamming_to_cosine(h["score"], dim)
+        hits.sort(key=lambda h: h["score"], reverse=True)
+        out.append(hits[:top_k])
+    return out
@@ -0,0 +1,93 @@
+# milvus_client/connection.py
+"""
+Lazy Milvus connection + collection handle cache.
+
+Nothing touches the network until the first get_collection() call. Collection
+handles are cached per name, load() is issued once per collection, and all
+state is dropped in a forked child so workers open their own gRPC channel
+instead of sharing the parent's.
+"""
+import logging
+import os
+import threading
+
+logger = logging.getLogger("milvus_connection")
+
+class MilvusConnection:
+    def __init__(self, alias="default", **connect_kwargs):
+        self.alias = alias
+        self.connect_kwargs = connect_kwargs
+        self._lock = threading.RLock()
+        self._pid = None
+        self._collections = {}
+        self._loaded = set()
+        _instances.append(self)
+
+    def _after_fork(self):
+        # A lock held by another thread at fork time would never be released in
+        # the child; connect() notices the pid change and drops the old channel.
+        self._lock = threading.RLock()
+
+    def connect(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            from pymilvus import connections
+            if self._pid is not None:
+                # Inherited from the parent process: don't reuse its channel
+                try:
+                    connections.disconnect(self.alias)
+                except Exception:
+                    pass
+                self._collections = {}
+                self._loaded = set()
+            connections.connect(alias=self.alias, **self.connect_kwargs)
+            self._pid = os.getpid()
+            logger.info(f"Connected to Milvus (alias={self.alias}, pid={self._pid})")
+
+    def get_collection(self, name, create=None):
+        """
+        Cached Collection handle. If the collection does not exist, `create(name)`
+        is called to build it (and must return the Collection); without a
+        factory a missing collection raises ValueError.
+        """
+        self.connect()
+        with self._lock:
+            coll = self._collections.get(name)
+            if coll is not None:
+                return coll
+            from pymilvus import Collection, utility
+            if utility.has_collection(name, using=self.alias):
+                coll = Collection(name, using=self.alias)
+                logger.info(f"Loading existing collection: {name}")
+            elif create is not None:
+                coll = create(name)
+            else:
+                raise ValueError(f"Collection '{name}' does not exist.")
+            self._collections[name] = coll
+            return coll
+
+    def ensure_loaded(self, name, create=None):
+        """Collection handle that has been load()ed into query nodes exactly once."""
+        coll = self.get_collection(name, create)
+        if name not in self._loaded:
+            with self._lock:
+                if name not in self._loaded:
+                    coll.load()
+                    self._loaded.add(name)
+        return coll
+
+    def forget(self, name):
+        """Drop cached state for a collection (e.g. after dropping it)."""
+        with self._lock:
+            self._collections.pop(name, None)
+            self._loaded.discard(name)
+
+_instances = []
+
+def _after_fork_in_child():
+    for conn in _instances:
+        conn._after_fork()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
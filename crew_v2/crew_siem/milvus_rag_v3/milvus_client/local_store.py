@@ -0,0 +1,276 @@
+# milvus_client/local_store.py
+"""
+In-process vector store with the same interface as milvus_handler
+(insert_incidents / flush / search_similar / search_many / query_incidents),
+for air-gapped sensors and tests.
+
+Vectors live in a memory-mapped float32 matrix (`vectors.f32`), L2-normalized
+on insert so cosine similarity is a single matmul. Scalar fields are appended
+to `meta.jsonl`. For larger collections an optional HNSW graph index
+(`pip install hnswlib`) is built once the row count passes `hnsw_min_rows`.
+"""
+import ast
+import json
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+
+logger = logging.getLogger("local_store")
+
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", "384"))
+LOCAL_INDEX = os.getenv("LOCAL_VECTOR_INDEX", "auto")  # auto | flat | hnsw
+HNSW_MIN_ROWS = int(os.getenv("LOCAL_HNSW_MIN_ROWS", "10000"))
+
+FIELDS = ["incident_id", "incident_type", "summary", "raw"]
+
+_CLAUSE = re.compile(
+    r"^\s*(\w+)\s*(==|!=|in|not in)\s*(\[.*\]|'[^']*'|\"[^\"]*\"|-?\d+(?:\.\d+)?)\s*$"
+)
+
+def _literal(text):
+    text = text.strip()
+    if text.startswith("["):
+        # literal_eval keeps commas inside quoted values: ["a,b"] is one value
+        try:
+            values = ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            raise ValueError(f"Unsupported list in filter expression: {text!r}")
+        if not isinstance(values, list) or not all(isinstance(v, (str, int, float)) for v in values):
+            raise ValueError(f"Unsupported list in filter expression: {text!r}")
+        return values
+    if text[0] in "'\"":
+        return text[1:-1]
+    return float(text) if "." in text else int(text)
+
+def parse_filter(expr):
+    """
+    Compile the subset of Milvus boolean expressions the pipelines use:
+    `field == value`, `field != value`, `field in [..]`, `field not in [..]`,
+    joined with `and`. Returns a predicate over a metadata dict.
+    """
+    if not expr:
+        return None
+    clauses = []
+    for part in re.split(r"\s+and\s+", expr.strip()):
+        m = _CLAUSE.match(part)
+        if not m:
+            raise ValueError(f"Unsupported filter expression for local store: {part!r}")
+        field, op, value = m.group(1), m.group(2), _literal(m.group(3))
+        clauses.append((field, op, value))
+
+    def predicate(row):
+        for field, op, value in clauses:
+            v = row.get(field)
+            if op == "==" and v != value:
+                return False
+            if op == "!=" and v == value:
+                return False
+            if op == "in" and v not in value:
+                return False
+            if op == "not in" and v in value:
+                return False
+        return True
+    return predicate
+
+class LocalIncidentStore:
+    def __init__(self, path, dim=VECTOR_DIM, index=LOCAL_INDEX, hnsw_min_rows=HNSW_MIN_ROWS):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dim = dim
+        self.index_mode = index
+        self.hnsw_min_rows = hnsw_min_rows
+        self._lock = threading.RLock()
+        self._vec_path = os.path.join(path, "vectors.f32")
+        self._meta_path = os.path.join(path, "meta.jsonl")
+        self._hnsw_path = os.path.join(path, "hnsw.bin")
+
+        self._meta, ends = self._read_meta()
+
+        if not os.path.exists(self._vec_path):
+            open(self._vec_path, "wb").close()
+        self._capacity = os.path.getsize(self._vec_path) // (4 * dim)
+        self._vectors = None
+        if self._capacity:
+            self._vectors = np.memmap(self._vec_path, dtype=np.float32, mode="r+",
+                                      shape=(self._capacity, dim))
+        # Rows past the last complete metadata line were never committed
+        self.count = min(len(self._meta), self._capacity)
+        del self._meta[self.count:]
+        # Drop a line half-written in a crash (and any rows without vectors)
+        # so appends continue right after the last committed row
+        with open(self._meta_path, "ab") as f:
+            f.truncate(ends[self.count - 1] if self.count else 0)
+        self._meta_file = open(self._meta_path, "a", encoding="utf-8")
+
+        self._hnsw = None
+        self._hnsw_count = 0
+        logger.info(f"Local vector store at {path}: {self.count} incidents")
+
+    def _read_meta(self):
+        """-> (rows, end offset of each row's line), stopping at the first
+        line that is unterminated or doesn't parse."""
+        rows, ends = [], []
+        if not os.path.exists(self._meta_path):
+            return rows, ends
+        offset = 0
+        with open(self._meta_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    row = json.loads(line) if line.strip() else None
+                except ValueError:
+                    break
+                offset += len(line)
+                if row is not None:
+                    rows.append(row)
+                    ends.append(offset)
+        if offset != os.path.getsize(self._meta_path):
+            logger.warning(f"Discarding incomplete tail of {self._meta_path} after {len(rows)} rows")
+        return rows, ends
+
+    # ---------- writes ----------
+
+    def _ensure_capacity(self, n):
+        if n <= self._capacity:
+            return
+        new_cap = max(n, self._capacity * 2, 1024)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self._vec_path, "r+b") as f:
+            f.truncate(new_cap * self.dim * 4)
+        self._vectors = np.memmap(self._vec_path, dtype=np.float32, mode="r+",
+                                  shape=(new_cap, self.dim))
+        self._capacity = new_cap
+
+    def insert_incidents(self, records):
+        if not records:
+            return 0
+        vecs = np.asarray([r.get("vector") for r in records], dtype=np.float32)
+        if vecs.ndim != 2 or vecs.shape[1] != self.dim:
+            raise ValueError(f"expected vectors of dim {self.dim}, got shape {vecs.shape}")
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        vecs /= np.where(norms == 0, 1, norms)
+        with self._lock:
+            start = self.count
+            self._ensure_capacity(start + len(records))
+            self._vectors[start:start + len(records)] = vecs
+            rows = []
+            for r in records:
+                row = {f: r.get(f, "") for f in FIELDS}
+                rows.append(row)
+                self._meta_file.write(json.dumps(row) + "\n")
+            self._meta.extend(rows)
+            self.count += len(records)
+        logger.info(f"Inserted {len(records)} records into local store")
+        return len(records)
+
+    def flush(self):
+        """Persist pending writes to disk (vectors first, then metadata)."""
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            self._meta_file.flush()
+            os.fsync(self._meta_file.fileno())
+            if self._hnsw is not None:
+                self._hnsw.save_index(self._hnsw_path)
+        return 0
+
+    def close(self):
+        self.flush()
+        self._meta_file.close()
+
+    # ---------- search ----------
+
+    def _use_hnsw(self):
+        if self.index_mode == "flat" or self.count < self.hnsw_min_rows:
+            return False
+        try:
+            import hnswlib
+        except ImportError:
+            if self.index_mode == "hnsw":
+                raise RuntimeError("hnswlib package required for LOCAL_VECTOR_INDEX=hnsw")
+            return False
+        if self._hnsw is None:
+            self._hnsw = hnswlib.Index(space="ip", dim=self.dim)
+            if os.path.exists(self._hnsw_path):
+                self._hnsw.load_index(self._hnsw_path, max_elements=max(self._capacity, self.count))
+                self._hnsw_count = self._hnsw.get_current_count()
+            else:
+                self._hnsw.init_index(max_elements=max(self._capacity, self.count), ef_construction=200, M=16)
+                self._hnsw_count = 0
+        if self._hnsw_count < self.count:
+            if self._hnsw.get_max_elements() < self.count:
+                self._hnsw.resize_index(self._capacity)
+            ids = np.arange(self._hnsw_count, self.count)
+            self._hnsw.add_items(np.asarray(self._vectors[self._hnsw_count:self.count]), ids)
+            self._hnsw_count = self.count
+        return True
+
+    def _hits(self, idx, scores, output_fields):
+        out = []
+        for i, score in zip(idx, scores):
+            row = self._meta[int(i)]
+            hit = {f: row.get(f) for f in output_fields}
+            hit["score"] = float(score)
+            out.append(hit)
+        return out
+
+    def search_many(self, vectors, top_k=5, filter=None, output_fields=None):
+        if len(vectors) == 0:
+            return []
+        output_fields = output_fields or FIELDS
+        q = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), self.dim)
+        norms = np.linalg.norm(q, axis=1, keepdims=True)
+        q = q / np.where(norms == 0, 1, norms)
+        with self._lock:
+            n = self.count
+            if n == 0:
+                return [[] for _ in range(len(q))]
+            predicate = parse_filter(filter)
+            k = min(top_k, n)
+
+            if predicate is None and self._use_hnsw():
+                self._hnsw.set_ef(max(64, 2 * k))
+                labels, dists = self._hnsw.knn_query(q, k=k)
+                # hnswlib "ip" distance is 1 - dot
+                return [self._hits(l, 1.0 - d, output_fields) for l, d in zip(labels, dists)]
+
+            matrix = self._vectors[:n]
+            rows = None
+            if predicate is not None:
+                rows = np.fromiter((i for i in range(n) if predicate(self._meta[i])), dtype=np.int64)
+                if len(rows) == 0:
+                    return [[] for _ in range(len(q))]
+                matrix = matrix[rows]
+                k = min(top_k, len(rows))
+
+            scores = q @ np.asarray(matrix).T
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            results = []
+            for qi in range(len(q)):
+                cand = top[qi]
+                cand = cand[np.argsort(-scores[qi, cand])]
+                idx = rows[cand] if rows is not None else cand
+                results.append(self._hits(idx, scores[qi, cand], output_fields))
+            return results
+
+    def search_similar(self, vector, top_k=5, output_fields=None):
+        hits = self.search_many([vector], top_k=top_k, output_fields=output_fields)
+        return hits[0] if hits else []
+
+    def query_incidents(self, filter=None, output_fields=None, limit=100):
+        output_fields = output_fields or FIELDS
+        predicate = parse_filter(filter)
+        out = []
+        with self._lock:
+            for row in self._meta[:self.count]:
+                if predicate is None or predicate(row):
+                    out.append({f: row.get(f) for f in output_fields})
+                    if len(out) >= limit:
+                        break
+        return out
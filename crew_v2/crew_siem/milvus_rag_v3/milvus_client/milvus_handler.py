@@ -1,15 +1,12 @@
 # milvus_client/milvus_handler.py
 import os
+import atexit
 import logging
+import threading
+import time
 from dotenv import load_dotenv
-from pymilvus import (
-    connections,
-    FieldSchema,
-    CollectionSchema,
-    DataType,
-    Collection,
-    utility
-)
+from milvus_client.compact import FullPrecisionStore, check_mode, rerank, to_storage
+from milvus_client.connection import MilvusConnection
 
 load_dotenv()
 logger = logging.getLogger("milvus_handler")
@@ -22,34 +19,60 @@ if not logger.handlers:
 
 MILVUS_HOST = os.getenv("MILVUS_HOST")
 MILVUS_TOKEN = os.getenv("MILVUS_TOKEN")
-COLLECTION_NAME = os.getenv("MILVUS_COLLECTION", "cyber_incidents")
 VECTOR_DIM = int(os.getenv("VECTOR_DIM", "384"))
+# float32 | float16 | binary; compact modes rerank from a full-precision side store
+VECTOR_STORAGE = check_mode(os.getenv("MILVUS_VECTOR_STORAGE", "float32"))
+# Sign bits lose far more ranking information than float16: binary needs ~256x
+# candidates for recall@10 ~0.96, float16 is at 1.0 with 4x (bench_compact_vectors.py)
+RERANK_FACTOR = int(os.getenv("MILVUS_RERANK_FACTOR", "256" if VECTOR_STORAGE == "binary" else "4"))
+RERANK_STORE_PATH = os.getenv("MILVUS_RERANK_STORE", "rerank_vectors.sqlite")
+# A compact collection has a different schema, so it never shares a name with the float32 one
+COLLECTION_NAME = os.getenv("MILVUS_COLLECTION", "cyber_incidents")
+if VECTOR_STORAGE != "float32":
+    COLLECTION_NAME = f"{COLLECTION_NAME}_{VECTOR_STORAGE}"
+# "Session" lets this client read its own inserts without a manual collection.flush()
+CONSISTENCY_LEVEL = os.getenv("MILVUS_CONSISTENCY_LEVEL", "Session")
+WRITE_BUFFER_ROWS = int(os.getenv("MILVUS_WRITE_BUFFER_ROWS", "1000"))
+WRITE_BUFFER_MAX_AGE = float(os.getenv("MILVUS_WRITE_BUFFER_MAX_AGE", "5"))
+SEARCH_MAX_NQ = int(os.getenv("MILVUS_SEARCH_MAX_NQ", "1024"))
 
-# Connect
-connections.connect(alias="default", host=MILVUS_HOST, port="443", token=MILVUS_TOKEN, secure=True)
-logger.info("Connected to Milvus")
+# Connected lazily on first use (and again in forked workers)
+milvus = MilvusConnection(alias="default", host=MILVUS_HOST, port="443", token=MILVUS_TOKEN, secure=True)
 
-# Create or load collection
-def ensure_collection():
-    if utility.has_collection(COLLECTION_NAME):
-        logger.info(f"Loading existing collection: {COLLECTION_NAME}")
-        return Collection(COLLECTION_NAME)
+_METRIC = {"float32": "COSINE", "float16": "COSINE", "binary": "HAMMING"}[VECTOR_STORAGE]
+_rerank_store = None
+
+def get_rerank_store():
+    """Full-precision side store (compact storage modes only)."""
+    global _rerank_store
+    if _rerank_store is None:
+        _rerank_store = FullPrecisionStore(RERANK_STORE_PATH)
+        logger.info(f"Rerank store at {RERANK_STORE_PATH}")
+    return _rerank_store
+
+def _create_collection(name):
+    from pymilvus import FieldSchema, CollectionSchema, DataType, Collection
+    vector_dtype = {
+        "float32": DataType.FLOAT_VECTOR,
+        "float16": DataType.FLOAT16_VECTOR,
+        "binary": DataType.BINARY_VECTOR,
+    }[VECTOR_STORAGE]
     # define schema
     fields = [
         FieldSchema(name="incident_id", dtype=DataType.VARCHAR, is_primary=True, max_length=64),
-        FieldSchema(name="description_vector", dtype=DataType.FLOAT_VECTOR, dim=VECTOR_DIM),
+        FieldSchema(name="description_vector", dtype=vector_dtype, dim=VECTOR_DIM),
         FieldSchema(name="incident_type", dtype=DataType.VARCHAR, max_length=64),
         FieldSchema(name="summary", dtype=DataType.VARCHAR, max_length=1024),
         FieldSchema(name="raw", dtype=DataType.VARCHAR, max_length=4096),
     ]
     schema = CollectionSchema(fields, description="Cybersecurity incidents")
-    coll = Collection(name=COLLECTION_NAME, schema=schema)
-    logger.info(f"Created collection: {COLLECTION_NAME}")
+    coll = Collection(name=name, schema=schema, consistency_level=CONSISTENCY_LEVEL)
+    logger.info(f"Created collection: {name}")
 
     # Create AUTOINDEX for cloud friendly immediate use
     index_params = {
         "index_type": "AUTOINDEX",
-        "metric_type": "COSINE",
+        "metric_type": _METRIC,
         "params": {}
     }
     logger.info("Creating AUTOINDEX for description_vector...")
@@ -57,7 +80,106 @@ def ensure_collection():
     logger.info("AUTOINDEX created.")
     return coll
 
-collection = ensure_collection()
+def ensure_collection():
+    """Create or load the incidents collection (cached handle)."""
+    return milvus.get_collection(COLLECTION_NAME, create=_create_collection)
+
+def get_loaded_collection():
+    """Collection handle that has been load()ed once for search/query."""
+    return milvus.ensure_loaded(COLLECTION_NAME, create=_create_collection)
+
+def __getattr__(name):
+    # Backwards compatible `milvus_handler.collection`, resolved on first access
+    if name == "collection":
+        return ensure_collection()
+    raise AttributeError(name)
+
+class BufferedWriter:
+    """
+    Accumulates incident rows and sends them with one collection.insert once
+    `max_rows` are pending or the oldest pending row is `max_age` seconds old.
+    Never calls collection.flush(): growing segments are searchable under the
+    collection's consistency level, and Milvus seals segments on its own.
+    Use flush() (or `with writer:`) when the rows must be visible before the
+    next search. A failed insert puts the rows back at the front of the buffer
+    and, for timer flushes, retries after another `max_age` seconds.
+    """
+    def __init__(self, get_collection, max_rows=WRITE_BUFFER_ROWS, max_age=WRITE_BUFFER_MAX_AGE):
+        self.get_collection = get_collection
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self._rows = []
+        self._lock = threading.RLock()
+        self._timer = None
+
+    @property
+    def pending(self):
+        return len(self._rows)
+
+    def add(self, records):
+        with self._lock:
+            if not self._rows and self.max_age > 0:
+                self._start_timer()
+            self._rows.extend(records)
+            if len(self._rows) >= self.max_rows:
+                self.flush()
+        return len(records)
+
+    def _start_timer(self):
+        self._timer = threading.Timer(self.max_age, self._timed_flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _timed_flush(self):
+        try:
+            self.flush()
+        except Exception:
+            pass  # logged and re-buffered by flush(); the timer retries
+
+    def flush(self):
+        """Insert all pending rows; returns the number of rows sent."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            rows, self._rows = self._rows, []
+            if not rows:
+                return 0
+            ids = []
+            vectors = []
+            types = []
+            summaries = []
+            raws = []
+            for r in rows:
+                ids.append(r.get("incident_id"))
+                vectors.append(r.get("vector"))
+                types.append(r.get("incident_type",""))
+                summaries.append(r.get("summary",""))
+                raws.append(r.get("raw",""))
+            try:
+                if VECTOR_STORAGE != "float32":
+                    # Side store first: a row visible in Milvus must be rerankable
+                    get_rerank_store().put_many(ids, vectors)
+                self.get_collection().insert([ids, to_storage(vectors, VECTOR_STORAGE), types, summaries, raws])
+            except Exception as e:
+                self._rows[:0] = rows
+                if self.max_age > 0:
+                    self._start_timer()
+                logger.error(f"Insert of {len(rows)} records into {COLLECTION_NAME} failed, "
+                             f"{len(self._rows)} kept for retry: {e}")
+                raise
+            logger.info(f"Inserted {len(ids)} records into {COLLECTION_NAME}")
+            return len(ids)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        return False
+
+writer = BufferedWriter(ensure_collection)
+atexit.register(writer.flush)
 
 def insert_incidents(records):
     """
@@ -67,48 +189,74 @@ def insert_incidents(records):
       - summary (str)
       - raw (str)
       - vector (list[float])  optional: if not present, must compute external
+    Rows are buffered; call flush() for read-your-writes.
     """
     if not records:
         return 0
-    ids = []
-    vectors = []
-    types = []
-    summaries = []
-    raws = []
-    for r in records:
-        ids.append(r.get("incident_id"))
-        vectors.append(r.get("vector"))
-        types.append(r.get("incident_type",""))
-        summaries.append(r.get("summary",""))
-        raws.append(r.get("raw",""))
-    collection.insert([ids, vectors, types, summaries, raws])
-    collection.flush()
-    logger.info(f"Inserted {len(ids)} records into {COLLECTION_NAME}")
-    # load to memory for searching
-    collection.load()
-    return len(ids)
+    return writer.add(records)
+
+def flush():
+    """Send buffered inserts to Milvus now."""
+    return writer.flush()
 
 def search_similar(vector, top_k=5, output_fields=None):
-    collection.load()
-    params = {"metric_type": "COSINE", "params": {"nprobe": 10}}
+    hits = search_many([vector], top_k=top_k, output_fields=output_fields)
+    return hits[0] if hits else []
+
+def search_many(vectors, top_k=5, filter=None, output_fields=None):
+    """
+    Search many query vectors in one collection.search round trip.
+    filter: optional boolean expression, e.g. "incident_type == 'Malware'".
+    Returns one list of hit dicts per query vector, in input order.
+    With compact storage, top_k * MILVUS_RERANK_FACTOR candidates are fetched
+    and re-scored with exact cosine similarity.
+    """
+    if len(vectors) == 0:
+        return []
+    collection = get_loaded_collection()
+    params = {"metric_type": _METRIC, "params": {"nprobe": 10}}
     output_fields = output_fields or ["incident_id", "incident_type", "summary", "raw"]
-    results = collection.search(
-        data=[vector],
-        anns_field="description_vector",
-        param=params,
-        limit=top_k,
-        output_fields=output_fields
-    )
-    # results is list of hits lists (one per query)
-    hits = results[0] if results else []
+    compact = VECTOR_STORAGE != "float32"
+    if compact and "incident_id" not in output_fields:
+        output_fields = ["incident_id"] + list(output_fields)
+    limit = min(top_k * RERANK_FACTOR, 16384) if compact else top_k
+    data = to_storage(vectors, VECTOR_STORAGE)
     out = []
-    for hit in hits:
-        ent = hit.entity
-        out.append({
-            "incident_id": ent.get("incident_id"),
-            "incident_type": ent.get("incident_type"),
-            "summary": ent.get("summary"),
-            "raw": ent.get("raw"),
-            "score": float(hit.distance)
-        })
-    return out
\ No newline at end of file
+    # Milvus caps the number of queries (nq) per request
+    for start in range(0, len(data), SEARCH_MAX_NQ):
+        results = collection.search(
+            data=data[start:start + SEARCH_MAX_NQ],
+            anns_field="description_vector",
+            param=params,
+            limit=limit,
+            expr=filter,
+            output_fields=output_fields,
+            consistency_level=CONSISTENCY_LEVEL
+        )
+        # results is list of hits lists (one per query)
+        for hits in results:
+            rows = []
+            for hit in hits:
+                ent = hit.entity
+                rows.append({
+                    "incident_id": ent.get("incident_id"),
+                    "incident_type": ent.get("incident_type"),
+                    "summary": ent.get("summary"),
+                    "raw": ent.get("raw"),
+                    "score": float(hit.distance)
+                })
+            out.append(rows)
+    if compact:
+        out = rerank(vectors, out, get_rerank_store(), top_k, VECTOR_STORAGE, VECTOR_DIM)
+    return out
+
+def query_incidents(filter=None, output_fields=None, limit=100):
+    """Scalar-filtered query, e.g. query_incidents("incident_type == 'Malware'")."""
+    collection = get_loaded_collection()
+    output_fields = output_fields or ["incident_id", "incident_type", "summary", "raw"]
+    return collection.query(
+        expr=filter or "incident_id != ''",
+        output_fields=output_fields,
+        limit=limit,
+        consistency_level=CONSISTENCY_LEVEL
+    )
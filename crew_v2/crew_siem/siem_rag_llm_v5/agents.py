@@ -2,7 +2,6 @@
 SOC Agents: Extract, Store, Retrieve, Correlate
 """
 
-from crewai import Agent, LLM
 import os
 
 # ============= LLM SETUP =============
@@ -10,50 +9,69 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 os.environ["GEMINI_API_KEY"] = GOOGLE_API_KEY if GOOGLE_API_KEY else ""
 os.environ["OPENAI_API_KEY"] = "fake-key"
 
-llm = None
-if GOOGLE_API_KEY:
-    llm = LLM(
-        model="gemini/gemini-2.0-flash",
-        temperature=0.3
-    )
-    print("✓ Using Gemini LLM")
-else:
-    print("⚠️  No GOOGLE_API_KEY - LLM features will be limited")
+# crewai/litellm and the Gemini client are only imported and built on first
+# use, so the extract/store/retrieve path never pays for them.
+_llm = None
+_llm_ready = False
 
-# ============= AGENTS =============
-
-extract_agent = Agent(
-    role="SOC Log Parser",
-    goal="Extract malware events from security logs with high accuracy",
-    backstory="Expert SOC analyst with 10+ years identifying malware signatures in logs",
-    llm=None,
-    verbose=True,
-    allow_delegation=False
-)
+def get_llm():
+    global _llm, _llm_ready
+    if not _llm_ready:
+        _llm_ready = True
+        if GOOGLE_API_KEY:
+            from crewai import LLM
+            _llm = LLM(
+                model="gemini/gemini-2.0-flash",
+                temperature=0.3
+            )
+            print("✓ Using Gemini LLM")
+        else:
+            print("⚠️  No GOOGLE_API_KEY - LLM features will be limited")
+    return _llm
 
-store_agent = Agent(
-    role="Vector Database Manager",
-    goal="Store incident vectors efficiently in Milvus",
-    backstory="Database engineer specializing in vector embeddings and semantic search",
-    llm=None,
-    verbose=True,
-    allow_delegation=False
-)
+# ============= AGENTS =============
 
-retrieve_agent = Agent(
-    role="Vector Search Specialist",
-    goal="Find the most relevant similar incidents using vector similarity",
-    backstory="Information retrieval expert with deep knowledge of semantic search algorithms",
-    llm=None,
-    verbose=True,
-    allow_delegation=False
-)
+_AGENT_SPECS = {
+    "extract_agent": dict(
+        role="SOC Log Parser",
+        goal="Extract malware events from security logs with high accuracy",
+        backstory="Expert SOC analyst with 10+ years identifying malware signatures in logs",
+        uses_llm=False
+    ),
+    "store_agent": dict(
+        role="Vector Database Manager",
+        goal="Store incident vectors efficiently in Milvus",
+        backstory="Database engineer specializing in vector embeddings and semantic search",
+        uses_llm=False
+    ),
+    "retrieve_agent": dict(
+        role="Vector Search Specialist",
+        goal="Find the most relevant similar incidents using vector similarity",
+        backstory="Information retrieval expert with deep knowledge of semantic search algorithms",
+        uses_llm=False
+    ),
+    "correlate_agent": dict(
+        role="Senior Threat Analyst",
+        goal="Correlate incidents and generate actionable threat intelligence reports",
+        backstory="15+ years in threat hunting, incident response, and malware analysis",
+        uses_llm=True
+    ),
+}
 
-correlate_agent = Agent(
-    role="Senior Threat Analyst",
-    goal="Correlate incidents and generate actionable threat intelligence reports",
-    backstory="15+ years in threat hunting, incident response, and malware analysis",
-    llm=llm,
-    verbose=True,
-    allow_delegation=False
-)
+def __getattr__(name):
+    """`agents.llm`, `agents.extract_agent`, ... are built on first access"""
+    if name == "llm":
+        return get_llm()
+    if name in _AGENT_SPECS:
+        from crewai import Agent
+        spec = dict(_AGENT_SPECS[name])
+        uses_llm = spec.pop("uses_llm")
+        agent = Agent(
+            **spec,
+            llm=get_llm() if uses_llm else None,
+            verbose=True,
+            allow_delegation=False
+        )
+        globals()[name] = agent
+        return agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -2,70 +2,181 @@
 SOC SIEM Workflow Functions
 """
 
+import io
+import json
+import os
 import uuid
-from tools import embed_text, insert_data, search_data
-from agents import llm
+from collections import OrderedDict
+from itertools import islice
+from dedup import get_deduplicator
+from log_stream import iter_lines, map_lines_parallel
+from rule_engine import get_rule_engine
+from templates import get_template_miner
+from tools import embed_texts, insert_data, search_many
+from agents import get_llm
 
 # ============= EXTRACT FUNCTION =============
+def _event_from_line(line: str):
+    """Malware event dict for one log line, or None if no rule matches"""
+    line = line.strip()
+    if not line:
+        return None
+
+    # One pass over the line for all rules; priority picks the type (rules.json)
+    hit = get_rule_engine().classify(line)
+    if hit is None:
+        return None
+    malware_type, matched_rules = hit
+
+    return {
+        "incident_id": f"inc-{uuid.uuid4().hex[:12]}",
+        "malware_type": malware_type,
+        "matched_rules": matched_rules,
+        "summary": line[:1024],
+        "raw": line[:4096]
+    }
+
+def stream_events(source, use_mmap: bool = True):
+    """
+    Lazily yield malware events from a log path, file object or line iterator.
+    Only the current line is held in memory (see log_stream.py).
+    """
+    for line in iter_lines(source, use_mmap=use_mmap):
+        event = _event_from_line(line)
+        if event is not None:
+            yield event
+
+def stream_events_parallel(path: str, workers: int = None, chunk_bytes: int = 64 << 20):
+    """
+    stream_events() for a log file, scanned by `workers` processes in
+    newline-aligned ranges of about chunk_bytes; events come in file order.
+    """
+    return map_lines_parallel(path, _event_from_line, workers, chunk_bytes)
+
 def extract_events(logs: str) -> list:
     """Parse logs and extract malware events"""
-    keywords = ["ransom", "malware", "trojan", "c2", "powershell", "payload",
-                "beacon", "mimikatz", "encrypt", "suspicious"]
-    
-    events = []
-    for line in logs.strip().splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        
-        lower = line.lower()
-        if any(kw in lower for kw in keywords):
-            malware_type = "unknown"
-            if "ransom" in lower or "encrypt" in lower:
-                malware_type = "ransomware"
-            elif "beacon" in lower or "c2" in lower:
-                malware_type = "c2_communication"
-            elif "powershell" in lower or "payload" in lower:
-                malware_type = "dropper"
-            elif "mimikatz" in lower:
-                malware_type = "credential_theft"
-            
-            events.append({
-                "incident_id": f"inc-{uuid.uuid4().hex[:12]}",
-                "malware_type": malware_type,
-                "summary": line[:1024],
-                "raw": line[:4096]
-            })
-    
+    events = list(stream_events(io.StringIO(logs)))
     print(f"✓ Extracted {len(events)} events")
     return events
 
 # ============= STORE FUNCTION =============
+_TEMPLATE_VECTOR_CACHE = OrderedDict()
+_TEMPLATE_VECTOR_CACHE_SIZE = 10000
+
+def _template_vectors(template_ids: list, templates: list) -> list:
+    """
+    Embedding per template_id, each template encoded once. A template's text
+    widens as it absorbs lines; its ID keeps the vector it was first stored with.
+    """
+    missing = {}
+    for tid, text in zip(template_ids, templates):
+        if tid not in _TEMPLATE_VECTOR_CACHE and tid not in missing:
+            missing[tid] = text
+    if missing:
+        for tid, vec in zip(missing, embed_texts(list(missing.values()))):
+            _TEMPLATE_VECTOR_CACHE[tid] = vec
+    out = []
+    for tid in template_ids:
+        _TEMPLATE_VECTOR_CACHE.move_to_end(tid)
+        out.append(_TEMPLATE_VECTOR_CACHE[tid])
+    while len(_TEMPLATE_VECTOR_CACHE) > _TEMPLATE_VECTOR_CACHE_SIZE:
+        _TEMPLATE_VECTOR_CACHE.popitem(last=False)
+    return out
+
 def store_events(events: list) -> dict:
     """Embed and store events in Milvus"""
     if not events:
-        return {"stored": 0, "events": []}
-    
+        return {"stored": 0, "events": [], "duplicates": 0}
+
+    # Repeats of an already seen alert only bump its counter: no vector, no insert
+    dedup = get_deduplicator()
+    unique, pending = dedup.unique(events) if dedup else (events, None)
+    duplicates = len(events) - len(unique)
+    if duplicates:
+        print(f"✓ Suppressed {duplicates} near-duplicate events")
+    if not unique:
+        dedup.commit(pending)
+        return {"stored": 0, "events": events, "duplicates": duplicates}
+
+    miner = get_template_miner()
+    if miner:
+        # One vector per template: a burst of one message shape costs one embedding
+        for event in unique:
+            event["template_id"], event["template"], event["params"] = miner.add(event.get("raw", ""))
+        vecs = _template_vectors([event["template_id"] for event in unique],
+                                 [event["template"] for event in unique])
+    else:
+        vecs = embed_texts([event.get("summary", "") for event in unique])
     records = []
-    for event in events:
-        vec = embed_text(event.get("summary", ""))
+    for event, vec in zip(unique, vecs):
         records.append({
             "incident_id": event["incident_id"],
-            "vector": vec,
+            "vector": vec.tolist(),
             "malware_type": event.get("malware_type", "unknown"),
             "summary": event.get("summary", ""),
-            "raw": event.get("raw", "")
+            "raw": event.get("raw", ""),
+            "template_id": event.get("template_id", ""),
+            "template": event.get("template", "")[:1024],
+            "params": json.dumps(event.get("params", []))[:2048]
         })
     
     count = insert_data(records)
+    if dedup:
+        # Only after the insert: a failed batch leaves no fingerprints behind
+        dedup.commit(pending)
     print(f"✓ Stored {count} events")
-    return {"stored": count, "events": events}
+    return {"stored": count, "events": events, "duplicates": duplicates}
+
+def store_event_stream(events, batch_size: int = 1000) -> dict:
+    """
+    Embed and store an event iterator (e.g. stream_events(path)) batch by batch,
+    so memory stays bounded by batch_size however long the log is.
+    Returns totals plus the first event seen (handy as a retrieval query).
+    """
+    events = iter(events)
+    stored = 0
+    duplicates = 0
+    seen = 0
+    batches = 0
+    first = None
+    while True:
+        batch = list(islice(events, batch_size))
+        if not batch:
+            break
+        if first is None:
+            first = batch[0]
+        seen += len(batch)
+        result = store_events(batch)
+        stored += result["stored"]
+        duplicates += result["duplicates"]
+        batches += 1
+    print(f"✓ Streamed {seen} events in {batches} batches ({duplicates} near-duplicates suppressed)")
+    result = {"stored": stored, "extracted": seen, "duplicates": duplicates, "batches": batches,
+              "first_event": first}
+    miner = get_template_miner()
+    if miner:
+        result["templates"] = miner.stats()
+        print(f"✓ {result['templates']['lines']} lines -> {result['templates']['templates']} templates "
+              f"(compression {result['templates']['compression_ratio']:.1f}x)")
+    return result
 
 # ============= RETRIEVE FUNCTION =============
 def retrieve_similar(query: str, top_k: int = 5) -> list:
     """Search for similar incidents"""
-    hits = search_data(query, top_k=top_k)
-    print(f"✓ Retrieved {len(hits)} incidents")
+    return retrieve_similar_many([query], top_k=top_k)[0]
+
+def retrieve_similar_many(queries: list, top_k: int = 5) -> list:
+    """Search for similar incidents for a batch of queries in one round trip"""
+    if not queries:
+        return []
+    hits = search_many(embed_texts(queries), top_k=top_k)
+    dedup = get_deduplicator()
+    if dedup and any(hits):
+        seen = dedup.occurrences(h["incident_id"] for per_query in hits for h in per_query)
+        for per_query in hits:
+            for h in per_query:
+                h["occurrences"] = seen[h["incident_id"]]
+    print(f"✓ Retrieved {sum(len(h) for h in hits)} incidents for {len(queries)} queries")
     return hits
 
 # ============= CORRELATE FUNCTION =============
@@ -95,6 +206,7 @@ Provide a structured report with:
 
 Use clear, actionable language."""
     
+    llm = get_llm()
     if llm:
         try:
             response = llm.call([{"role": "user", "content": prompt}])
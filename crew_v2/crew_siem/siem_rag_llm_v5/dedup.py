@@ -0,0 +1,178 @@
+"""
+Near-duplicate suppression between extract and store.
+
+A line's fingerprint is a hash of the line with volatile tokens (timestamps,
+PIDs, ports, hex IDs, UUIDs) replaced by placeholders, so repeats of the same
+alert that differ only in those tokens collapse onto the first incident.
+Fingerprints live in a bounded LRU; a duplicate bumps the occurrence counter
+of the incident it repeats instead of producing a new vector.
+
+Counters and recent fingerprints are kept in a small SQLite file
+(SIEM_DEDUP_PATH, default dedup_state.sqlite; empty = memory only), so a
+repeat on the next run still maps to the stored incident and
+retrieve_similar can report how often each hit was seen.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEDUP_ENABLED = os.getenv("SIEM_DEDUP", "true").lower() in ("1", "true", "yes")
+DEDUP_MAX_ITEMS = int(os.getenv("SIEM_DEDUP_MAX_ITEMS", "200000"))
+DEDUP_PATH = os.getenv("SIEM_DEDUP_PATH", "dedup_state.sqlite")
+
+_MONTHS = "jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec"
+# Applied in order to the lowercased line
+VOLATILE = [
+    (re.compile(r"\d{4}-\d{2}-\d{2}[t ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:z|[+-]\d{2}:?\d{2})?"), "<ts>"),
+    (re.compile(rf"\b(?:{_MONTHS})\s+\d{{1,2}}\s+\d{{2}}:\d{{2}}:\d{{2}}\b"), "<ts>"),
+    (re.compile(r"\b\d{2}:\d{2}:\d{2}(?:[.,]\d+)?\b"), "<ts>"),
+    (re.compile(r"\b1\d{9}(?:\d{3})?\b"), "<ts>"),
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b"), "<hex>"),
+    (re.compile(r"\b0x[0-9a-f]+\b"), "<hex>"),
+    (re.compile(r"\b(?=[0-9a-f]*\d)[0-9a-f]{8,}\b"), "<hex>"),
+    (re.compile(r"\b(pid|ppid|tid|process_id)([=:]\s*|\s+)\d+"), r"\1=<pid>"),
+    (re.compile(r"\[\d+\]"), "[<pid>]"),
+    (re.compile(r"\b(port|sport|dport|src_port|dst_port|spt|dpt)([=:]\s*|\s+)\d+"), r"\1=<port>"),
+    (re.compile(r"(?<=\d):\d{1,5}\b"), ":<port>"),
+]
+
+def normalize_line(line: str) -> str:
+    text = line.lower()
+    for pattern, repl in VOLATILE:
+        text = pattern.sub(repl, text)
+    return " ".join(text.split())
+
+def fingerprint(line: str) -> str:
+    return hashlib.blake2b(normalize_line(line).encode("utf-8"), digest_size=12).hexdigest()
+
+class Deduplicator:
+    def __init__(self, max_items=DEDUP_MAX_ITEMS, path=DEDUP_PATH):
+        self.max_items = max_items
+        self._recent = OrderedDict()  # fingerprint -> incident_id
+        self._new = {}                # fingerprints not yet persisted
+        self._bumps = {}              # incident_id -> occurrences since last flush
+        self._lock = threading.Lock()
+        self.seen = 0
+        self.duplicates = 0
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints ("
+                " fingerprint TEXT PRIMARY KEY, incident_id TEXT NOT NULL,"
+                " occurrences INTEGER NOT NULL, last_seen REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_fp_incident ON fingerprints(incident_id)")
+            self._db.commit()
+            rows = self._db.execute(
+                "SELECT fingerprint, incident_id FROM fingerprints ORDER BY last_seen DESC LIMIT ?",
+                (max_items,)
+            ).fetchall()
+            for fp, incident_id in reversed(rows):
+                self._recent[fp] = incident_id
+
+    def unique(self, events):
+        """
+        -> (events that are not near-duplicates of one already seen, pending).
+        Nothing is recorded until commit(pending): call it once the unique
+        events are stored, so a failed insert leaves no fingerprint pointing
+        at an incident that does not exist.
+        """
+        fps = [fingerprint(e.get("raw") or e.get("summary", "")) for e in events]
+        new = OrderedDict()  # fingerprint -> incident_id, first in this batch
+        bumps = {}
+        out = []
+        with self._lock:
+            for event, fp in zip(events, fps):
+                self.seen += 1
+                incident_id = self._recent.get(fp) or new.get(fp)
+                if incident_id is None:
+                    new[fp] = event["incident_id"]
+                    out.append(event)
+                    continue
+                if fp in self._recent:
+                    self._recent.move_to_end(fp)
+                bumps[incident_id] = bumps.get(incident_id, 0) + 1
+                self.duplicates += 1
+        return out, (new, bumps)
+
+    def commit(self, pending):
+        """Record the fingerprints and counts of a stored batch and persist them."""
+        new, bumps = pending
+        with self._lock:
+            for fp, incident_id in new.items():
+                self._recent[fp] = incident_id
+                self._new[fp] = incident_id
+            while len(self._recent) > self.max_items:
+                self._recent.popitem(last=False)
+            for incident_id, n in bumps.items():
+                self._bumps[incident_id] = self._bumps.get(incident_id, 0) + n
+        self.flush()
+
+    def flush(self):
+        """Persist new fingerprints and counter increments."""
+        with self._lock:
+            new, self._new = self._new, {}
+            if self._db is None:
+                return  # memory only: counters stay in _bumps
+            bumps, self._bumps = self._bumps, {}
+            if not (new or bumps):
+                return
+            now = time.time()
+            self._db.executemany(
+                "INSERT OR IGNORE INTO fingerprints (fingerprint, incident_id, occurrences, last_seen)"
+                " VALUES (?, ?, 1, ?)",
+                [(fp, incident_id, now) for fp, incident_id in new.items()]
+            )
+            self._db.executemany(
+                "UPDATE fingerprints SET occurrences = occurrences + ?, last_seen = ? WHERE incident_id = ?",
+                [(n, now, incident_id) for incident_id, n in bumps.items()]
+            )
+            # Keep the table about as large as the in-memory LRU
+            self._db.execute(
+                "DELETE FROM fingerprints WHERE fingerprint NOT IN ("
+                " SELECT fingerprint FROM fingerprints ORDER BY last_seen DESC LIMIT ?)",
+                (self.max_items,)
+            )
+            self._db.commit()
+
+    def occurrences(self, incident_ids) -> dict:
+        """incident_id -> times seen (1 for incidents without duplicates)."""
+        ids = list(incident_ids)
+        out = {i: 1 for i in ids}
+        with self._lock:
+            if self._db is not None:
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start:start + 500]
+                    marks = ",".join("?" * len(chunk))
+                    for incident_id, n in self._db.execute(
+                        f"SELECT incident_id, occurrences FROM fingerprints WHERE incident_id IN ({marks})", chunk
+                    ):
+                        out[incident_id] = max(out[incident_id], n)
+            for incident_id in ids:
+                out[incident_id] += self._bumps.get(incident_id, 0)
+        return out
+
+    def stats(self) -> dict:
+        return {
+            "seen": self.seen,
+            "duplicates": self.duplicates,
+            "duplicate_ratio": self.duplicates / self.seen if self.seen else 0.0,
+            "tracked": len(self._recent),
+        }
+
+_dedup = None
+
+def get_deduplicator():
+    """Process-wide deduplicator, or None when SIEM_DEDUP is disabled"""
+    global _dedup
+    if not DEDUP_ENABLED:
+        return None
+    if _dedup is None:
+        _dedup = Deduplicator()
+    return _dedup
@@ -0,0 +1,181 @@
+"""
+Content-addressed embedding cache.
+
+Vectors are keyed by (model name, sha256 of whitespace-normalized text) and
+kept in two tiers: a small in-memory LRU in front of a SQLite table holding
+raw float32 blobs. The SQLite tier is bounded by row count and evicts the
+least recently used rows. Several models can share one file: the row bound
+applies per model, over the model's own key range.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger("embed_cache")
+
+def normalize_text(text):
+    return " ".join((text or "").split())
+
+def cache_key(model_name, text):
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model_name}:{digest}"
+
+class EmbeddingCache:
+    def __init__(self, path, model_name, max_memory_items=10000, max_disk_items=1000000):
+        self.path = path
+        self.model_name = model_name
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.encode_seconds = 0.0
+        self.encoded = 0
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._db.commit()
+        # Keys of this model are "<model_name>:<digest>", i.e. [model_name + ":", model_name + ";")
+        self._key_range = (f"{model_name}:", f"{model_name};")
+        self._disk_count = self._db.execute(
+            "SELECT COUNT(*) FROM embeddings WHERE key >= ? AND key < ?", self._key_range
+        ).fetchone()[0]
+
+    def _remember(self, key, vec):
+        self._mem[key] = vec
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_memory_items:
+            self._mem.popitem(last=False)
+
+    def get_many(self, texts):
+        """Return a list aligned with texts: float32 vector on hit, None on miss."""
+        keys = [cache_key(self.model_name, t) for t in texts]
+        out = [None] * len(keys)
+        with self._lock:
+            pending = {}
+            for i, key in enumerate(keys):
+                vec = self._mem.get(key)
+                if vec is not None:
+                    self._mem.move_to_end(key)
+                    out[i] = vec
+                    self.memory_hits += 1
+                else:
+                    pending.setdefault(key, []).append(i)
+
+            found = []
+            pending_keys = list(pending)
+            # stay below SQLite's bound-parameter limit
+            for start in range(0, len(pending_keys), 500):
+                chunk = pending_keys[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    vec = np.frombuffer(blob, dtype=np.float32)
+                    self._remember(key, vec)
+                    found.append(key)
+                    for i in pending[key]:
+                        out[i] = vec
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                     [(now, k) for k in found])
+                self._db.commit()
+
+            n_hit = sum(1 for v in out if v is not None)
+            self.hits += n_hit
+            self.misses += len(out) - n_hit
+        return out
+
+    def put_many(self, texts, vectors):
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vec in zip(texts, vectors):
+                vec = np.asarray(vec, dtype=np.float32)
+                key = cache_key(self.model_name, text)
+                self._remember(key, vec)
+                rows.append((key, vec.tobytes(), now))
+            cur = self._db.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            self._disk_count += max(cur.rowcount, 0)
+            if self._disk_count > self.max_disk_items:
+                self._evict(self._disk_count - self.max_disk_items)
+            self._db.commit()
+
+    def _evict(self, n):
+        # Drop an extra 10% so we don't evict on every insert once full
+        n += self.max_disk_items // 10
+        cur = self._db.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            " SELECT key FROM embeddings WHERE key >= ? AND key < ? ORDER BY last_used ASC LIMIT ?)",
+            (*self._key_range, n)
+        )
+        self._disk_count -= cur.rowcount
+        self.evictions += cur.rowcount
+
+    def record_encode(self, n, seconds):
+        """Track encoder cost so stats() can estimate the CPU time saved by hits."""
+        with self._lock:
+            self.encoded += n
+            self.encode_seconds += seconds
+
+    def stats(self):
+        total = self.hits + self.misses
+        per_text = self.encode_seconds / self.encoded if self.encoded else 0.0
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.hits - self.memory_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "disk_items": self._disk_count,
+            "memory_items": len(self._mem),
+            "est_seconds_saved": self.hits * per_text,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_cache(model_name):
+    """
+    Process-wide cache for model_name, or None when EMBED_CACHE is disabled.
+    Models share the SQLite file; each gets its own instance so keys and
+    in-memory LRU never mix. Each instance counts and evicts only its own
+    model's rows, so EMBED_CACHE_MAX_ITEMS is a per-model bound.
+    """
+    if os.getenv("EMBED_CACHE", "true").lower() not in ("1", "true", "yes"):
+        return None
+    with _caches_lock:
+        cache = _caches.get(model_name)
+        if cache is None:
+            cache = _caches[model_name] = EmbeddingCache(
+                os.getenv("EMBED_CACHE_PATH", "embed_cache.sqlite"),
+                model_name,
+                max_memory_items=int(os.getenv("EMBED_CACHE_MEMORY_ITEMS", "10000")),
+                max_disk_items=int(os.getenv("EMBED_CACHE_MAX_ITEMS", "1000000")),
+            )
+            logger.info(f"Embedding cache for {model_name} at {cache.path} ({cache._disk_count} cached vectors)")
+    return cache
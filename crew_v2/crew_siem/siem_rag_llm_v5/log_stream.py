@@ -0,0 +1,117 @@
+"""
+Line sources for extract_events: one line at a time from a path, a file
+object or any iterator of lines, without holding the whole log in memory.
+map_lines_parallel scans newline-aligned ranges of one file in worker
+processes.
+"""
+import mmap
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+READ_BUFFER = 1 << 20
+
+def _decode(line):
+    if isinstance(line, (bytes, bytearray, memoryview)):
+        return bytes(line).decode("utf-8", errors="replace")
+    return line
+
+def _iter_path(path, use_mmap):
+    with open(path, "rb", buffering=READ_BUFFER) as f:
+        if use_mmap and os.fstat(f.fileno()).st_size > 0:
+            # Pages are mapped in on demand and dropped by the OS, so a multi-GB
+            # export costs page cache, not heap
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield from iter(mm.readline, b"")
+        else:
+            yield from f
+
+def iter_lines(source, use_mmap=True):
+    """
+    Yield text lines (line ending included) from:
+      - a path (str / os.PathLike): memory-mapped, or read with a 1 MiB buffer
+        when use_mmap=False
+      - a text or binary file object
+      - any iterable of str/bytes lines
+    Bytes are decoded as UTF-8 with replacement of invalid sequences.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        lines = _iter_path(os.fspath(source), use_mmap)
+    else:
+        # File objects iterate line by line through their own buffer
+        lines = source
+    for line in lines:
+        yield _decode(line)
+
+def split_ranges(path, n_chunks):
+    """
+    Split a file into about n_chunks (start, end) byte ranges whose
+    boundaries fall just after a newline, so no line spans two ranges.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    n_chunks = max(1, min(n_chunks, size))
+    step = size // n_chunks
+    bounds = [0]
+    with open(path, "rb") as f:
+        for i in range(1, n_chunks):
+            pos = max(i * step, bounds[-1])
+            if pos >= size:
+                break
+            f.seek(pos)
+            f.readline()  # finish the line that straddles the cut
+            pos = f.tell()
+            if pos >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def iter_range_lines(path, start, end):
+    """Yield the text lines of bytes [start, end) of a newline-aligned range via mmap."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        mm.seek(start)
+        while mm.tell() < end:
+            line = mm.readline()
+            if not line:
+                break
+            yield _decode(line)
+
+def _map_range(path, start, end, parse_line):
+    # Runs in a worker process: scan one newline-aligned mmap slice
+    out = []
+    for line in iter_range_lines(path, start, end):
+        item = parse_line(line)
+        if item is not None:
+            out.append(item)
+    return out
+
+def map_lines_parallel(path, parse_line, workers=None, chunk_bytes=64 << 20):
+    """
+    Yield parse_line(line) for each line of a file, skipping None, scanned by
+    `workers` processes. parse_line must be a module-level function so it can
+    be pickled. The file is split into newline-aligned ranges of about
+    chunk_bytes; at most 2 * workers ranges are in flight, and results are
+    yielded in file order.
+    """
+    workers = workers or os.cpu_count() or 1
+    size = os.path.getsize(path)
+    ranges = split_ranges(path, max(workers, -(-size // chunk_bytes)))
+    if workers == 1:
+        for start, end in ranges:
+            yield from _map_range(path, start, end, parse_line)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        ranges = iter(ranges)
+        for start, end in islice(ranges, 2 * workers):
+            pending.append(pool.submit(_map_range, path, start, end, parse_line))
+        while pending:
+            items = pending.popleft().result()
+            nxt = next(ranges, None)
+            if nxt is not None:
+                pending.append(pool.submit(_map_range, path, *nxt, parse_line))
+            yield from items
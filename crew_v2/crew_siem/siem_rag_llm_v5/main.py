@@ -3,7 +3,11 @@ Main Entry Point for SOC SIEM Workflow
 """
 
 from dotenv import load_dotenv
-from crew_siem import extract_events, store_events, retrieve_similar, correlate_incidents
+import argparse
+from crew_siem import (extract_events, store_events, stream_events, stream_events_parallel,
+                       store_event_stream, retrieve_similar, retrieve_similar_many,
+                       correlate_incidents)
+from tools import cache_stats
 
 load_dotenv()
 
@@ -29,7 +33,14 @@ def run_soc_workflow(logs: str, query: str = None):
     # Step 3: Retrieve similar incidents
     print("Step 3: Retrieving similar incidents...")
     search_query = query if query else events[0]["summary"]
-    similar = retrieve_similar(search_query, top_k=5)
+    # The query and every extracted event in one search round trip
+    summaries = [e["summary"] for e in events]
+    hits = retrieve_similar_many([search_query] + summaries if query else summaries, top_k=5)
+    similar = hits[0]
+    for event, event_hits in zip(events, hits[1:] if query else hits):
+        if event_hits:
+            top = event_hits[0]
+            print(f"  [{event['malware_type']}] closest: {top['incident_id']} ({top['score']:.3f})")
 
     print(f"Retrieved {len(similar)} similar incidents\n")
     print(f"Search Query: {search_query}\n")
@@ -42,6 +53,30 @@ def run_soc_workflow(logs: str, query: str = None):
     
     return report
 
+def run_soc_workflow_file(log_file: str, query: str = None, batch_size: int = 1000, workers: int = 1):
+    """
+    Same workflow for a log file of any size: events are extracted lazily and
+    stored in batches instead of materializing the whole log.
+    """
+    print("\n" + "="*80)
+    print(f"RUNNING SOC WORKFLOW ON {log_file}")
+    print("="*80 + "\n")
+
+    print("Step 1+2: Streaming malware events into Milvus...")
+    events_iter = stream_events_parallel(log_file, workers) if workers > 1 else stream_events(log_file)
+    result = store_event_stream(events_iter, batch_size=batch_size)
+    if not result["first_event"]:
+        return "No malware events detected in logs."
+    print(f"Stored {result['stored']} of {result['extracted']} events\n")
+
+    print("Step 3: Retrieving similar incidents...")
+    search_query = query if query else result["first_event"]["summary"]
+    similar = retrieve_similar(search_query, top_k=5)
+    print(f"Retrieved {len(similar)} similar incidents\n")
+
+    print("\nStep 4: Generating correlation report...\n")
+    return correlate_incidents(search_query, similar)
+
 
 if __name__ == "__main__":
     # Sample malicious logs
@@ -54,14 +89,30 @@ if __name__ == "__main__":
 2025-10-19 14:27:18 ALERT: Trojan payload downloaded from malicious domain evil.com
     """
     
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log-file", help="stream events from this log file instead of the sample logs")
+    parser.add_argument("--query", default="ransomware encryption activity detected")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=1, help="extraction processes for --log-file")
+    args = parser.parse_args()
+
     # Run workflow
-    report = run_soc_workflow(
-        logs=sample_logs,
-        query="ransomware encryption activity detected"
-    )
+    if args.log_file:
+        report = run_soc_workflow_file(args.log_file, query=args.query, batch_size=args.batch_size,
+                                       workers=args.workers)
+    else:
+        report = run_soc_workflow(
+            logs=sample_logs,
+            query=args.query
+        )
     
     # Display results
     print("\n" + "="*80)
     print("THREAT INTELLIGENCE REPORT")
     print("="*80 + "\n")
     print(report)
+
+    stats = cache_stats()
+    if stats:
+        print(f"\n✓ Embedding cache: {stats['hits']} hits / {stats['misses']} misses "
+              f"(~{stats['est_seconds_saved']:.2f}s encode time saved)")
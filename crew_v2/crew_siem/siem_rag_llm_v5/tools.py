@@ -2,9 +2,12 @@
 Milvus Vector Database Tools
 """
 
-from pymilvus import connections, Collection, utility, FieldSchema, CollectionSchema, DataType
-from sentence_transformers import SentenceTransformer
+import numpy as np
 import os
+import time
+from embed_cache import get_cache
+from embed_engines import load_engine
+from milvus_conn import MilvusConnection
 
 # ============= CONFIGURATION =============
 MILVUS_HOST = os.getenv("MILVUS_HOST", "localhost")
@@ -16,60 +19,117 @@ MILVUS_HOST = os.getenv("MILVUS_HOST")
 MILVUS_TOKEN = os.getenv("MILVUS_TOKEN")
 COLLECTION_NAME = os.getenv("MILVUS_COLLECTION", "malware_incidents")
 VECTOR_DIM = int(os.getenv("VECTOR_DIM", "384"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# Session consistency: our own inserts are searchable without collection.flush()
+CONSISTENCY_LEVEL = os.getenv("MILVUS_CONSISTENCY_LEVEL", "Session")
+SEARCH_MAX_NQ = int(os.getenv("MILVUS_SEARCH_MAX_NQ", "1024"))
 
 
 # ============= EMBEDDING MODEL =============
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-print("✓ Loaded embedding model: all-MiniLM-L6-v2")
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+# torch | onnx | onnx-int8 (see embed_engines.py)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+# Quantized/ONNX vectors are close to, but not bit-identical with, torch ones
+_CACHE_MODEL_NAME = EMBED_MODEL_NAME if EMBED_BACKEND == "torch" else f"{EMBED_MODEL_NAME}@{EMBED_BACKEND}"
+_embedding_engine = None
+
+def get_embedding_engine():
+    """Embedding engine for EMBED_BACKEND, imported and loaded on first embed (not at import)"""
+    global _embedding_engine
+    if _embedding_engine is None:
+        _embedding_engine = load_engine(EMBED_BACKEND, EMBED_MODEL_NAME)
+        print(f"✓ Loaded embedding model: {EMBED_MODEL_NAME} ({EMBED_BACKEND})")
+    return _embedding_engine
 
 # ============= MILVUS CONNECTION =============
-def init_milvus():
-    """Initialize Milvus connection and collection"""
-    
-    connections.connect(
-        alias="default",
-        host=MILVUS_HOST,
-        port="443",
-        token=MILVUS_TOKEN,
-        secure=True
-    )
-
-    print(f"✓ Connected to Milvus at {MILVUS_HOST}:{MILVUS_PORT}")
-    
-    # Create collection if not exists
-    if not utility.has_collection(COLLECTION_NAME):
-        fields = [
-            FieldSchema(name="incident_id", dtype=DataType.VARCHAR, is_primary=True, max_length=128),
-            FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=384),
-            FieldSchema(name="malware_type", dtype=DataType.VARCHAR, max_length=256),
-            FieldSchema(name="summary", dtype=DataType.VARCHAR, max_length=2048),
-            FieldSchema(name="raw", dtype=DataType.VARCHAR, max_length=8192)
-        ]
-        schema = CollectionSchema(fields, description="SOC incident vectors")
-        collection = Collection(name=COLLECTION_NAME, schema=schema)
-        
-        # Create HNSW index
-        index_params = {
-            "metric_type": "COSINE",
-            "index_type": "HNSW",
-            "params": {"M": 16, "efConstruction": 256}
-        }
-        collection.create_index(field_name="vector", index_params=index_params)
-        print(f"✓ Created collection: {COLLECTION_NAME}")
-    else:
-        collection = Collection(name=COLLECTION_NAME)
-        print(f"✓ Loaded existing collection: {COLLECTION_NAME}")
+# Connects on first use, not at import (and reconnects in forked workers)
+milvus = MilvusConnection(
+    alias="default",
+    host=MILVUS_HOST,
+    port="443",
+    token=MILVUS_TOKEN,
+    secure=True
+)
+
+def _create_collection(name: str):
+    """Create collection with HNSW index"""
+    from pymilvus import Collection, FieldSchema, CollectionSchema, DataType
+    fields = [
+        FieldSchema(name="incident_id", dtype=DataType.VARCHAR, is_primary=True, max_length=128),
+        FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=384),
+        FieldSchema(name="malware_type", dtype=DataType.VARCHAR, max_length=256),
+        FieldSchema(name="summary", dtype=DataType.VARCHAR, max_length=2048),
+        FieldSchema(name="raw", dtype=DataType.VARCHAR, max_length=8192),
+        # Log template (templates.py) and its parameters as a JSON list
+        FieldSchema(name="template_id", dtype=DataType.VARCHAR, max_length=64),
+        FieldSchema(name="template", dtype=DataType.VARCHAR, max_length=1024),
+        FieldSchema(name="params", dtype=DataType.VARCHAR, max_length=2048)
+    ]
+    schema = CollectionSchema(fields, description="SOC incident vectors")
+    collection = Collection(name=name, schema=schema, consistency_level=CONSISTENCY_LEVEL)
     
-    collection.load()
+    # Create HNSW index
+    index_params = {
+        "metric_type": "COSINE",
+        "index_type": "HNSW",
+        "params": {"M": 16, "efConstruction": 256}
+    }
+    collection.create_index(field_name="vector", index_params=index_params)
+    print(f"✓ Created collection: {name}")
     return collection
 
-# Initialize collection
-collection = init_milvus()
+def init_milvus():
+    """Milvus collection handle: created if missing, load()ed once per process"""
+    return milvus.ensure_loaded(COLLECTION_NAME, create=_create_collection)
 
 # ============= EMBEDDING FUNCTION =============
 def embed_text(text: str) -> list:
     """Generate embedding vector for text"""
-    return embedding_model.encode(text).tolist()
+    return embed_texts([text])[0].tolist()
+
+def _encode(texts: list, batch_size: int) -> np.ndarray:
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    out = None
+    for start in range(0, len(order), batch_size):
+        idx = order[start:start + batch_size]
+        vecs = get_embedding_engine().encode([texts[i] for i in idx])
+        if out is None:
+            out = np.empty((len(texts), vecs.shape[1]), dtype=np.float32)
+        out[idx] = vecs
+    return out
+
+def embed_texts(texts, batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+    """Embed many texts in length-sorted mini-batches -> float32 array (n, dim), cache-aware"""
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, VECTOR_DIM), dtype=np.float32)
+
+    cache = get_cache(_CACHE_MODEL_NAME)
+    if cache is None:
+        return _encode(texts, batch_size)
+
+    cached = cache.get_many(texts)
+    miss_idx = [i for i, v in enumerate(cached) if v is None]
+    if not miss_idx:
+        return np.stack(cached).astype(np.float32, copy=False)
+
+    miss_texts = [texts[i] for i in miss_idx]
+    t0 = time.perf_counter()
+    fresh = _encode(miss_texts, batch_size)
+    cache.record_encode(len(miss_texts), time.perf_counter() - t0)
+    cache.put_many(miss_texts, fresh)
+
+    out = np.empty((len(texts), fresh.shape[1]), dtype=np.float32)
+    out[miss_idx] = fresh
+    for i, vec in enumerate(cached):
+        if vec is not None:
+            out[i] = vec
+    return out
+
+def cache_stats() -> dict:
+    """Hit/miss counters of the embedding cache ({} when disabled)"""
+    cache = get_cache(_CACHE_MODEL_NAME)
+    return cache.stats() if cache else {}
 
 # ============= INSERT FUNCTION =============
 def insert_data(records: list) -> int:
@@ -77,39 +137,49 @@ def insert_data(records: list) -> int:
     if not records:
         return 0
     
-    ids = [r["incident_id"] for r in records]
-    vectors = [r["vector"] for r in records]
-    types = [r["malware_type"] for r in records]
-    summaries = [r["summary"] for r in records]
-    raws = [r["raw"] for r in records]
-    
-    collection.insert([ids, vectors, types, summaries, raws])
-    collection.flush()
+    collection = init_milvus()
+    # Columns follow the collection's own schema, so collections created
+    # before the template fields were added still work
+    columns = [[r.get(f.name, "") for r in records] for f in collection.schema.fields]
+    collection.insert(columns)
     
     return len(records)
 
 # ============= SEARCH FUNCTION =============
+def search_many(vectors, top_k: int = 5, filter: str = None) -> list:
+    """Search many query vectors in one round trip -> one hit list per vector"""
+    if len(vectors) == 0:
+        return []
+    
+    search_params = {"metric_type": "COSINE", "params": {"ef": max(128, top_k)}}
+    data = [v.tolist() if hasattr(v, "tolist") else v for v in vectors]
+    out = []
+    # Milvus caps the number of queries (nq) per request
+    for start in range(0, len(data), SEARCH_MAX_NQ):
+        results = init_milvus().search(
+            data=data[start:start + SEARCH_MAX_NQ],
+            anns_field="vector",
+            param=search_params,
+            limit=top_k,
+            expr=filter,
+            output_fields=["incident_id", "malware_type", "summary", "raw"],
+            consistency_level=CONSISTENCY_LEVEL
+        )
+        
+        for query_hits in results:
+            hits = []
+            for result in query_hits:
+                hits.append({
+                    "incident_id": result.entity.get("incident_id"),
+                    "malware_type": result.entity.get("malware_type"),
+                    "summary": result.entity.get("summary"),
+                    "raw": result.entity.get("raw"),
+                    "score": result.distance
+                })
+            out.append(hits)
+    return out
+
 def search_data(query: str, top_k: int = 5) -> list:
     """Search for similar incidents"""
     query_vec = embed_text(query)
-    
-    search_params = {"metric_type": "COSINE", "params": {"ef": 128}}
-    results = collection.search(
-        data=[query_vec],
-        anns_field="vector",
-        param=search_params,
-        limit=top_k,
-        output_fields=["incident_id", "malware_type", "summary", "raw"]
-    )
-    
-    hits = []
-    for result in results[0]:
-        hits.append({
-            "incident_id": result.entity.get("incident_id"),
-            "malware_type": result.entity.get("malware_type"),
-            "summary": result.entity.get("summary"),
-            "raw": result.entity.get("raw"),
-            "score": result.distance
-        })
-    
-    return hits
+    return search_many([query_vec], top_k=top_k)[0]
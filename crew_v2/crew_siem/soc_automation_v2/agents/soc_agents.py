@@ -1,69 +1,77 @@
 # soc_agents.py
-from crewai import Agent, LLM
-from langchain_google_genai import ChatGoogleGenerativeAI
 import os
 
+# crewai/litellm and the Gemini client are imported and built on first access
+# of `llm` or an agent, so the ClickHouse-only detection path never pays for them.
+_llm = None
 
-llm = LLM(
-    model="gemini/gemini-2.0-flash",
-    verbose=True,
-    api_key=os.getenv("GOOGLE_API_KEY"),
-    temperature=0.7
-)
+def get_llm():
+    global _llm
+    if _llm is None:
+        from crewai import LLM
+        _llm = LLM(
+            model="gemini/gemini-2.0-flash",
+            verbose=True,
+            api_key=os.getenv("GOOGLE_API_KEY"),
+            temperature=0.7
+        )
+    return _llm
 
-# === Investigator Agent ===
-investigator = Agent(
-    name="Investigator",
-    role="Investigate failed login attempts and find suspicious patterns.",
-    goal="Identify brute-force attempts or credential stuffing activity.",
-    backstory=(
-        "You are a seasoned SOC analyst who investigates failed logins "
-        "across multiple systems to uncover possible brute-force attacks. "
-        "You use correlation logic to find repeated failed attempts in short time windows."
+_AGENT_SPECS = {
+    # === Investigator Agent ===
+    "investigator": dict(
+        name="Investigator",
+        role="Investigate failed login attempts and find suspicious patterns.",
+        goal="Identify brute-force attempts or credential stuffing activity.",
+        backstory=(
+            "You are a seasoned SOC analyst who investigates failed logins "
+            "across multiple systems to uncover possible brute-force attacks. "
+            "You use correlation logic to find repeated failed attempts in short time windows."
+        ),
     ),
-    llm=llm,
-    disable_reasoning=True,  # <-- disable internal LLM calls
-    verbose=True
-)
-
-# === Correlator Agent ===
-correlator = Agent(
-    name="Correlator",
-    role="Correlate failed logins with later successful events.",
-    goal="Detect when attackers gain access after multiple failed attempts.",
-    backstory=(
-        "You are a correlation expert who links failed and successful login events "
-        "to identify compromised accounts."
+    # === Correlator Agent ===
+    "correlator": dict(
+        name="Correlator",
+        role="Correlate failed logins with later successful events.",
+        goal="Detect when attackers gain access after multiple failed attempts.",
+        backstory=(
+            "You are a correlation expert who links failed and successful login events "
+            "to identify compromised accounts."
+        ),
     ),
-    llm=llm,
-    disable_reasoning=True,  # <-- disable internal LLM calls
-    verbose=True
-)
-
-# === Responder Agent ===
-responder = Agent(
-    name="Responder",
-    role="Respond to security incidents with actionable recommendations.",
-    goal="Suggest containment, eradication, and recovery actions.",
-    backstory=(
-        "You are an incident responder who crafts detailed containment plans "
-        "and alerts SOC teams via automated systems."
+    # === Responder Agent ===
+    "responder": dict(
+        name="Responder",
+        role="Respond to security incidents with actionable recommendations.",
+        goal="Suggest containment, eradication, and recovery actions.",
+        backstory=(
+            "You are an incident responder who crafts detailed containment plans "
+            "and alerts SOC teams via automated systems."
+        ),
     ),
-    llm=llm,
-    disable_reasoning=True,  # <-- disable internal LLM calls
-    verbose=True
-)
-
-# === Reporter Agent ===
-reporter = Agent(
-    name="Reporter",
-    role="Summarize incidents and provide executive-level reports.",
-    goal="Generate markdown-based SIEM investigation reports.",
-    backstory=(
-        "You are a senior SOC reporter who turns raw findings into concise "
-        "and actionable executive summaries."
+    # === Reporter Agent ===
+    "reporter": dict(
+        name="Reporter",
+        role="Summarize incidents and provide executive-level reports.",
+        goal="Generate markdown-based SIEM investigation reports.",
+        backstory=(
+            "You are a senior SOC reporter who turns raw findings into concise "
+            "and actionable executive summaries."
+        ),
     ),
-    llm=llm,
-    disable_reasoning=True,  # <-- disable internal LLM calls
-    verbose=True
-)
\ No newline at end of file
+}
+
+def __getattr__(name):
+    if name == "llm":
+        return get_llm()
+    if name in _AGENT_SPECS:
+        from crewai import Agent
+        agent = Agent(
+            **_AGENT_SPECS[name],
+            llm=get_llm(),
+            disable_reasoning=True,  # <-- disable internal LLM calls
+            verbose=True
+        )
+        globals()[name] = agent
+        return agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
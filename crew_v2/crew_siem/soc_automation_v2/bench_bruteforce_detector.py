@@ -0,0 +1,76 @@
+"""
+Streaming brute-force detector benchmark: events/sec through
+BruteForceDetector.process() and memory per tracked IP.
+
+A synthetic login stream is generated in memory: --ips source IPs, --rate events
+per second of simulated time, ~2% of IPs brute-forcing (bursts of failures
+followed by a success). Memory is measured with tracemalloc as the growth
+of detector state after the run, divided by the IPs it still tracks.
+
+Usage:
+    uv run python bench_bruteforce_detector.py
+    uv run python bench_bruteforce_detector.py --events 2000000 --ips 200000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from tools.bruteforce_detector import BruteForceDetector
+
+def generate_events(n_events, n_ips, rate, seed=7):
+    rng = random.Random(seed)
+    ips = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(n_ips)]
+    attackers = set(rng.sample(range(n_ips), max(1, n_ips // 50)))
+    start = datetime(2025, 10, 18, 10, 0, 0)
+    events = []
+    for n in range(n_events):
+        i = rng.randrange(n_ips)
+        if i in attackers:
+            event_type = "success" if rng.random() < 0.1 else "failed"
+        else:
+            event_type = "failed" if rng.random() < 0.05 else "success"
+        events.append({
+            "event_time": start + timedelta(seconds=n / rate),
+            "tenant_id": f"t{i % 20}",
+            "user_id": f"user{i % 5000}",
+            "ip": ips[i],
+            "event_type": event_type,
+        })
+    return events
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=1000000)
+    parser.add_argument("--ips", type=int, default=100000)
+    parser.add_argument("--rate", type=int, default=2000, help="events per second of simulated time")
+    args = parser.parse_args()
+
+    print(f"Generating {args.events} events over {args.ips} IPs...")
+    events = generate_events(args.events, args.ips, args.rate)
+
+    detector = BruteForceDetector()
+    t0 = time.perf_counter()
+    incidents = 0
+    for event in events:
+        incidents += len(detector.process(event))
+    elapsed = time.perf_counter() - t0
+    stats = detector.stats()
+    print(f"throughput: {args.events / elapsed:,.0f} events/s ({elapsed:.2f} s), "
+          f"{incidents} incidents, {stats['tracked_ips']} IPs tracked, {stats['evicted_ips']} evicted")
+
+    # Memory: replay into a fresh detector under tracemalloc (slower, so separate)
+    tracemalloc.start()
+    detector = BruteForceDetector()
+    before = tracemalloc.get_traced_memory()[0]
+    for event in events:
+        detector.process(event)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    tracked = detector.stats()["tracked_ips"]
+    print(f"memory: {used / (1 << 20):.1f} MiB for {tracked} tracked IPs "
+          f"= {used / max(tracked, 1):.0f} bytes/IP")
+
+if __name__ == "__main__":
+    main()
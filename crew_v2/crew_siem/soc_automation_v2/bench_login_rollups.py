@@ -0,0 +1,139 @@
+"""
+Failed-login threshold query: raw siem_login_events scan vs. the minute
+rollup (ensure_login_rollups) on synthetic data.
+
+Creates the `siem_bench` database on the configured ClickHouse server
+(CLICKHOUSE_HOST/PORT/...), or in-process with CLICKHOUSE_BACKEND=chdb,
+fills siem_bench.siem_login_events with --rows synthetic logins (default
+100M) from numbers(), spread over the last --days days, ~20% failed, then
+attaches the rollup, which backfills it. The data is reused on later runs
+(with chDB only when CHDB_PATH is set); pass --reload to regenerate.
+
+Each query runs --repeats times and the median latency is reported.
+
+Usage:
+    uv run python bench_login_rollups.py
+    uv run python bench_login_rollups.py --rows 10000000 --repeats 10 --reload
+    CLICKHOUSE_BACKEND=chdb CHDB_PATH=bench_chdb uv run python bench_login_rollups.py
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from tools.clickhouse_tool import command_clickhouse, query_clickhouse, ensure_login_rollups
+from tasks.siem_tasks import FAILED_LOGINS_ROLLUP_SQL
+
+DB = "siem_bench"
+
+RAW_SQL = f"""
+SELECT
+  ip,
+  tenant_id,
+  countIf(event_type = 'failed') AS failed_count,
+  minIf(event_time, event_type = 'failed') as first_seen,
+  maxIf(event_time, event_type = 'failed') as last_seen
+FROM {DB}.siem_login_events
+WHERE event_time >= toDateTime({{window_start:String}})
+GROUP BY ip, tenant_id
+HAVING failed_count >= {{threshold:UInt32}}
+ORDER BY failed_count DESC
+LIMIT 100
+"""
+
+ROLLUP_SQL = FAILED_LOGINS_ROLLUP_SQL.replace("FROM siem_login_failures_1m", f"FROM {DB}.siem_login_failures_1m")
+
+GENERATE_SQL = f"""
+INSERT INTO {DB}.siem_login_events
+SELECT
+  now64(3) - toIntervalMillisecond(intDiv(number * {{span_ms:UInt64}}, {{rows:UInt64}})) AS event_time,
+  concat('t', toString(number % 50)) AS tenant_id,
+  concat('user', toString(cityHash64(number, 1) % 100000)) AS user_id,
+  IPv4NumToString(toUInt32(167772160 + cityHash64(number, 2) % 200000)) AS ip,
+  if(cityHash64(number, 3) % 100 < 20, 'failed', 'success') AS event_type,
+  '' AS message
+FROM numbers({{offset:UInt64}}, {{count:UInt64}})
+"""
+
+def load(rows, days, chunk=10_000_000):
+    command_clickhouse(f"DROP TABLE IF EXISTS {DB}.siem_login_failures_1m_mv")
+    command_clickhouse(f"DROP TABLE IF EXISTS {DB}.siem_login_failures_1m")
+    command_clickhouse(f"DROP TABLE IF EXISTS {DB}.siem_login_events")
+    command_clickhouse(f"""
+        CREATE TABLE {DB}.siem_login_events
+        (
+            event_time DateTime64(3),
+            tenant_id String,
+            user_id String,
+            ip String,
+            event_type String,
+            message String
+        )
+        ENGINE = MergeTree()
+        PARTITION BY toYYYYMM(event_time)
+        ORDER BY (tenant_id, ip, event_time)
+    """)
+    span_ms = days * 86400 * 1000
+    t0 = time.perf_counter()
+    for offset in range(0, rows, chunk):
+        count = min(chunk, rows - offset)
+        command_clickhouse(GENERATE_SQL, {"span_ms": span_ms, "rows": rows, "offset": offset, "count": count})
+        print(f"  loaded {offset + count:,} rows ({time.perf_counter() - t0:.0f}s)")
+    # Every row is older than the rollup's cutoff, so all of it goes through the backfill
+    t0 = time.perf_counter()
+    ensure_login_rollups(source=f"{DB}.siem_login_events", rollup=f"{DB}.siem_login_failures_1m")
+    print(f"  rollup backfilled ({time.perf_counter() - t0:.0f}s)")
+    command_clickhouse(f"OPTIMIZE TABLE {DB}.siem_login_failures_1m FINAL")
+
+def timed(sql, params, repeats):
+    latencies = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        rows = query_clickhouse(sql, params)
+        latencies.append(time.perf_counter() - t0)
+    return statistics.median(latencies) * 1000, rows
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000_000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--window-minutes", type=int, default=10)
+    parser.add_argument("--threshold", type=int, default=5)
+    parser.add_argument("--reload", action="store_true")
+    args = parser.parse_args()
+
+    command_clickhouse(f"CREATE DATABASE IF NOT EXISTS {DB}")
+    existing = int(command_clickhouse(
+        "SELECT sum(rows) FROM system.parts WHERE database = {db:String} AND table = 'siem_login_events' AND active",
+        {"db": DB}) or 0)
+    if args.reload or existing != args.rows:
+        print(f"Loading {args.rows:,} synthetic login events into {DB}.siem_login_events...")
+        load(args.rows, args.days)
+    else:
+        ensure_login_rollups(source=f"{DB}.siem_login_events", rollup=f"{DB}.siem_login_failures_1m")
+    rollup_rows = int(command_clickhouse(f"SELECT count() FROM {DB}.siem_login_failures_1m"))
+    print(f"{args.rows:,} raw rows, {rollup_rows:,} rollup rows")
+
+    params = {
+        # On a minute boundary, so the raw scan and the rollup cover the same rows
+        "window_start": (datetime.utcnow() - timedelta(minutes=args.window_minutes)).strftime("%Y-%m-%d %H:%M:00"),
+        "threshold": args.threshold,
+    }
+    # First runs warm the page cache for both tables
+    timed(RAW_SQL, params, 1)
+    timed(ROLLUP_SQL, params, 1)
+    raw_ms, raw_rows = timed(RAW_SQL, params, args.repeats)
+    rollup_ms, rollup_rows = timed(ROLLUP_SQL, params, args.repeats)
+
+    print(f"{'source':>8s} {'median ms':>10s} {'results':>8s}")
+    print(f"{'raw':>8s} {raw_ms:10.1f} {len(raw_rows):8d}")
+    print(f"{'rollup':>8s} {rollup_ms:10.1f} {len(rollup_rows):8d}")
+    print(f"speedup: {raw_ms / rollup_ms:.1f}x")
+    # Below the LIMIT both must return exactly the same offenders
+    key = lambda r: (r["ip"], r["tenant_id"], int(r["failed_count"]))
+    if len(raw_rows) < 100 and sorted(map(key, raw_rows)) != sorted(map(key, rollup_rows)):
+        print("WARNING: raw and rollup results differ")
+
+if __name__ == "__main__":
+    main()
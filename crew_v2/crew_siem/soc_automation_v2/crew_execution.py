@@ -1,15 +1,16 @@
 # crew_execution.py
-from crewai import Crew
-from agents.soc_agents import investigator, correlator, responder, reporter
-from tasks.siem_tasks import (
-    analyze_failed_logins,
-    correlate_successful_logins,
-    incident_response_task,
-    generate_report_task
-)
+import sys
 
-if __name__ == "__main__":
-    print("\n🚀 Starting SIEM Incident Investigation Crew...\n")
+
+def run_crew():
+    from crewai import Crew
+    from agents.soc_agents import investigator, correlator, responder, reporter
+    from tasks.siem_tasks import (
+        analyze_failed_logins,
+        correlate_successful_logins,
+        incident_response_task,
+        generate_report_task
+    )
 
     # Define the Crew with all agents and tasks
     siem_crew = Crew(
@@ -24,7 +25,45 @@ if __name__ == "__main__":
     )
 
     # kickoff() runs the full task chain (using prior outputs as context)
-    result = siem_crew.kickoff()
+    return siem_crew.kickoff()
+
+
+def run_detection():
+    """ClickHouse-only brute-force -> success check; no crewai, LLM or Milvus imports."""
+    from tasks.siem_tasks import analyze_failed_logins_action, correlate_successful_logins_action
+    failed_ips = analyze_failed_logins_action()
+    return correlate_successful_logins_action(failed_ips)
+
+
+def run_stream_detection(path, follow=False):
+    """Brute-force -> success check over a JSON-lines login event file; no ClickHouse round trips."""
+    from tools.bruteforce_detector import BruteForceDetector, tail_events
+    detector = BruteForceDetector()
+    incidents = []
+    for incident in detector.run(tail_events(path, follow=follow)):
+        print(f"🚨 {incident['ip']} tenant={incident['tenant_id']} failed={incident['failed_count']}")
+        incidents.append(incident)
+    print(f"\nDetector: {detector.stats()}")
+    return incidents
+
+
+if __name__ == "__main__":
+    if "--stream" in sys.argv:
+        path = sys.argv[sys.argv.index("--stream") + 1]
+        print(f"\n🔎 Streaming brute-force detection over {path}...\n")
+        result = run_stream_detection(path, follow="--follow" in sys.argv)
+    elif "--detect-only" in sys.argv:
+        print("\n🔎 Running brute-force detection (ClickHouse only)...\n")
+        result = run_detection()
+    else:
+        print("\n🚀 Starting SIEM Incident Investigation Crew...\n")
+        result = run_crew()
 
     print("\n✅ Final Output:\n")
-    print(result)
\ No newline at end of file
+    print(result)
+
+    from tools.clickhouse_tool import query_stats
+    stats = query_stats()
+    if stats["queries"]:
+        print(f"\nClickHouse: {stats['queries']} queries on {stats['clients_created']} connections, "
+              f"p50 {stats['p50_ms']:.1f} ms / p95 {stats['p95_ms']:.1f} ms / p99 {stats['p99_ms']:.1f} ms")
@@ -1,16 +1,7 @@
 
-from pymilvus import (
-    connections,
-    FieldSchema,
-    CollectionSchema,
-    DataType,
-    Collection,
-    utility
-)
-
 import os
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
+from tools.milvus_conn import MilvusConnection
 
 load_dotenv()
 
@@ -18,11 +9,13 @@ MILVUS_HOST = os.getenv("MILVUS_HOST")
 MILVUS_TOKEN = os.getenv("MILVUS_TOKEN")
 COLLECTION_NAME = "siem_incidents"
 VECTOR_DIM = 384
+# Milvus caps the number of query vectors (nq) per search request
+SEARCH_MAX_NQ = int(os.getenv("MILVUS_SEARCH_MAX_NQ", "1024"))
 
 # -----------------------
-# Connect to Milvus
+# Connect to Milvus (lazily, on first query)
 # -----------------------
-connections.connect(
+milvus = MilvusConnection(
     alias="default",
     host=MILVUS_HOST,
     port="443",
@@ -31,18 +24,24 @@ connections.connect(
 )
 
 # -----------------------
-# Load collection
+# Load collection (once per process)
 # -----------------------
-if not utility.has_collection(COLLECTION_NAME):
-    raise ValueError(f"Collection '{COLLECTION_NAME}' does not exist.")
-collection = Collection(COLLECTION_NAME)
-collection.load()
-print(f"✅ Collection '{COLLECTION_NAME}' loaded")
+def get_collection():
+    collection = milvus.ensure_loaded(COLLECTION_NAME)
+    return collection
 
 # -----------------------
 # Embedding model for queries
 # -----------------------
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+_embedding_model = None
+
+def get_embedding_model():
+    # Imported and loaded on first query, not at import
+    global _embedding_model
+    if _embedding_model is None:
+        from sentence_transformers import SentenceTransformer
+        _embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+    return _embedding_model
 
 # -----------------------
 # Query by filters (ip or tenant_id)
@@ -55,7 +54,7 @@ def query_incidents_by_filter(ip=None, tenant_id=None, limit=10):
         expr_parts.append(f"tenant_id == '{tenant_id}'")
     expr = " and ".join(expr_parts) if expr_parts else None
 
-    results = collection.query(
+    results = get_collection().query(
         expr=expr,
         output_fields=["incident_id", "ip", "tenant_id", "failed_count"]
     )
@@ -65,30 +64,50 @@ def query_incidents_by_filter(ip=None, tenant_id=None, limit=10):
 # -----------------------
 # Query by vector similarity
 # -----------------------
-def query_similar_incidents(evidence_text, top_k=5):
-    vector = embedding_model.encode(evidence_text).tolist()
+def search_many(vectors, top_k=5, filter=None):
+    """Search many query vectors, up to SEARCH_MAX_NQ per round trip; returns one incident list per vector."""
+    if len(vectors) == 0:
+        return []
     search_params = {"metric_type": "COSINE", "params": {"nprobe": 10}}
+    data = [v.tolist() if hasattr(v, "tolist") else v for v in vectors]
+    out = []
+    for start in range(0, len(data), SEARCH_MAX_NQ):
+        results = get_collection().search(
+            data=data[start:start + SEARCH_MAX_NQ],
+            anns_field="description_vector",
+            param=search_params,
+            limit=top_k,
+            expr=filter,
+            output_fields=["incident_id", "ip", "tenant_id", "failed_count"]
+        )
+        for hits in results:
+            incidents = []
+            for hit in hits:
+                incidents.append({
+                    "incident_id": hit.entity.get("incident_id"),
+                    "ip": hit.entity.get("ip"),
+                    "tenant_id": hit.entity.get("tenant_id"),
+                    "failed_count": hit.entity.get("failed_count"),
+                    "score": hit.distance
+                })
+            out.append(incidents)
+    return out
 
-    results = collection.search(
-        data=[vector],
-        anns_field="description_vector",
-        param=search_params,
-        limit=top_k,
-        output_fields=["incident_id", "ip", "tenant_id", "failed_count"]
-    )
-    incidents = []
-    for hits in results:
-        for hit in hits:
-            incidents.append({
-                "incident_id": hit.entity.get("incident_id"),
-                "ip": hit.entity.get("ip"),
-                "tenant_id": hit.entity.get("tenant_id"),
-                "failed_count": hit.entity.get("failed_count"),
-                "score": hit.distance
-            })
+def query_similar_incidents(evidence_text, top_k=5):
+    vector = get_embedding_model().encode(evidence_text).tolist()
+    incidents = search_many([vector], top_k=top_k)[0]
     print(f"🔍 Found {len(incidents)} similar incidents")
     return incidents
 
+def query_similar_incidents_many(evidence_texts, top_k=5, filter=None):
+    """Embed and search a batch of evidence texts with one encode call and one search RPC."""
+    if not evidence_texts:
+        return []
+    vectors = get_embedding_model().encode(list(evidence_texts), convert_to_numpy=True, show_progress_bar=False)
+    results = search_many(vectors, top_k=top_k, filter=filter)
+    print(f"🔍 Found {sum(len(r) for r in results)} similar incidents for {len(results)} queries")
+    return results
+
 # -----------------------
 # Example usage
 # -----------------------
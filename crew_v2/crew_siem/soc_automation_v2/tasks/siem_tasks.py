@@ -1,15 +1,16 @@
 # tasks/siem_tasks.py
-from crewai import Task
-from agents.soc_agents import investigator, correlator, responder, reporter
-from tools.clickhouse_tool import query_clickhouse
-from tools.alert_tool import send_incident_alert
-from tools.milvus_tool import store_incidents_to_milvus
+from tools.clickhouse_tool import stream_row_blocks, ensure_login_rollups
+from tools.alert_tool import dispatch_alerts
+from tools.alert_outbox import get_alert_outbox
+from tools.alert_coalescer import get_alert_coalescer
+from tools.login_window import FailedLoginWindow
 from datetime import datetime, timedelta
 
 
 import logging
 import sys
 import os
+import time
 
 # Create log directory if it doesn't exist
 LOG_DIR = "logs"
@@ -38,65 +39,176 @@ logger.info("✅ SIEM Tasks logger initialized, logging to file: %s", LOG_FILE)
 
 
 
+# Incremental mode: each run reads only rows past the persisted watermark and
+# keeps per-(ip, tenant_id) minute counters across runs (tools/login_window.py)
+INCREMENTAL = os.getenv("SIEM_INCREMENTAL", "false").lower() in ("1", "true", "yes")
+LOGIN_STATE_PATH = os.getenv("SIEM_LOGIN_STATE_PATH", os.path.join("state", "failed_logins_state.json"))
+# Rows younger than this are left for the next run, so late inserts are not skipped
+INGEST_LAG_SECONDS = int(os.getenv("SIEM_INGEST_LAG_SECONDS", "5"))
+
+FAILED_SINCE_WATERMARK_SQL = """
+SELECT
+  ip,
+  tenant_id,
+  toUnixTimestamp(toStartOfMinute(event_time)) AS minute,
+  count() AS failed_count,
+  min(event_time) AS first_seen,
+  max(event_time) AS last_seen
+FROM siem_login_events
+WHERE event_type = 'failed'
+  AND event_time > {since:DateTime64(3)}
+  AND event_time <= {until:DateTime64(3)}
+GROUP BY ip, tenant_id, minute
+"""
+
+def _analyze_failed_logins_incremental(threshold, window_minutes, context):
+    state = FailedLoginWindow(context.get("login_state_path", LOGIN_STATE_PATH), window_minutes)
+    until = datetime.utcnow() - timedelta(seconds=INGEST_LAG_SECONDS)
+    since = state.watermark or (until - timedelta(minutes=window_minutes)).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    until_str = until.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+    new_rows = 0
+    for _, block in stream_row_blocks(FAILED_SINCE_WATERMARK_SQL, {"since": since, "until": until_str}):
+        for ip, tenant_id, minute, failed_count, first_seen, last_seen in block:
+            state.add(ip, tenant_id, minute, failed_count, first_seen, last_seen)
+            new_rows += int(failed_count)
+    state.evict((until - datetime(1970, 1, 1)).total_seconds())
+    state.save(until_str)
+
+    results = state.over_threshold(threshold)
+    context["failed_logins_scanned"] = new_rows
+    logger.info(f"Incremental failed-login scan {since} -> {until_str}: {new_rows} new failures, "
+                f"{len(state.buckets)} tracked keys, {len(results)} over threshold")
+    return results
+
+# Threshold query over the minute rollup kept by ensure_login_rollups(): reads
+# window_minutes rows per active (ip, tenant_id) instead of every raw event.
+# The window starts at the top of its first minute. The rollup holds failed
+# events only, so first_seen/last_seen are failed-attempt times.
+USE_LOGIN_ROLLUP = os.getenv("SIEM_LOGIN_ROLLUP", "true").lower() in ("1", "true", "yes")
+
+FAILED_LOGINS_ROLLUP_SQL = """
+SELECT
+  ip,
+  tenant_id,
+  sum(failed_count) AS failed_count,
+  min(first_seen) AS first_seen,
+  max(last_seen) AS last_seen
+FROM siem_login_failures_1m
+WHERE minute >= toStartOfMinute({window_start:DateTime})
+GROUP BY ip, tenant_id
+HAVING failed_count >= {threshold:UInt32}
+ORDER BY failed_count DESC
+LIMIT 100
+"""
+
 def analyze_failed_logins_action(context={}):
     threshold = 5
     window_minutes = 10
 
+    if context.get("incremental", INCREMENTAL):
+        return _analyze_failed_logins_incremental(threshold, window_minutes, context)
+
     now = datetime.utcnow()
     window_start = now - timedelta(minutes=window_minutes)
 
-    sql = f"""
-    SELECT
-      ip,
-      tenant_id,
-      countIf(event_type = 'failed') AS failed_count,
-      min(event_time) as first_seen,
-      max(event_time) as last_seen
-    FROM siem_login_events
-    WHERE event_time >= toDateTime('{window_start.strftime('%Y-%m-%d %H:%M:%S')}')
-    GROUP BY ip, tenant_id
-    HAVING failed_count >= {threshold}
-    ORDER BY failed_count DESC
-    LIMIT 100
-    """
-
-    rows = query_clickhouse(sql)
+    if context.get("use_rollup", USE_LOGIN_ROLLUP) and ensure_login_rollups():
+        sql = FAILED_LOGINS_ROLLUP_SQL
+        params = {"window_start": window_start.strftime('%Y-%m-%d %H:%M:%S'), "threshold": threshold}
+    else:
+        # first_seen/last_seen are failed-attempt times, as in the rollup and
+        # incremental paths (before the rollup they spanned all events), so
+        # correlation looks for a success after the last *failure*
+        sql = f"""
+        SELECT
+          ip,
+          tenant_id,
+          countIf(event_type = 'failed') AS failed_count,
+          minIf(event_time, event_type = 'failed') as first_seen,
+          maxIf(event_time, event_type = 'failed') as last_seen
+        FROM siem_login_events
+        WHERE event_time >= toDateTime('{window_start.strftime('%Y-%m-%d %H:%M:%S')}')
+        GROUP BY ip, tenant_id
+        HAVING failed_count >= {threshold}
+        ORDER BY failed_count DESC
+        LIMIT 100
+        """
+        params = None
+
     results = []
-    for r in rows:
-        results.append({
-            "ip": r.get("ip"),
-            "tenant_id": r.get("tenant_id"),
-            "failed_count": int(r.get("failed_count") or 0),
-            "first_seen": str(r.get("first_seen")),
-            "last_seen": str(r.get("last_seen"))
-        })
+    # Row tuples straight from the stream: one dict per result, not two
+    for _, block in stream_row_blocks(sql, params):
+        for ip, tenant_id, failed_count, first_seen, last_seen in block:
+            results.append({
+                "ip": ip,
+                "tenant_id": tenant_id,
+                "failed_count": int(failed_count or 0),
+                "first_seen": str(first_seen),
+                "last_seen": str(last_seen)
+            })
     return results
 
 import uuid
 
+# One round trip for all failed IPs: the (probe index, ip, last_seen) set is
+# bound as arrays, expanded with arrayJoin and joined to the success events in
+# each IP's 300 s window. LIMIT 10 BY keeps the old per-IP evidence cap.
+CORRELATE_SUCCESS_SQL = """
+SELECT
+  p.idx AS idx,
+  e.tenant_id AS tenant_id,
+  e.user_id AS user_id,
+  e.ip AS ip,
+  e.event_time AS event_time,
+  e.event_type AS event_type
+FROM siem_login_events AS e
+INNER JOIN
+(
+  SELECT
+    tupleElement(t, 1) AS idx,
+    tupleElement(t, 2) AS ip,
+    parseDateTimeBestEffort(tupleElement(t, 3)) AS last_seen
+  FROM (SELECT arrayJoin(arrayZip({idx:Array(UInt32)}, {ips:Array(String)}, {last_seen:Array(String)})) AS t)
+) AS p ON e.ip = p.ip
+WHERE e.ip IN {ips:Array(String)}
+  AND e.event_type = 'success'
+  AND e.event_time > {min_seen:DateTime}
+  AND e.event_time <= {max_seen:DateTime} + INTERVAL 300 SECOND
+  AND e.event_time > p.last_seen
+  AND e.event_time <= p.last_seen + INTERVAL 300 SECOND
+ORDER BY idx, e.event_time
+LIMIT 10 BY idx
+"""
+
 def correlate_successful_logins_action(failed_ips, context={}):
-    incidents = []
-    for ip_obj in failed_ips:
-        ip = ip_obj["ip"]
-        last_seen = ip_obj["last_seen"]
+    if not failed_ips:
+        return []
+    last_seen = [str(ip_obj["last_seen"]) for ip_obj in failed_ips]
+    # Plain second-precision bounds let ClickHouse prune partitions/granules
+    seconds = sorted(s[:19] for s in last_seen)
+    blocks = stream_row_blocks(CORRELATE_SUCCESS_SQL, {
+        "idx": list(range(len(failed_ips))),
+        "ips": [ip_obj["ip"] for ip_obj in failed_ips],
+        "last_seen": last_seen,
+        "min_seen": seconds[0],
+        "max_seen": seconds[-1],
+    })
+
+    evidence = {}
+    for columns, block in blocks:
+        fields = columns[1:]
+        for row in block:
+            evidence.setdefault(row[0], []).append(dict(zip(fields, row[1:])))
 
-        sql = f"""
-        SELECT tenant_id, user_id, ip, event_time, event_type
-        FROM siem_login_events
-        WHERE ip = '{ip}'
-          AND event_time > toDateTime('{last_seen}')
-          AND event_time <= toDateTime(date_add('second', 300, toDateTime('{last_seen}')))
-          AND event_type = 'success'
-        LIMIT 10
-        """
-        rows = query_clickhouse(sql)
-        if rows:
+    incidents = []
+    for i, ip_obj in enumerate(failed_ips):
+        if i in evidence:
             incident = {
                 "incident_id": str(uuid.uuid4()),
-                "ip": ip,
+                "ip": ip_obj["ip"],
                 "tenant_id": ip_obj["tenant_id"],
                 "failed_count": ip_obj["failed_count"],
-                "evidence": [dict(r) for r in rows]
+                "evidence": evidence[i]
             }
             incidents.append(incident)
     return incidents
@@ -118,6 +230,32 @@ def correlate_successful_logins_action(failed_ips, context={}):
 #     return results
 
 
+def _deliver_alerts(payloads, logger):
+    """Hand payloads to the outbox (or send them inline); one result dict per payload."""
+    t0 = time.perf_counter()
+    outbox = get_alert_outbox()
+    if outbox is not None:
+        # Durable hand-off: the outbox worker delivers (and retries) in the background
+        queued = outbox.enqueue(payloads)
+        if payloads:
+            logger.info(f"Queued {sum(1 for _, q in queued if q)} of {len(payloads)} alerts in the outbox in "
+                        f"{(time.perf_counter() - t0) * 1000:.2f} ms ({outbox.stats()})")
+        return [{"response": {"status": "queued" if q else "duplicate", "idempotency_key": key}}
+                for key, q in queued]
+
+    # All alerts go out concurrently over one pooled connection set; a slow
+    # endpoint costs one timeout for the batch, not one per incident
+    results = dispatch_alerts(payloads)
+    for payload, sent in zip(payloads, results):
+        status = f"failed ({sent['error']})" if sent.get("error") else "sent"
+        logger.info(f"Alert {status} for IP: {payload['ip']} tenant: {payload['tenant_id']} "
+                    f"in {sent['latency_ms']:.1f} ms ({sent['attempts']} attempts)")
+    if results:
+        latencies = sorted(r["latency_ms"] for r in results)
+        logger.info(f"Dispatched {len(results)} alerts in {(time.perf_counter() - t0) * 1000:.1f} ms "
+                    f"(per-alert p50 {latencies[len(latencies) // 2]:.1f} ms, max {latencies[-1]:.1f} ms)")
+    return results
+
 def responder_action(incidents, context={}):
     import logging, sys, os
 
@@ -145,20 +283,41 @@ def responder_action(incidents, context={}):
     # Log start
     logger.info(f"🔄 responder_action: {len(incidents)} incidents")
 
-    results = []
+    payloads = []
     for inc in incidents:
-        payload = {
+        payloads.append({
             "title": "Potential account compromise - brute force followed by success",
             "ip": inc["ip"],
             "tenant_id": inc["tenant_id"],
             "failed_count": inc["failed_count"],
             "evidence": inc["evidence"],
             "suggested_action": ["block_ip", "force_password_reset", "notify_owner"]
-        }
-        resp = send_incident_alert(payload)
-        results.append({"payload": payload, "response": resp})
-        logger.info(f"Sent alert for IP: {inc['ip']} tenant: {inc['tenant_id']}")
+        })
 
+    # Repeats of an (ip, tenant_id, title) already alerted in the suppression
+    # window are merged into it instead of sent again
+    coalescer = get_alert_coalescer()
+    decisions, summaries = coalescer.process(payloads) if coalescer else (payloads, [])
+    to_send = [p for p in decisions if not p.get("suppressed")] + summaries
+    delivered = iter(_deliver_alerts(to_send, logger))
+
+    results = []
+    for payload in decisions:
+        if payload.get("suppressed"):
+            results.append({"payload": payload, "response": {"status": "suppressed",
+                                                             "occurrences": payload["occurrences"]}})
+        else:
+            results.append({"payload": payload, **next(delivered)})
+    results.extend({"payload": payload, **next(delivered)} for payload in summaries)
+    if coalescer:
+        # Started after the first delivery so its exit flush runs before the
+        # outbox worker stops (atexit runs handlers in reverse order)
+        coalescer.start(lambda late: _deliver_alerts(late, logger))
+        logger.info(f"Alerts: {len(to_send)} to send ({len(summaries)} window summaries), "
+                    f"{sum(1 for p in decisions if p.get('suppressed'))} suppressed ({coalescer.stats()})")
+
+    # pymilvus is only imported when there is something to store
+    from tools.milvus_tool import store_incidents_to_milvus
     stored_count = store_incidents_to_milvus(incidents)
     context["milvus_stored_count"] = stored_count
     logger.info(f"✅ Stored {stored_count} incidents into Milvus")
@@ -202,35 +361,58 @@ def reporter_action(incidents, responder_results, context={}):
 
 
 # --- CrewAI Task Definitions ---
-
-analyze_failed_logins = Task(
-    name="AnalyzeFailedLogins",
-    description="Find IPs with > threshold failed login attempts within a short time window.",
-    expected_output="A list of IPs with their failed login counts and timestamps.",
-    function=analyze_failed_logins_action,
-    agent=investigator
-)
-
-correlate_successful_logins = Task(
-    name="CorrelateSuccess",
-    description="Correlate failed login IPs with successful logins within 5 minutes.",
-    expected_output="A list of potential incidents where a successful login followed multiple failures.",
-    function=correlate_successful_logins_action,
-    agent=correlator
-)
-
-incident_response_task = Task(
-    name="IncidentResponder",
-    description="Trigger incident alerts via REST API for confirmed suspicious activities.",
-    expected_output="A list of alert responses confirming that incident notifications were sent.",
-    function=responder_action,
-    agent=responder
-)
-
-generate_report_task = Task(
-    name="GenerateReport",
-    description="Create a markdown summary report for the SOC team detailing incidents and responses.",
-    expected_output="A markdown report summarizing detected incidents, evidence, and response status.",
-    function=reporter_action,
-    agent=reporter
-)
\ No newline at end of file
+# Built on first access so the *_action functions can be imported and run
+# without importing crewai or constructing the LLM-backed agents.
+
+def build_tasks():
+    from crewai import Task
+    from agents.soc_agents import investigator, correlator, responder, reporter
+
+    analyze_failed_logins = Task(
+        name="AnalyzeFailedLogins",
+        description="Find IPs with > threshold failed login attempts within a short time window.",
+        expected_output="A list of IPs with their failed login counts and timestamps.",
+        function=analyze_failed_logins_action,
+        agent=investigator
+    )
+
+    correlate_successful_logins = Task(
+        name="CorrelateSuccess",
+        description="Correlate failed login IPs with successful logins within 5 minutes.",
+        expected_output="A list of potential incidents where a successful login followed multiple failures.",
+        function=correlate_successful_logins_action,
+        agent=correlator
+    )
+
+    incident_response_task = Task(
+        name="IncidentResponder",
+        description="Trigger incident alerts via REST API for confirmed suspicious activities.",
+        expected_output="A list of alert responses confirming that incident notifications were sent.",
+        function=responder_action,
+        agent=responder
+    )
+
+    generate_report_task = Task(
+        name="GenerateReport",
+        description="Create a markdown summary report for the SOC team detailing incidents and responses.",
+        expected_output="A markdown report summarizing detected incidents, evidence, and response status.",
+        function=reporter_action,
+        agent=reporter
+    )
+
+    return {
+        "analyze_failed_logins": analyze_failed_logins,
+        "correlate_successful_logins": correlate_successful_logins,
+        "incident_response_task": incident_response_task,
+        "generate_report_task": generate_report_task,
+    }
+
+_TASK_NAMES = ("analyze_failed_logins", "correlate_successful_logins",
+               "incident_response_task", "generate_report_task")
+
+def __getattr__(name):
+    if name in _TASK_NAMES:
+        tasks = build_tasks()
+        globals().update(tasks)
+        return tasks[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
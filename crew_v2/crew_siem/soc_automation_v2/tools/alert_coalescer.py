@@ -0,0 +1,200 @@
+# tools/alert_coalescer.py
+"""
+Alert coalescing and suppression per (ip, tenant_id, title).
+
+The first alert for a key opens a suppression window
+(ALERT_SUPPRESS_SECONDS, default 900). Repeats inside the window are not
+sent; they are merged into the key's entry: occurrence count, highest
+failed_count, and a digest over the distinct evidence seen. When a window
+with merged repeats expires, one summary alert is emitted carrying the
+totals. So each key produces at most two alerts per window, however many
+runs or incidents there are. Summaries come out of process() and flush();
+start() runs flush() on a timer (ALERT_COALESCE_FLUSH_SECONDS) and at exit
+so a window that closes with no further alerts is still summarized.
+
+Entries live in an in-memory TTL map (OrderedDict, oldest window first,
+capped at ALERT_COALESCE_MAX_KEYS). The map is saved to a JSON file
+(ALERT_COALESCE_PATH, default state/alert_coalesce.json; empty = memory
+only) so scheduled runs share their windows.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+COALESCE_ENABLED = os.getenv("ALERT_COALESCE", "true").lower() in ("1", "true", "yes")
+SUPPRESS_SECONDS = float(os.getenv("ALERT_SUPPRESS_SECONDS", "900"))
+COALESCE_PATH = os.getenv("ALERT_COALESCE_PATH", os.path.join("state", "alert_coalesce.json"))
+COALESCE_MAX_KEYS = int(os.getenv("ALERT_COALESCE_MAX_KEYS", "100000"))
+COALESCE_FLUSH_SECONDS = float(os.getenv("ALERT_COALESCE_FLUSH_SECONDS", "60"))
+MAX_EVIDENCE_HASHES = 256
+
+logger = logging.getLogger("alert_coalescer")
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+def _evidence_hashes(evidence):
+    return [hashlib.blake2b(json.dumps(e, sort_keys=True, default=str).encode("utf-8"), digest_size=8).hexdigest()
+            for e in evidence or []]
+
+class AlertCoalescer:
+    def __init__(self, window_seconds=SUPPRESS_SECONDS, path=COALESCE_PATH, max_keys=COALESCE_MAX_KEYS):
+        self.window_seconds = window_seconds
+        self.path = path
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # "ip|tenant_id|title" -> entry, oldest window first
+        self.suppressed = 0
+        self._deliver = None
+        self._stop = threading.Event()
+        self._thread = None
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self._entries.update(json.load(f))
+
+    @staticmethod
+    def key(payload):
+        return f"{payload.get('ip')}|{payload.get('tenant_id')}|{payload.get('title')}"
+
+    def _annotate(self, payload, entry):
+        digests = sorted(entry["evidence"])
+        return dict(
+            payload,
+            occurrences=entry["occurrences"],
+            failed_count=entry["failed_count"],
+            first_detected=_iso(entry["window_start"]),
+            last_detected=_iso(entry["last_seen"]),
+            evidence_digest=hashlib.blake2b("".join(digests).encode("ascii"), digest_size=12).hexdigest(),
+            unique_evidence=len(digests)
+        )
+
+    def _expire(self, now):
+        """Drop entries whose window ended; summaries for those that absorbed repeats."""
+        summaries = []
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry["window_start"] < self.window_seconds and len(self._entries) <= self.max_keys:
+                break
+            self._entries.popitem(last=False)
+            if entry["pending"]:
+                summaries.append(dict(self._annotate(entry["payload"], entry), coalesced=True))
+        return summaries
+
+    def process(self, payloads):
+        """
+        -> (decisions, summaries). decisions[i] is payloads[i] annotated with
+        occurrences/evidence_digest; it has "suppressed": True when it merged
+        into an open window and must not be sent. summaries are extra alerts
+        for windows that just closed with merged repeats.
+        """
+        now = time.time()
+        decisions = []
+        with self._lock:
+            summaries = self._expire(now)
+            for payload in payloads:
+                key = self.key(payload)
+                hashes = _evidence_hashes(payload.get("evidence"))
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._entries[key] = {
+                        "window_start": now,
+                        "last_seen": now,
+                        "occurrences": 1,
+                        "pending": 0,
+                        "failed_count": payload.get("failed_count", 0),
+                        "evidence": hashes[:MAX_EVIDENCE_HASHES],
+                        "payload": payload,
+                    }
+                    decisions.append(self._annotate(payload, entry))
+                    continue
+                entry["last_seen"] = now
+                entry["occurrences"] += 1
+                entry["pending"] += 1
+                entry["failed_count"] = max(entry["failed_count"], payload.get("failed_count", 0))
+                known = set(entry["evidence"])
+                entry["evidence"].extend(h for h in hashes if h not in known)
+                del entry["evidence"][MAX_EVIDENCE_HASHES:]
+                entry["payload"] = payload
+                self.suppressed += 1
+                decisions.append(dict(self._annotate(payload, entry), suppressed=True))
+            summaries.extend(self._expire(now))  # over max_keys after new windows
+            self._save()
+        return decisions, summaries
+
+    def flush(self, close_open=False):
+        """
+        Summaries for windows that closed since the last process()/flush().
+        close_open also closes the windows still open (for exit when the map
+        isn't persisted, so their merged repeats aren't lost).
+        """
+        now = time.time()
+        with self._lock:
+            summaries = self._expire(now + self.window_seconds if close_open else now)
+            if summaries or close_open:
+                self._save()
+        return summaries
+
+    def _flush_to(self, close_open=False):
+        summaries = self.flush(close_open)
+        if summaries:
+            self._deliver(summaries)
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self._flush_to()
+            except Exception as e:
+                logger.exception(f"Alert coalescer flush error: {e}")
+
+    def start(self, deliver, interval=COALESCE_FLUSH_SECONDS):
+        """
+        Hand summaries of windows that close between runs to deliver (a
+        callable taking a list of payloads) every interval seconds, and once
+        more at exit (idempotent).
+        """
+        if self._deliver is None:
+            import atexit
+            atexit.register(self.stop)
+        self._deliver = deliver
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,), name="alert-coalescer",
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._stop.set()
+            self._thread.join(timeout=5)
+            # Without a state file, open windows would be forgotten at exit
+            self._flush_to(close_open=not self.path)
+
+    def _save(self):
+        if not self.path:
+            return
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._entries, f, default=str)
+        os.replace(tmp, self.path)
+
+    def stats(self) -> dict:
+        return {"open_windows": len(self._entries), "suppressed": self.suppressed}
+
+_coalescer = None
+
+def get_alert_coalescer():
+    """Process-wide coalescer, or None when ALERT_COALESCE is disabled"""
+    global _coalescer
+    if not COALESCE_ENABLED:
+        return None
+    if _coalescer is None:
+        _coalescer = AlertCoalescer()
+    return _coalescer
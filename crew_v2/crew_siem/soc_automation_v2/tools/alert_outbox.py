@@ -0,0 +1,220 @@
+# tools/alert_outbox.py
+"""
+Durable alert outbox.
+
+responder_action appends alert payloads to a local SQLite WAL table
+(ALERT_OUTBOX_PATH, default state/alert_outbox.sqlite) and returns at once.
+A background thread drains it through tools.alert_tool.dispatch_alerts in
+batches of ALERT_OUTBOX_BATCH. Failed rows are retried with exponential
+backoff (1 s doubling up to ALERT_OUTBOX_MAX_BACKOFF). They are given up
+after ALERT_OUTBOX_MAX_ATTEMPTS (0 = never), or at once when the error can't
+be fixed by retrying (e.g. a 4xx response). Alerts the sender skipped
+because ALERT_API_URL is not set stay pending. Rows still pending at exit
+are delivered by the next process that starts a worker. Sent rows are
+deleted after ALERT_OUTBOX_RETENTION_DAYS.
+
+Rows are keyed by a hash of the alert content. Enqueueing content that is
+still pending, or was queued less than ALERT_OUTBOX_DEDUP_SECONDS ago, is
+a no-op; after that (or once the earlier row is dead) the row is queued
+again. The payload's idempotency_key, also sent as the Idempotency-Key
+header, is the content hash plus the enqueue time: retries and a second
+worker reuse it, so the API can drop those repeats, while a later repeat
+of the alert is a new delivery.
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from tools.alert_tool import dispatch_alerts
+
+OUTBOX_ENABLED = os.getenv("ALERT_OUTBOX", "true").lower() in ("1", "true", "yes")
+OUTBOX_PATH = os.getenv("ALERT_OUTBOX_PATH", os.path.join("state", "alert_outbox.sqlite"))
+OUTBOX_BATCH = int(os.getenv("ALERT_OUTBOX_BATCH", "100"))
+OUTBOX_POLL_SECONDS = float(os.getenv("ALERT_OUTBOX_POLL_SECONDS", "1"))
+OUTBOX_MAX_BACKOFF = float(os.getenv("ALERT_OUTBOX_MAX_BACKOFF", "300"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("ALERT_OUTBOX_MAX_ATTEMPTS", "0"))
+OUTBOX_DEDUP_SECONDS = float(os.getenv("ALERT_OUTBOX_DEDUP_SECONDS", "900"))
+OUTBOX_RETENTION_DAYS = float(os.getenv("ALERT_OUTBOX_RETENTION_DAYS", "7"))
+# How long exit waits for queued alerts before leaving them for the next run
+OUTBOX_FLUSH_TIMEOUT = float(os.getenv("ALERT_OUTBOX_FLUSH_TIMEOUT", "10"))
+
+logger = logging.getLogger("alert_outbox")
+
+def idempotency_key(payload: dict) -> str:
+    body = {k: v for k, v in payload.items() if k != "idempotency_key"}
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+class AlertOutbox:
+    def __init__(self, path=OUTBOX_PATH, batch_size=OUTBOX_BATCH, max_backoff=OUTBOX_MAX_BACKOFF,
+                 max_attempts=OUTBOX_MAX_ATTEMPTS, send=dispatch_alerts, dedup_seconds=OUTBOX_DEDUP_SECONDS,
+                 retention_days=OUTBOX_RETENTION_DAYS):
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.dedup_seconds = dedup_seconds
+        self.retention_days = retention_days
+        self.send = send
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: a commit survives a process crash without an fsync per alert
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, idempotency_key TEXT NOT NULL UNIQUE,"
+            " payload TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending',"
+            " attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL,"
+            " created_at REAL NOT NULL, sent_at REAL, last_error TEXT, response TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at)")
+        self._db.commit()
+
+    def enqueue(self, payloads) -> list:
+        """
+        Persist payloads for delivery -> [(idempotency_key, queued)] in payload
+        order. queued is False for a duplicate of a pending or recent alert;
+        the key is then the one already queued for it.
+        """
+        now = time.time()
+        out = []
+        with self._lock:
+            for payload in payloads:
+                content_key = payload.get("idempotency_key") or idempotency_key(payload)
+                payload = dict(payload, idempotency_key=payload.get("idempotency_key")
+                               or f"{content_key}-{int(now * 1000)}")
+                # A sent row older than the dedup window, or a dead one, is queued again
+                cur = self._db.execute(
+                    "INSERT INTO outbox (idempotency_key, payload, next_attempt_at, created_at)"
+                    " VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(idempotency_key) DO UPDATE SET payload = excluded.payload,"
+                    " status = 'pending', attempts = 0, next_attempt_at = excluded.next_attempt_at,"
+                    " created_at = excluded.created_at, sent_at = NULL, last_error = NULL, response = NULL"
+                    " WHERE outbox.status = 'dead' OR (outbox.status = 'sent' AND outbox.created_at < ?)",
+                    (content_key, json.dumps(payload, default=str), now, now, now - self.dedup_seconds)
+                )
+                if cur.rowcount > 0:
+                    out.append((payload["idempotency_key"], True))
+                else:
+                    queued = self._db.execute("SELECT payload FROM outbox WHERE idempotency_key = ?",
+                                              (content_key,)).fetchone()[0]
+                    out.append((json.loads(queued)["idempotency_key"], False))
+            self._db.commit()
+        duplicates = sum(1 for _, queued in out if not queued)
+        if duplicates:
+            logger.info(f"Alert outbox: {duplicates} of {len(out)} alerts already queued or recently sent")
+        self._wake.set()
+        return out
+
+    def drain_once(self) -> int:
+        """Send one batch of due alerts; returns how many were delivered."""
+        with self._lock:
+            due = self._db.execute(
+                "SELECT id, payload, attempts FROM outbox WHERE status = 'pending' AND next_attempt_at <= ?"
+                " ORDER BY id LIMIT ?", (time.time(), self.batch_size)
+            ).fetchall()
+        if not due:
+            return 0
+        # The outbox owns retries, so each delivery attempt is a single POST
+        results = self.send([json.loads(p) for _, p, _ in due], max_attempts=1)
+        now = time.time()
+        sent, failed, skipped = [], [], []
+        for (row_id, _, attempts), result in zip(due, results):
+            if result.get("skipped"):
+                # Not delivered: no endpoint configured. Kept for a run that has one
+                skipped.append((now + self.max_backoff, row_id))
+            elif result.get("error"):
+                attempts += 1
+                backoff = min(self.max_backoff, 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+                # A 4xx fails the same way on every attempt
+                dead = not result.get("retryable", True) or (self.max_attempts and attempts >= self.max_attempts)
+                failed.append(("dead" if dead else "pending", attempts, now + backoff, result["error"], row_id))
+            else:
+                sent.append((now, json.dumps(result.get("response"), default=str), row_id))
+        with self._lock:
+            self._db.executemany(
+                "UPDATE outbox SET status = 'sent', attempts = attempts + 1, sent_at = ?, response = ?"
+                " WHERE id = ?", sent
+            )
+            self._db.executemany(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                failed
+            )
+            self._db.executemany("UPDATE outbox SET next_attempt_at = ? WHERE id = ?", skipped)
+            self._db.execute("DELETE FROM outbox WHERE status = 'sent' AND sent_at < ?",
+                             (now - self.retention_days * 86400,))
+            self._db.commit()
+        if skipped:
+            logger.warning(f"Alert outbox: ALERT_API_URL not configured, {len(skipped)} alerts kept pending")
+        if failed:
+            dead = sum(1 for f in failed if f[0] == "dead")
+            logger.warning(f"Alert outbox: {len(failed)} deliveries failed, {dead} given up, "
+                           f"{len(failed) - dead} retrying with backoff")
+        return len(sent)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                if self.drain_once() >= self.batch_size:
+                    continue  # more may be due right away
+            except Exception as e:
+                logger.exception(f"Alert outbox worker error: {e}")
+            self._wake.wait(OUTBOX_POLL_SECONDS)
+
+    def start(self):
+        """Start the background delivery thread (idempotent)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="alert-outbox", daemon=True)
+            self._thread.start()
+        return self
+
+    def flush(self, timeout=OUTBOX_FLUSH_TIMEOUT) -> bool:
+        """Wait until nothing is due (or timeout); True when the outbox is drained."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                due = self._db.execute(
+                    "SELECT count(*) FROM outbox WHERE status = 'pending' AND next_attempt_at <= ?", (time.time(),)
+                ).fetchone()[0]
+            if not due:
+                return True
+            self._wake.set()
+            time.sleep(0.05)
+        return False
+
+    def stop(self, flush_timeout=OUTBOX_FLUSH_TIMEOUT):
+        if self._thread is not None and self._thread.is_alive():
+            self.flush(flush_timeout)
+            self._stop.set()
+            self._wake.set()
+            self._thread.join(timeout=5)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, count(*) FROM outbox GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in ("pending", "sent", "dead")}
+
+_outbox = None
+
+def get_alert_outbox():
+    """Process-wide outbox with its worker running, or None when ALERT_OUTBOX is disabled"""
+    global _outbox
+    if not OUTBOX_ENABLED:
+        return None
+    if _outbox is None:
+        import atexit
+        _outbox = AlertOutbox().start()
+        atexit.register(_outbox.stop)
+    return _outbox
@@ -1,5 +1,10 @@
 # tools/alert_tool.py
+import asyncio
+import concurrent.futures
+import json
+import logging
 import os
+import time
 import requests
 from tenacity import retry, wait_exponential, stop_after_attempt
 from dotenv import load_dotenv
@@ -7,6 +12,14 @@ from dotenv import load_dotenv
 load_dotenv()
 ALERT_API_URL = os.getenv("ALERT_API_URL")
 ALERT_API_KEY = os.getenv("ALERT_API_KEY")
+# Optional endpoint accepting a JSON list of payloads; when set, alerts are posted in batches
+ALERT_API_BATCH_URL = os.getenv("ALERT_API_BATCH_URL")
+ALERT_BATCH_SIZE = int(os.getenv("ALERT_BATCH_SIZE", "50"))
+ALERT_CONCURRENCY = int(os.getenv("ALERT_CONCURRENCY", "16"))
+ALERT_TIMEOUT = float(os.getenv("ALERT_TIMEOUT", "10"))
+ALERT_MAX_ATTEMPTS = int(os.getenv("ALERT_MAX_ATTEMPTS", "3"))
+
+logger = logging.getLogger("alert_tool")
 
 HEADERS = {
     "Content-Type": "application/json",
@@ -23,4 +36,117 @@ def send_incident_alert(payload: dict):
     #     raise RuntimeError("ALERT_API_URL not configured")
     # resp = requests.post(ALERT_API_URL, json=payload, headers=HEADERS, timeout=10)
     # resp.raise_for_status()
-    return dict
\ No newline at end of file
+    return dict
+
+class AsyncAlertClient:
+    """
+    httpx.AsyncClient with a keep-alive pool sized to `concurrency`; a
+    semaphore bounds requests in flight. Connection errors, 5xx and 429 are
+    retried with the same exponential backoff as send_incident_alert
+    (0.5 s * 2^n, 1-3 s); other errors fail at once.
+
+        async with AsyncAlertClient() as client:
+            results = await client.send_all(payloads)
+
+    Every result is {"response", "latency_ms", "attempts"} plus "error" and
+    "retryable" when delivery failed, or "skipped" when no URL is configured;
+    failures never raise out of send_all.
+    """
+    def __init__(self, url=ALERT_API_URL, batch_url=ALERT_API_BATCH_URL, batch_size=ALERT_BATCH_SIZE,
+                 concurrency=ALERT_CONCURRENCY, timeout=ALERT_TIMEOUT, max_attempts=ALERT_MAX_ATTEMPTS):
+        self.url = url
+        self.batch_url = batch_url
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self._http = None
+        self._slots = None
+
+    async def __aenter__(self):
+        import httpx
+        # Bound to the running event loop, so created here rather than in __init__
+        self._http = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        )
+        self._slots = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._http.aclose()
+
+    async def _post(self, url, body, headers=None):
+        import httpx
+        attempts = 0
+        t0 = time.perf_counter()
+        try:
+            # Serialized here: evidence rows carry datetimes, which httpx's json= rejects
+            content = json.dumps(body, default=str)
+        except ValueError as e:  # circular reference
+            logger.warning(f"Alert for {url} not serializable: {e}")
+            return {"response": None, "error": str(e), "retryable": False, "latency_ms": 0.0, "attempts": 0}
+        async with self._slots:
+            while True:
+                attempts += 1
+                try:
+                    resp = await self._http.post(url, content=content, headers=headers)
+                    resp.raise_for_status()
+                    response = resp.json() if resp.content else {"status_code": resp.status_code}
+                    return {"response": response, "latency_ms": (time.perf_counter() - t0) * 1000,
+                            "attempts": attempts}
+                except Exception as e:
+                    # Only connection errors, 5xx and 429 can succeed on a later attempt
+                    retryable = isinstance(e, httpx.TransportError) or (
+                        isinstance(e, httpx.HTTPStatusError)
+                        and (e.response.status_code >= 500 or e.response.status_code == 429))
+                    if not retryable or attempts >= self.max_attempts:
+                        logger.warning(f"Alert POST to {url} failed after {attempts} attempts: {e}")
+                        return {"response": None, "error": str(e), "retryable": retryable,
+                                "latency_ms": (time.perf_counter() - t0) * 1000, "attempts": attempts}
+                    await asyncio.sleep(min(max(0.5 * 2 ** attempts, 1), 3))
+
+    async def send(self, payload: dict):
+        if not self.url:
+            # Same as send_incident_alert while the endpoint is not configured
+            return {"response": {"status": "skipped", "reason": "ALERT_API_URL not configured"},
+                    "skipped": True, "latency_ms": 0.0, "attempts": 0}
+        key = payload.get("idempotency_key")
+        return await self._post(self.url, payload, {"Idempotency-Key": key} if key else None)
+
+    async def _send_batch(self, payloads):
+        result = await self._post(self.batch_url, payloads)
+        response = result["response"]
+        per_alert = response if isinstance(response, list) and len(response) == len(payloads) else None
+        return [dict(result, response=per_alert[i] if per_alert else response) for i in range(len(payloads))]
+
+    async def send_all(self, payloads):
+        """Deliver all payloads concurrently; results in payload order."""
+        payloads = list(payloads)
+        if self.batch_url:
+            chunks = [payloads[i:i + self.batch_size] for i in range(0, len(payloads), self.batch_size)]
+            batches = await asyncio.gather(*(self._send_batch(c) for c in chunks))
+            return [r for batch in batches for r in batch]
+        return list(await asyncio.gather(*(self.send(p) for p in payloads)))
+
+async def send_incident_alerts_async(payloads, **client_kwargs):
+    async with AsyncAlertClient(**client_kwargs) as client:
+        return await client.send_all(payloads)
+
+def dispatch_alerts(payloads, **client_kwargs):
+    """
+    Synchronous entry point for send_incident_alerts_async. When called from
+    inside a running event loop (async crew, notebook) the alerts are sent on
+    a private loop in a worker thread instead of nesting asyncio.run.
+    """
+    payloads = list(payloads)
+    if not payloads:
+        return []
+    coro = send_incident_alerts_async(payloads, **client_kwargs)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
@@ -0,0 +1,192 @@
+# tools/bruteforce_detector.py
+"""
+Streaming brute-force -> success detector.
+
+Runs the check from tasks/siem_tasks.py (>= threshold failed logins per
+(ip, tenant_id) within the window, then a success from the same IP within
+300 s of the last failure) directly over a login event stream, with no
+ClickHouse round trips.
+
+Per IP the detector keeps, for each tenant, a deque of time-bucketed failure
+counters (SIEM_BF_BUCKET_SECONDS wide) that is trimmed to the window as
+events arrive. IPs are kept in an OrderedDict in last-activity order, so
+idle IPs are evicted from the front once they can no longer produce an
+incident (TTL = window + success window), and the oldest are dropped past
+SIEM_BF_MAX_IPS.
+
+An incident is emitted as soon as the success arrives, in the same shape
+correlate_successful_logins_action returns (evidence holds that success
+event), and the failure counters for that (ip, tenant_id) are cleared so one
+burst alerts once. Time is event time, not wall-clock time.
+"""
+import calendar
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+
+BF_THRESHOLD = int(os.getenv("SIEM_BF_THRESHOLD", "5"))
+BF_WINDOW_SECONDS = int(os.getenv("SIEM_BF_WINDOW_SECONDS", "600"))
+BF_SUCCESS_WINDOW_SECONDS = int(os.getenv("SIEM_BF_SUCCESS_WINDOW_SECONDS", "300"))
+BF_BUCKET_SECONDS = int(os.getenv("SIEM_BF_BUCKET_SECONDS", "10"))
+BF_MAX_IPS = int(os.getenv("SIEM_BF_MAX_IPS", "1000000"))
+
+def _epoch(value):
+    """event_time (datetime, ClickHouse-style string or epoch number) -> UTC seconds"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is not None:
+        return value.timestamp()
+    return calendar.timegm(value.timetuple()) + value.microsecond / 1e6
+
+class _Failures:
+    __slots__ = ("buckets", "total", "last_epoch")
+
+    def __init__(self):
+        self.buckets = deque()  # [bucket_start, count], oldest first
+        self.total = 0
+        self.last_epoch = 0.0
+
+    def add(self, t, bucket):
+        if self.buckets and self.buckets[-1][0] >= bucket:
+            # Same bucket, or slightly out of order: count it in the newest one
+            self.buckets[-1][1] += 1
+        else:
+            self.buckets.append([bucket, 1])
+        self.total += 1
+        self.last_epoch = max(self.last_epoch, t)
+
+    def trim(self, oldest_bucket):
+        while self.buckets and self.buckets[0][0] < oldest_bucket:
+            self.total -= self.buckets.popleft()[1]
+
+class _IpState:
+    __slots__ = ("tenants", "last_epoch")
+
+    def __init__(self):
+        self.tenants = {}  # tenant_id -> _Failures
+        self.last_epoch = 0.0
+
+class BruteForceDetector:
+    def __init__(self, threshold=BF_THRESHOLD, window_seconds=BF_WINDOW_SECONDS,
+                 success_window_seconds=BF_SUCCESS_WINDOW_SECONDS, bucket_seconds=BF_BUCKET_SECONDS,
+                 max_ips=BF_MAX_IPS):
+        self.threshold = threshold
+        self.window_seconds = window_seconds
+        self.success_window_seconds = success_window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.max_ips = max_ips
+        self.ttl = window_seconds + success_window_seconds
+        self._ips = OrderedDict()  # ip -> _IpState, least recently active first
+        self.watermark = 0.0       # newest event time seen
+        self.events = 0
+        self.incidents = 0
+        self.evicted = 0
+
+    def _evict(self):
+        cutoff = self.watermark - self.ttl
+        while self._ips:
+            state = next(iter(self._ips.values()))
+            if state.last_epoch >= cutoff and len(self._ips) <= self.max_ips:
+                break
+            self._ips.popitem(last=False)
+            self.evicted += 1
+
+    def process(self, event: dict):
+        """Feed one login event; returns the incidents it completes (usually none)."""
+        self.events += 1
+        t = _epoch(event["event_time"])
+        ip = event["ip"]
+        if t > self.watermark:
+            self.watermark = t
+
+        state = self._ips.get(ip)
+        if state is None:
+            state = self._ips[ip] = _IpState()
+        else:
+            self._ips.move_to_end(ip)
+        state.last_epoch = max(state.last_epoch, t)
+
+        incidents = []
+        event_type = event.get("event_type")
+        oldest_bucket = int((t - self.window_seconds) // self.bucket_seconds) * self.bucket_seconds
+        if event_type == "failed":
+            failures = state.tenants.get(event["tenant_id"])
+            if failures is None:
+                failures = state.tenants[event["tenant_id"]] = _Failures()
+            failures.add(t, int(t // self.bucket_seconds) * self.bucket_seconds)
+            failures.trim(oldest_bucket)
+        elif event_type == "success":
+            for tenant_id, failures in list(state.tenants.items()):
+                failures.trim(oldest_bucket)
+                if failures.total >= self.threshold and 0 < t - failures.last_epoch <= self.success_window_seconds:
+                    incidents.append({
+                        "incident_id": str(uuid.uuid4()),
+                        "ip": ip,
+                        "tenant_id": tenant_id,
+                        "failed_count": failures.total,
+                        "evidence": [{
+                            "tenant_id": event.get("tenant_id"),
+                            "user_id": event.get("user_id"),
+                            "ip": ip,
+                            "event_time": event["event_time"],
+                            "event_type": event_type
+                        }]
+                    })
+                    del state.tenants[tenant_id]
+                elif not failures.buckets:
+                    del state.tenants[tenant_id]
+            self.incidents += len(incidents)
+
+        self._evict()
+        return incidents
+
+    def run(self, events):
+        """Yield incidents from an event iterable as they are detected."""
+        for event in events:
+            for incident in self.process(_as_event(event)):
+                yield incident
+
+    def stats(self) -> dict:
+        return {
+            "events": self.events,
+            "incidents": self.incidents,
+            "tracked_ips": len(self._ips),
+            "evicted_ips": self.evicted,
+        }
+
+def _as_event(message):
+    """Accept dicts, JSON text/bytes, or Kafka-style records with a .value"""
+    value = getattr(message, "value", message)
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode("utf-8")
+    if isinstance(value, str):
+        value = json.loads(value)
+    return value
+
+def tail_events(path, follow=False, poll_interval=0.5):
+    """JSON-lines login events from a file; with follow=True keep waiting for appended lines."""
+    with open(path, "r", encoding="utf-8") as f:
+        pending = ""
+        while True:
+            line = f.readline()
+            if not line:
+                if not follow:
+                    break
+                time.sleep(poll_interval)
+                continue
+            pending += line
+            if not pending.endswith("\n") and follow:
+                continue  # partial line still being written
+            text, pending = pending.strip(), ""
+            if text:
+                yield json.loads(text)
+
+def detect_stream(events, detector=None):
+    """Incidents from any login event iterable (Kafka consumer, tail_events(), list...)."""
+    detector = detector or BruteForceDetector()
+    return detector.run(events)
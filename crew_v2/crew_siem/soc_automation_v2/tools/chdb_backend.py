@@ -0,0 +1,71 @@
+# tools/chdb_backend.py
+"""
+Embedded ClickHouse (chDB) backend for query_clickhouse and friends.
+
+Selected with CLICKHOUSE_BACKEND=chdb. Runs the same ClickHouse SQL
+in-process against local Parquet partitions of siem_login_events
+(CHDB_LOGIN_PARQUET glob, default data/siem_login_events/*.parquet), which
+are exposed through a view of the same name. No server, no network.
+
+Server-side {name:Type} parameters are bound with SET param_<name> on the
+session, so SQL runs unchanged on both backends. A chDB session is not
+thread-safe; queries are serialized with a lock.
+
+Needs `pip install chdb` (and pyarrow for query_arrow/query_numpy).
+"""
+import json
+import os
+import threading
+from datetime import date, datetime
+
+CHDB_PATH = os.getenv("CHDB_PATH", "")  # empty = temporary session directory
+CHDB_LOGIN_PARQUET = os.getenv("CHDB_LOGIN_PARQUET", os.path.join("data", "siem_login_events", "*.parquet"))
+
+def _sql_string(text):
+    return "'" + text.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+def _param_text(value):
+    """Python value -> ClickHouse text form of a query parameter"""
+    if isinstance(value, (list, tuple)):
+        return "[" + ",".join(_sql_string(v) if isinstance(v, str) else _param_text(v) for v in value) + "]"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+class ChdbBackend:
+    def __init__(self, path=CHDB_PATH, login_parquet=CHDB_LOGIN_PARQUET):
+        from chdb import session as chs
+        self._session = chs.Session(path) if path else chs.Session()
+        self._lock = threading.Lock()
+        self._session.query("SET output_format_json_quote_64bit_integers = 0")
+        self._session.query(
+            "CREATE VIEW IF NOT EXISTS siem_login_events AS "
+            f"SELECT * FROM file({_sql_string(os.path.abspath(login_parquet))}, Parquet)"
+        )
+
+    def _run(self, sql, params, fmt):
+        with self._lock:
+            for name, value in (params or {}).items():
+                self._session.query(f"SET param_{name} = {_sql_string(_param_text(value))}")
+            return self._session.query(sql, fmt)
+
+    def rows(self, sql, params=None):
+        """(column_names, list of row tuples)"""
+        raw = self._run(sql, params, "JSONCompact").bytes()
+        if not raw:
+            return [], []
+        result = json.loads(raw)
+        return [c["name"] for c in result["meta"]], [tuple(r) for r in result["data"]]
+
+    def command(self, sql, params=None):
+        columns, rows = self.rows(sql, params)
+        if len(columns) == 1 and len(rows) == 1:
+            return rows[0][0]
+        return rows
+
+    def arrow(self, sql, params=None):
+        return self._run(sql, params, "ArrowTable")
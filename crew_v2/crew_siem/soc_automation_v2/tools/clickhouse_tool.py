@@ -1,33 +1,350 @@
 # tools/clickhouse_tool.py
-from clickhouse_connect import get_client
+from collections import deque
+from contextlib import contextmanager
 from dotenv import load_dotenv
+import logging
 import os
+import queue
+import threading
+import time
 from tenacity import retry, wait_exponential, stop_after_attempt
 
 load_dotenv()
+logger = logging.getLogger("clickhouse_tool")
 
 CLICKHOUSE_HOST = os.getenv("CLICKHOUSE_HOST", "localhost")
 CLICKHOUSE_PORT = int(os.getenv("CLICKHOUSE_PORT", "8123"))
 CLICKHOUSE_USER = os.getenv("CLICKHOUSE_USER", "default")
 CLICKHOUSE_PASSWORD = os.getenv("CLICKHOUSE_PASSWORD", "")
+CLICKHOUSE_SECURE = os.getenv("CLICKHOUSE_SECURE", "False").lower() == "true"
+CLICKHOUSE_POOL_SIZE = int(os.getenv("CLICKHOUSE_POOL_SIZE", "8"))
+CLICKHOUSE_POOL_TIMEOUT = float(os.getenv("CLICKHOUSE_POOL_TIMEOUT", "30"))
+# remote: ClickHouse server over HTTP; chdb: embedded engine over local Parquet (tools/chdb_backend.py)
+CLICKHOUSE_BACKEND = os.getenv("CLICKHOUSE_BACKEND", "remote").lower()
+if CLICKHOUSE_BACKEND not in ("remote", "chdb"):
+    raise ValueError(f"CLICKHOUSE_BACKEND must be 'remote' or 'chdb', got {CLICKHOUSE_BACKEND!r}")
 
-def _client():
+def _client(pool_mgr=None):
+    # clickhouse-connect is only needed for the remote backend
+    from clickhouse_connect import get_client
     return get_client(
         host=CLICKHOUSE_HOST,
         port=CLICKHOUSE_PORT,
         username=CLICKHOUSE_USER,
         password=CLICKHOUSE_PASSWORD,
-        secure=True if os.getenv("CLICKHOUSE_SECURE", "False").lower() == "true" else False
+        secure=CLICKHOUSE_SECURE,
+        pool_mgr=pool_mgr,
+        # A pooled client is used by one thread at a time but by many tasks;
+        # a server-side session would serialize and leak state between them
+        autogenerate_session_id=False
     )
 
+class ClickHousePool:
+    """
+    Process-wide pool of clickhouse-connect clients sharing one keep-alive
+    HTTP connection pool. checkout() blocks while `max_size` clients are in
+    use. Clients that raised are dropped instead of being returned. In a
+    forked child the inherited clients (and their sockets) are abandoned and
+    new ones are opened on demand.
+    """
+    def __init__(self, max_size=CLICKHOUSE_POOL_SIZE, timeout=CLICKHOUSE_POOL_TIMEOUT, factory=_client):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.factory = factory
+        self._reset()
+        _pools.append(self)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._http = None
+        self.latencies = deque(maxlen=10000)
+        self.created = 0
+        self.queries = 0
+
+    def _new_client(self):
+        if self._http is None:
+            from clickhouse_connect.driver import httputil
+            self._http = httputil.get_pool_manager(maxsize=self.max_size, num_pools=1, block=False)
+        client = self.factory(self._http)
+        self.created += 1
+        logger.info(f"Opened ClickHouse client {self.created} (pool size {self.max_size}, pid {self._pid})")
+        return client
+
+    @contextmanager
+    def checkout(self):
+        if self._pid != os.getpid():
+            self._reset()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No ClickHouse client free after {self.timeout}s (pool size {self.max_size})")
+        pid = self._pid
+        client = None
+        try:
+            try:
+                client = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    client = self._new_client()
+            yield client
+        except Exception:
+            # Possibly a broken connection: don't hand it to the next caller
+            client = None
+            raise
+        finally:
+            if pid == self._pid:
+                if client is not None:
+                    self._idle.put(client)
+                self._slots.release()
+
+    def record(self, seconds):
+        self.queries += 1
+        self.latencies.append(seconds)
+
+    def stats(self):
+        """Query latency percentiles (ms) over the last 10k queries plus pool counters."""
+        lat = sorted(self.latencies)
+
+        def pct(p):
+            return lat[min(len(lat) - 1, int(p / 100 * len(lat)))] * 1000 if lat else 0.0
+
+        return {
+            "queries": self.queries,
+            "clients_created": self.created,
+            "idle": self._idle.qsize(),
+            "p50_ms": pct(50),
+            "p95_ms": pct(95),
+            "p99_ms": pct(99),
+            "mean_ms": sum(lat) / len(lat) * 1000 if lat else 0.0,
+        }
+
+_pools = []
+
+def _after_fork_in_child():
+    # Locks or sockets held at fork time are unusable here; start over lazily
+    for p in _pools:
+        p._pid = None
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+pool = ClickHousePool()
+
+_local_backend = None
+_local_lock = threading.Lock()
+
+def _local():
+    """The process-wide chDB session (CLICKHOUSE_BACKEND=chdb)."""
+    global _local_backend
+    with _local_lock:
+        if _local_backend is None:
+            from tools.chdb_backend import ChdbBackend
+            _local_backend = ChdbBackend()
+    return _local_backend
+
 @retry(wait=wait_exponential(multiplier=0.5, min=1, max=3), stop=stop_after_attempt(3))
 def query_clickhouse(sql: str, params: dict = None):
     """
     Run SQL and return list[dict].
+    `params` are bound server-side ({name:Type} placeholders in the SQL).
     Retries on transient errors.
     """
-    client = _client()
-    # clickhouse-connect supports parameterized queries using format:
-    # but for simplicity we'll do safe formatting by ensuring params are typed and not user input
-    result = client.query_dict(sql)
-    return result
\ No newline at end of file
+    if CLICKHOUSE_BACKEND == "chdb":
+        t0 = time.perf_counter()
+        columns, rows = _local().rows(sql, params)
+        pool.record(time.perf_counter() - t0)
+        return [dict(zip(columns, row)) for row in rows]
+    with pool.checkout() as client:
+        t0 = time.perf_counter()
+        result = list(client.query(sql, parameters=params).named_results())
+        pool.record(time.perf_counter() - t0)
+    return result
+
+def _row_blocks(sql, params):
+    if CLICKHOUSE_BACKEND == "chdb":
+        t0 = time.perf_counter()
+        columns, rows = _local().rows(sql, params)
+        pool.record(time.perf_counter() - t0)
+        if rows:
+            yield columns, rows
+        return
+    with pool.checkout() as client:
+        t0 = time.perf_counter()
+        with client.query_row_block_stream(sql, parameters=params) as stream:
+            columns = stream.source.column_names
+            for block in stream:
+                yield columns, block
+        pool.record(time.perf_counter() - t0)
+
+def _column_blocks(sql, params):
+    if CLICKHOUSE_BACKEND == "chdb":
+        t0 = time.perf_counter()
+        columns, rows = _local().rows(sql, params)
+        pool.record(time.perf_counter() - t0)
+        if rows:
+            yield columns, [list(col) for col in zip(*rows)]
+        return
+    with pool.checkout() as client:
+        t0 = time.perf_counter()
+        with client.query_column_block_stream(sql, parameters=params) as stream:
+            columns = stream.source.column_names
+            for block in stream:
+                yield columns, block
+        pool.record(time.perf_counter() - t0)
+
+@retry(wait=wait_exponential(multiplier=0.5, min=1, max=3), stop=stop_after_attempt(3))
+def _open_stream(blocks_fn, sql, params):
+    """Start a block stream and read its first block, retrying on transient errors."""
+    blocks = blocks_fn(sql, params)
+    return next(blocks, None), blocks
+
+def stream_row_blocks(sql: str, params: dict = None):
+    """
+    Yield (column_names, rows) blocks as the server sends them; rows are
+    tuples, so no per-row dict is built. The pooled client stays checked out
+    until the generator is exhausted or closed. Errors before the first block
+    are retried like query_clickhouse; later ones propagate, since blocks
+    already yielded can't be taken back.
+    """
+    first, blocks = _open_stream(_row_blocks, sql, params)
+    if first is not None:
+        yield first
+        yield from blocks
+
+def stream_column_blocks(sql: str, params: dict = None):
+    """Yield (column_names, columns) blocks: one sequence per column per block (retried like stream_row_blocks)."""
+    first, blocks = _open_stream(_column_blocks, sql, params)
+    if first is not None:
+        yield first
+        yield from blocks
+
+@retry(wait=wait_exponential(multiplier=0.5, min=1, max=3), stop=stop_after_attempt(3))
+def query_numpy(sql: str, params: dict = None):
+    """Whole result as a NumPy (structured) array."""
+    if CLICKHOUSE_BACKEND == "chdb":
+        import numpy as np
+        table = query_arrow(sql, params)
+        return np.rec.fromarrays([c.to_numpy(zero_copy_only=False) for c in table.columns],
+                                 names=table.column_names)
+    with pool.checkout() as client:
+        t0 = time.perf_counter()
+        result = client.query_np(sql, parameters=params)
+        pool.record(time.perf_counter() - t0)
+    return result
+
+@retry(wait=wait_exponential(multiplier=0.5, min=1, max=3), stop=stop_after_attempt(3))
+def query_arrow(sql: str, params: dict = None):
+    """Whole result as a pyarrow Table (needs `pip install pyarrow`)."""
+    if CLICKHOUSE_BACKEND == "chdb":
+        t0 = time.perf_counter()
+        result = _local().arrow(sql, params)
+        pool.record(time.perf_counter() - t0)
+        return result
+    with pool.checkout() as client:
+        t0 = time.perf_counter()
+        result = client.query_arrow(sql, parameters=params)
+        pool.record(time.perf_counter() - t0)
+    return result
+
+@retry(wait=wait_exponential(multiplier=0.5, min=1, max=3), stop=stop_after_attempt(3))
+def command_clickhouse(sql: str, params: dict = None):
+    """Run DDL/INSERT ... SELECT (no result set); returns the server's summary or scalar."""
+    if CLICKHOUSE_BACKEND == "chdb":
+        return _local().command(sql, params)
+    with pool.checkout() as client:
+        t0 = time.perf_counter()
+        result = client.command(sql, parameters=params)
+        pool.record(time.perf_counter() - t0)
+    return result
+
+# Minute rollup of failed logins, maintained by a materialized view on insert.
+# SimpleAggregateFunction columns are merged in place by AggregatingMergeTree
+# and read back with plain sum/min/max. Sorted by minute first because every
+# reader filters on a recent time range.
+LOGIN_ROLLUP_DDL = """
+CREATE TABLE IF NOT EXISTS {rollup}
+(
+    minute DateTime,
+    tenant_id String,
+    ip String,
+    failed_count SimpleAggregateFunction(sum, UInt64),
+    first_seen SimpleAggregateFunction(min, DateTime64(3)),
+    last_seen SimpleAggregateFunction(max, DateTime64(3))
+)
+ENGINE = AggregatingMergeTree()
+PARTITION BY toYYYYMM(minute)
+ORDER BY (minute, ip, tenant_id)
+"""
+
+LOGIN_ROLLUP_SELECT = """
+SELECT
+  toStartOfMinute(event_time) AS minute,
+  tenant_id,
+  ip,
+  count() AS failed_count,
+  min(event_time) AS first_seen,
+  max(event_time) AS last_seen
+FROM {source}
+WHERE event_type = 'failed'{where}
+GROUP BY minute, tenant_id, ip
+"""
+
+# Seconds between choosing the view/backfill cutoff and the cutoff itself;
+# the view must be created within it
+LOGIN_ROLLUP_CUTOFF_LEAD = int(os.getenv("LOGIN_ROLLUP_CUTOFF_LEAD", "5"))
+
+_rollups_ready = set()
+
+def ensure_login_rollups(source="siem_login_events", rollup="siem_login_failures_1m", backfill=True):
+    """
+    Create the failed-login minute rollup and its materialized view if missing.
+    The split between the view and the backfill is a cutoff a few seconds
+    ahead (LOGIN_ROLLUP_CUTOFF_LEAD): the view only aggregates event_time >=
+    cutoff and exists before the clock reaches it, so it sees every such row;
+    once the cutoff has passed, rows with event_time < cutoff are backfilled
+    when backfill is set. No row is counted by both and none falls between.
+    Rows that arrive after the backfill with event_time before the cutoff, or
+    with a timestamp ahead of the clock before the view existed, are not in
+    the rollup. Idempotent; cached per process.
+
+    Returns False for the chdb backend's default source, a view over local
+    Parquet partitions that gets no inserts to maintain a rollup from, so
+    callers query raw events instead. MergeTree sources work on both backends.
+    """
+    if CLICKHOUSE_BACKEND == "chdb" and source == "siem_login_events":
+        return False
+    if (source, rollup) in _rollups_ready:
+        return True
+    view = f"{rollup}_mv"
+    existed = int(command_clickhouse(f"EXISTS TABLE {view}") or 0)
+    command_clickhouse(LOGIN_ROLLUP_DDL.format(rollup=rollup))
+    if not existed:
+        cutoff = command_clickhouse(f"SELECT toString(now64(3) + toIntervalSecond({LOGIN_ROLLUP_CUTOFF_LEAD}))")
+        # A view's SELECT can't take query parameters; cutoff is the server's own timestamp text
+        command_clickhouse(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {view} TO {rollup} AS "
+                           + LOGIN_ROLLUP_SELECT.format(
+                               source=source, where=f"\n  AND event_time >= toDateTime64('{cutoff}', 3)"))
+        ahead_ms = int(command_clickhouse(
+            "SELECT dateDiff('millisecond', now64(3), toDateTime64({cutoff:String}, 3))", {"cutoff": cutoff}))
+        if ahead_ms <= 0:
+            # Rows at or after the cutoff may have been inserted before the view existed
+            command_clickhouse(f"DROP VIEW IF EXISTS {view}")
+            raise RuntimeError(f"Creating {view} took longer than LOGIN_ROLLUP_CUTOFF_LEAD "
+                               f"({LOGIN_ROLLUP_CUTOFF_LEAD}s); raise it and retry")
+        if backfill:
+            # Only once the cutoff has passed are all rows before it (bar late ones) in source
+            time.sleep(ahead_ms / 1000)
+            t0 = time.perf_counter()
+            command_clickhouse(
+                f"INSERT INTO {rollup} "
+                + LOGIN_ROLLUP_SELECT.format(source=source, where="\n  AND event_time < {cutoff:DateTime64(3)}"),
+                {"cutoff": cutoff}
+            )
+            logger.info(f"Backfilled {rollup} from {source} up to {cutoff} in {time.perf_counter() - t0:.1f}s")
+    _rollups_ready.add((source, rollup))
+    return True
+
+def query_stats():
+    """Latency percentiles and connection reuse of query_clickhouse in this process."""
+    return pool.stats()
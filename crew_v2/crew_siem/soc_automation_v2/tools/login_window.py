@@ -0,0 +1,76 @@
+# tools/login_window.py
+"""
+State for incremental failed-login analysis.
+
+Keeps a high-watermark of the event_time already scanned and, per
+(ip, tenant_id), minute buckets of [failed_count, first_seen, last_seen].
+Each run only reads rows past the watermark, folds them into the buckets,
+drops buckets that slid out of the window and reports the keys whose
+windowed failure count reaches the threshold. The window is evaluated at
+minute granularity, so it may include up to one extra partial minute.
+
+State is a JSON file written atomically after every run.
+"""
+import json
+import os
+import time
+
+class FailedLoginWindow:
+    def __init__(self, path, window_minutes=10):
+        self.path = path
+        self.window_minutes = window_minutes
+        self.watermark = None
+        self.buckets = {}  # "ip|tenant_id" -> {minute_epoch: [failed, first_seen, last_seen]}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.watermark = state.get("watermark")
+            for key, minutes in state.get("buckets", {}).items():
+                self.buckets[key] = {int(m): v for m, v in minutes.items()}
+
+    def add(self, ip, tenant_id, minute, failed, first_seen, last_seen):
+        key = f"{ip}|{tenant_id}"
+        bucket = self.buckets.setdefault(key, {}).get(int(minute))
+        if bucket is None:
+            self.buckets[key][int(minute)] = [int(failed), str(first_seen), str(last_seen)]
+        else:
+            bucket[0] += int(failed)
+            bucket[1] = min(bucket[1], str(first_seen))
+            bucket[2] = max(bucket[2], str(last_seen))
+
+    def evict(self, now_epoch):
+        """Drop buckets older than the window ending at now_epoch."""
+        oldest = (int(now_epoch) // 60 - self.window_minutes) * 60
+        for key in list(self.buckets):
+            minutes = self.buckets[key]
+            for m in [m for m in minutes if m < oldest]:
+                del minutes[m]
+            if not minutes:
+                del self.buckets[key]
+
+    def over_threshold(self, threshold, limit=100):
+        """Same rows as the windowed GROUP BY ip, tenant_id HAVING failed_count >= threshold."""
+        results = []
+        for key, minutes in self.buckets.items():
+            failed = sum(b[0] for b in minutes.values())
+            if failed >= threshold:
+                ip, tenant_id = key.split("|", 1)
+                results.append({
+                    "ip": ip,
+                    "tenant_id": tenant_id,
+                    "failed_count": failed,
+                    "first_seen": min(b[1] for b in minutes.values()),
+                    "last_seen": max(b[2] for b in minutes.values())
+                })
+        results.sort(key=lambda r: r["failed_count"], reverse=True)
+        return results[:limit]
+
+    def save(self, watermark):
+        self.watermark = watermark
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"watermark": watermark, "updated_at": time.time(), "buckets": self.buckets}, f)
+        os.replace(tmp, self.path)
@@ -1,5 +1,4 @@
 from pymilvus import (
-    connections,
     FieldSchema,
     CollectionSchema,
     DataType,
@@ -12,6 +11,7 @@ import random
 import time
 from dotenv import load_dotenv
 import logging
+from tools.milvus_conn import MilvusConnection
 
 load_dotenv()
 
@@ -24,51 +24,60 @@ COLLECTION_NAME = "siem_incidents"
 VECTOR_DIM = 384
 
 # -----------------------
-# Connect to Milvus / Zilliz Cloud
+# Milvus / Zilliz Cloud connection (opened lazily on first use)
 # -----------------------
-connections.connect(
+milvus = MilvusConnection(
     alias="default",
     host=MILVUS_HOST,
     port="443",
     token=MILVUS_TOKEN,
     secure=True
 )
-logger.info("✅ Connected to Milvus")
-
-# -----------------------
-# Drop and recreate collection for clean setup
-# -----------------------
-if utility.has_collection(COLLECTION_NAME):
-    utility.drop_collection(COLLECTION_NAME)
-    logger.info(f"🧹 Dropped existing collection '{COLLECTION_NAME}'")
 
 # -----------------------
 # Define schema
 # -----------------------
-fields = [
-    FieldSchema(name="incident_id", dtype=DataType.VARCHAR, is_primary=True, max_length=64),
-    FieldSchema(name="description_vector", dtype=DataType.FLOAT_VECTOR, dim=VECTOR_DIM),
-    FieldSchema(name="ip", dtype=DataType.VARCHAR, max_length=64),
-    FieldSchema(name="tenant_id", dtype=DataType.VARCHAR, max_length=64),
-    FieldSchema(name="failed_count", dtype=DataType.INT64),
-]
+def _create_collection(name):
+    fields = [
+        FieldSchema(name="incident_id", dtype=DataType.VARCHAR, is_primary=True, max_length=64),
+        FieldSchema(name="description_vector", dtype=DataType.FLOAT_VECTOR, dim=VECTOR_DIM),
+        FieldSchema(name="ip", dtype=DataType.VARCHAR, max_length=64),
+        FieldSchema(name="tenant_id", dtype=DataType.VARCHAR, max_length=64),
+        FieldSchema(name="failed_count", dtype=DataType.INT64),
+    ]
 
-schema = CollectionSchema(fields, description="SIEM incidents with vector embeddings")
+    schema = CollectionSchema(fields, description="SIEM incidents with vector embeddings")
 
-collection = Collection(name=COLLECTION_NAME, schema=schema)
-logger.info(f"✅ Created collection '{COLLECTION_NAME}'")
+    collection = Collection(name=name, schema=schema)
+    logger.info(f"✅ Created collection '{name}'")
+
+    # -----------------------
+    # Create index (AUTOINDEX avoids async delay)
+    # -----------------------
+    index_params = {
+        "index_type": "AUTOINDEX",
+        "metric_type": "COSINE",
+        "params": {}
+    }
+    logger.info("🔧 Creating index (AUTOINDEX)...")
+    collection.create_index("description_vector", index_params)
+    logger.info("✅ AUTOINDEX created successfully")
+    return collection
+
+def get_collection():
+    """Create-if-missing and load the incidents collection once per process."""
+    return milvus.ensure_loaded(COLLECTION_NAME, create=_create_collection)
 
 # -----------------------
-# Create index (AUTOINDEX avoids async delay)
+# Drop and recreate collection for clean setup (explicit only)
 # -----------------------
-index_params = {
-    "index_type": "AUTOINDEX",
-    "metric_type": "COSINE",
-    "params": {}
-}
-logger.info("🔧 Creating index (AUTOINDEX)...")
-collection.create_index("description_vector", index_params)
-logger.info("✅ AUTOINDEX created successfully")
+def reset_collection():
+    milvus.connect()
+    if utility.has_collection(COLLECTION_NAME):
+        utility.drop_collection(COLLECTION_NAME)
+        logger.info(f"🧹 Dropped existing collection '{COLLECTION_NAME}'")
+    milvus.forget(COLLECTION_NAME)
+    return get_collection()
 
 # -----------------------
 # Function to store incidents
@@ -88,16 +97,14 @@ def store_incidents_to_milvus(incidents):
         tenants.append(inc.get("tenant_id", ""))
         failed_counts.append(inc.get("failed_count", 0))
 
-    # Insert and flush
+    # Insert (collection is created and loaded once, on first use)
+    collection = get_collection()
     collection.insert([incident_ids, vectors, ips, tenants, failed_counts])
+    # Bounded consistency by default, and query_milvus may run in another
+    # process: seal the segment so the new incidents are searchable at once
     collection.flush()
     logger.info(f"✅ Inserted {len(incident_ids)} incidents")
 
-    # Load collection
-    logger.info("📦 Loading collection into memory...")
-    collection.load()
-    logger.info(f"✅ Collection '{COLLECTION_NAME}' loaded into memory")
-
     return len(incident_ids)
 
 
@@ -120,4 +127,5 @@ if __name__ == "__main__":
         }
     ]
 
+    reset_collection()
     store_incidents_to_milvus(sample_incidents)
\ No newline at end of file
@@ -0,0 +1,81 @@
+"""
+Parallel extraction scaling benchmark: stream_events_parallel() on a
+synthetic log file with 1/2/4/8 worker processes.
+
+The log is generated once (--size-mb, default 2048) and reused on later runs.
+Each run consumes the whole event stream in file order and reports MB/s,
+lines/s and the speedup over one worker. Event counts must match across
+worker counts.
+
+Usage:
+    uv run python bench_parallel_extract.py
+    uv run python bench_parallel_extract.py --size-mb 4096 --workers 1 2 4 8 16 --log /data/bench.log
+"""
+import argparse
+import os
+import random
+import time
+
+from agents.agents import stream_events_parallel
+
+# ~5% of lines trip a rule, like a typical firewall/EDR export
+BENIGN = [
+    "{ts} NOTICE fw accept tcp 10.1.{a}.{b}:{p} -> 52.{a}.{b}.7:443 bytes={n}",
+    "{ts} INFO sshd[{n}]: Accepted publickey for deploy from 10.0.{a}.{b} port {p}",
+    "{ts} INFO edr process_start pid={n} image=C:\\Windows\\System32\\svchost.exe",
+    "{ts} DEBUG dns query A api{a}.example.com from 10.2.{a}.{b}",
+]
+MALICIOUS = [
+    "{ts} WARNING edr suspicious powershell -enc pid={n} host=WS-{a}",
+    "{ts} ALERT ids C2 beacon 10.3.{a}.{b} -> 203.0.113.{b}:{p}",
+    "{ts} CRITICAL edr ransomware encryption burst on host WS-{a}",
+]
+
+def generate_log(path, size_mb, seed=3):
+    rng = random.Random(seed)
+    target = size_mb << 20
+    written = 0
+    with open(path, "w", buffering=1 << 20) as f:
+        while written < target:
+            chunk = []
+            for _ in range(10000):
+                tpl = rng.choice(MALICIOUS) if rng.random() < 0.05 else rng.choice(BENIGN)
+                chunk.append(tpl.format(ts=f"2025-10-19 14:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}",
+                                        a=rng.randint(0, 255), b=rng.randint(1, 254),
+                                        p=rng.randint(1024, 65535), n=rng.randint(100, 99999)))
+            data = "\n".join(chunk) + "\n"
+            f.write(data)
+            written += len(data)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=2048)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--chunk-mb", type=int, default=64)
+    parser.add_argument("--log", default="bench_extract.log")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.log) or os.path.getsize(args.log) < (args.size_mb << 20):
+        print(f"Generating {args.size_mb} MB synthetic log at {args.log}...")
+        generate_log(args.log, args.size_mb)
+    size_mb = os.path.getsize(args.log) / (1 << 20)
+    with open(args.log, "rb") as f:
+        n_lines = sum(buf.count(b"\n") for buf in iter(lambda: f.read(1 << 24), b""))
+
+    print(f"{size_mb:.0f} MB, {n_lines} lines, {os.cpu_count()} CPUs, {args.chunk_mb} MB chunks")
+    print(f"{'workers':>7s} {'seconds':>8s} {'MB/s':>8s} {'lines/s':>10s} {'events':>9s} {'speedup':>8s}")
+    base = None
+    expected = None
+    for w in args.workers:
+        t0 = time.perf_counter()
+        events = sum(1 for _ in stream_events_parallel(args.log, workers=w, chunk_bytes=args.chunk_mb << 20))
+        elapsed = time.perf_counter() - t0
+        if expected is None:
+            expected = events
+        assert events == expected, f"{w} workers found {events} events, expected {expected}"
+        base = base or elapsed
+        print(f"{w:7d} {elapsed:8.2f} {size_mb / elapsed:8.1f} {n_lines / elapsed:10.0f} "
+              f"{events:9d} {base / elapsed:7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Rule engine benchmark: lines/sec of the compiled matchers vs the old
+per-keyword substring loop as the rule count grows.
+
+Each synthetic rule has 3 random keywords; the bundled rules.json rules are
+always included so a realistic share of lines match.
+
+Usage:
+    uv run python bench_rule_engine.py
+    uv run python bench_rule_engine.py --lines 200000 --rules 10 100 1000 5000 10000
+"""
+import argparse
+import json
+import random
+import string
+import time
+
+from tools.rule_engine import RULES_PATH, RuleEngine
+
+SAMPLE_LINES = [
+    "2025-10-19 14:23:11 WARNING: Suspicious powershell execution detected on host WIN-SRV-{n}",
+    "2025-10-19 14:23:45 ALERT: C2 beacon communication to 192.168.1.{n}:443 blocked",
+    "2025-10-19 14:25:33 INFO: User login successful from 10.0.0.{n}",
+    "2025-10-19 14:25:34 INFO: GET /api/v1/items/{n} 200 12ms",
+    "2025-10-19 14:25:35 DEBUG: cache refresh completed in {n}ms",
+    "2025-10-19 14:26:01 WARNING: Mimikatz credential dumping attempt on DC-{n}",
+    "2025-10-19 14:27:18 NOTICE: firewall accept tcp 10.1.{n}.4:51544 -> 52.1.1.1:443",
+]
+
+def synthetic_rules(n, rng):
+    rules = []
+    for i in range(n):
+        kws = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 12))) for _ in range(3)]
+        rules.append({"name": f"rule_{i}", "keywords": kws, "malware_type": f"type_{i % 50}",
+                      "priority": 200 + i})
+    return rules
+
+def naive_classify(rules, line):
+    # The pre-compiled behaviour: one substring scan per keyword per line
+    lower = line.lower()
+    for rule in rules:
+        if any(kw in lower for kw in rule["keywords"]):
+            return rule["malware_type"]
+    return None
+
+def lines_per_sec(fn, lines):
+    t0 = time.perf_counter()
+    hits = sum(1 for line in lines if fn(line) is not None)
+    return len(lines) / (time.perf_counter() - t0), hits
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=50000)
+    parser.add_argument("--rules", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    lines = [rng.choice(SAMPLE_LINES).format(n=rng.randint(1, 254)) for _ in range(args.lines)]
+    with open(RULES_PATH) as f:
+        base_rules = json.load(f)["rules"]
+
+    matchers = ["regex"]
+    try:
+        import ahocorasick  # noqa: F401
+        matchers.append("aho")
+    except ImportError:
+        print("pyahocorasick not installed: skipping the Aho-Corasick matcher")
+
+    print(f"{args.lines} lines")
+    header = f"{'rules':>6s} {'keywords':>9s} {'naive l/s':>11s}" + "".join(f" {m + ' l/s':>11s}" for m in matchers)
+    print(header)
+    for n in args.rules:
+        rules = sorted(base_rules + synthetic_rules(n, rng), key=lambda r: r["priority"])
+        row = []
+        naive_rate, naive_hits = lines_per_sec(lambda line: naive_classify(rules, line), lines)
+        for m in matchers:
+            engine = RuleEngine(rules, matcher=m)
+            rate, hits = lines_per_sec(engine.classify, lines)
+            assert hits == naive_hits, f"{m}: {hits} matches vs {naive_hits} naive"
+            row.append(rate)
+        print(f"{len(rules):6d} {engine.keyword_count:9d} {naive_rate:11.0f}" + "".join(f" {r:11.0f}" for r in row))
+
+if __name__ == "__main__":
+    main()
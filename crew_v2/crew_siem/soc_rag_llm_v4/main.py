@@ -2,9 +2,12 @@
 Main Pipeline: Extract → Store → Retrieve → Correlate
 """
 
-from agents.agents import extract_events, store_events, retrieve_similar, correlate_incidents
+import argparse
+from agents.agents import (extract_events, store_events, stream_events, stream_events_parallel,
+                           store_event_stream, retrieve_similar_many,
+                           correlate_incidents)
 
-def main():
+def main(log_file=None, batch_size=1000, workers=1):
     # Sample malware logs
     logs = """
 2025-10-19 14:30:22 ALERT ransomware.exe -encrypt C:/Users/victim/Documents
@@ -19,31 +22,50 @@ def main():
     print("CREWAI + MILVUS MALWARE RAG SYSTEM")
     print("="*80 + "\n")
     
-    # Step 1: Extract
-    print("\n[1/4] EXTRACTING EVENTS...")
-    print("-"*80)
-    events = extract_events(logs)
-    
-    if not events:
-        print("⚠️  No events extracted. Exiting.")
-        return
-    
-    print(f"\nExtracted {len(events)} events:")
-    for i, e in enumerate(events, 1):
-        print(f"  {i}. [{e['malware_type']}] {e['summary'][:80]}...")
-    
-    # Step 2: Store
-    print("\n[2/4] STORING IN MILVUS...")
-    print("-"*80)
-    result = store_events(events)
-    print(f"Stored: {result['stored']} events")
+    if log_file:
+        # Steps 1+2 as one pipeline: extract lazily from the file, store in batches
+        print(f"\n[1-2/4] STREAMING {log_file} INTO MILVUS...")
+        print("-"*80)
+        events_iter = stream_events_parallel(log_file, workers) if workers > 1 else stream_events(log_file)
+        result = store_event_stream(events_iter, batch_size=batch_size)
+        print(f"Stored: {result['stored']} of {result['extracted']} events")
+        if not result["first_event"]:
+            print("⚠️  No events extracted. Exiting.")
+            return
+        first_event = result["first_event"]
+        events = [first_event]
+    else:
+        # Step 1: Extract
+        print("\n[1/4] EXTRACTING EVENTS...")
+        print("-"*80)
+        events = extract_events(logs)
+
+        if not events:
+            print("⚠️  No events extracted. Exiting.")
+            return
+
+        print(f"\nExtracted {len(events)} events:")
+        for i, e in enumerate(events, 1):
+            print(f"  {i}. [{e['malware_type']}] {e['summary'][:80]}...")
+
+        # Step 2: Store
+        print("\n[2/4] STORING IN MILVUS...")
+        print("-"*80)
+        result = store_events(events)
+        print(f"Stored: {result['stored']} events")
+        first_event = events[0]
     
     # Step 3: Retrieve
     print("\n[3/4] RETRIEVING SIMILAR INCIDENTS...")
     print("-"*80)
-    query = events[0]["summary"]  # Use first event as query
+    query = first_event["summary"]  # Use first event as query
     print(f"Query: {query[:100]}...")
-    hits = retrieve_similar(query, top_k=5)
+    # Every extracted event in one search round trip; the first one drives the report
+    hits_per_event = retrieve_similar_many([e["summary"] for e in events], top_k=5)
+    hits = hits_per_event[0]
+    for e, event_hits in zip(events[1:], hits_per_event[1:]):
+        if event_hits:
+            print(f"  [{e['malware_type']}] closest: {event_hits[0]['incident_id']} ({event_hits[0]['score']:.3f})")
     
     if hits:
         print(f"\nFound {len(hits)} similar incidents:")
@@ -54,7 +76,7 @@ def main():
     # Step 4: Correlate
     print("\n[4/4] GENERATING CORRELATION REPORT...")
     print("-"*80)
-    report = correlate_incidents(events[0]["summary"], hits)
+    report = correlate_incidents(first_event["summary"], hits)
     
     print("\n" + "="*80)
     print("FINAL CORRELATION REPORT")
@@ -67,4 +89,9 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log-file", help="stream events from this log file instead of the sample logs")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=1, help="extraction processes for --log-file")
+    args = parser.parse_args()
+    main(args.log_file, args.batch_size, args.workers)
@@ -0,0 +1,137 @@
+# tools/rule_engine.py
+"""
+Compiled keyword rules for extract_events.
+
+Every keyword of every rule is matched in a single pass over the lowercased
+line: with pyahocorasick (`pip install pyahocorasick`) through an
+Aho-Corasick automaton, otherwise through one trie-shaped regex that is
+tried at each position. Either way the cost per line depends on the line
+length, not on how many rules are loaded.
+
+Rules come from a JSON file (SIEM_RULES_PATH, default rules.json next to
+this module):
+
+    {"rules": [
+        {"name": "ransomware", "keywords": ["ransom", "encrypt"],
+         "malware_type": "ransomware", "priority": 10},
+        ...
+    ]}
+
+When several rules match a line, the one with the lowest priority value
+decides its malware_type.
+"""
+import json
+import os
+import re
+
+RULES_PATH = os.getenv("SIEM_RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json"))
+# auto | aho | regex
+RULE_MATCHER = os.getenv("SIEM_RULE_MATCHER", "auto")
+
+def _trie_pattern(words):
+    """Regex for a set of literal words, factored on common prefixes ('ab|ac' -> 'a(?:b|c)')."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node):
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        # Greedy optional: the longest keyword starting at a position wins
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+class _RegexMatcher:
+    def __init__(self, keyword_rules):
+        words = sorted(keyword_rules)
+        # Keywords that are prefixes of a longer one also match wherever it matches
+        self._hits = {}
+        for word in words:
+            rules = set()
+            for end in range(1, len(word) + 1):
+                rules |= keyword_rules.get(word[:end], set())
+            self._hits[word] = frozenset(rules)
+        # Zero-width lookahead so overlapping keywords at later offsets are found too
+        self._regex = re.compile(f"(?=({_trie_pattern(words)}))") if words else None
+
+    def __call__(self, lower):
+        found = set()
+        if self._regex is not None:
+            for m in self._regex.finditer(lower):
+                word = m.group(1)
+                if word:
+                    found |= self._hits[word]
+        return found
+
+class _AhoMatcher:
+    def __init__(self, keyword_rules):
+        import ahocorasick
+        self._automaton = ahocorasick.Automaton()
+        for word, rules in keyword_rules.items():
+            self._automaton.add_word(word, frozenset(rules))
+        self._empty = not keyword_rules
+        if not self._empty:
+            self._automaton.make_automaton()
+
+    def __call__(self, lower):
+        found = set()
+        if not self._empty:
+            for _, rules in self._automaton.iter(lower):
+                found |= rules
+        return found
+
+class RuleEngine:
+    def __init__(self, rules, matcher=RULE_MATCHER):
+        # Stable sort: equal priorities keep file order
+        self.rules = sorted(rules, key=lambda r: r.get("priority", 100))
+        keyword_rules = {}
+        for idx, rule in enumerate(self.rules):
+            for kw in rule["keywords"]:
+                kw = kw.lower()
+                if kw:
+                    keyword_rules.setdefault(kw, set()).add(idx)
+        self.keyword_count = len(keyword_rules)
+
+        if matcher not in ("auto", "aho", "regex"):
+            raise ValueError(f"SIEM_RULE_MATCHER must be auto, aho or regex, got {matcher!r}")
+        self.matcher = "regex"
+        if matcher != "regex":
+            try:
+                self._match = _AhoMatcher(keyword_rules)
+                self.matcher = "aho"
+            except ImportError:
+                if matcher == "aho":
+                    raise RuntimeError("pyahocorasick package required for SIEM_RULE_MATCHER=aho")
+        if self.matcher == "regex":
+            self._match = _RegexMatcher(keyword_rules)
+
+    @classmethod
+    def from_file(cls, path=RULES_PATH, matcher=RULE_MATCHER):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f)["rules"], matcher=matcher)
+
+    def match(self, line: str) -> list:
+        """All rules matching the line, highest priority first."""
+        return [self.rules[i] for i in sorted(self._match(line.lower()))]
+
+    def classify(self, line: str):
+        """(malware_type, [matched rule names]) or None when no rule matches."""
+        matched = self.match(line)
+        if not matched:
+            return None
+        return matched[0].get("malware_type", "unknown"), [r["name"] for r in matched]
+
+_engine = None
+
+def get_rule_engine():
+    """Process-wide engine compiled from RULES_PATH on first use"""
+    global _engine
+    if _engine is None:
+        _engine = RuleEngine.from_file()
+    return _engine
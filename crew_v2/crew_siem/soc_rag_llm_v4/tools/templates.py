@@ -0,0 +1,129 @@
+# tools/templates.py
+"""
+Online log template mining (Drain).
+
+Lines are tokenized on whitespace and routed through a fixed-depth prefix
+tree: first by token count, then by their first `depth - 2` tokens (tokens
+containing digits route through a `<*>` wildcard child). At the leaf, the
+line joins the most similar template (share of identical tokens >=
+sim_threshold) and positions where they differ become `<*>`; otherwise it
+starts a new template. The tokens under `<*>` are the line's parameters.
+
+    "Accepted password for bob from 10.0.0.5 port 51544"
+    -> template "Accepted password for <*> from <*> port <*>"
+       params   ["bob", "10.0.0.5", "51544"]
+
+Template IDs are a hash of the line that started the template, so the same
+message shape gets the same ID in every run; a second template started from
+an identical shape gets a "-2", "-3", ... suffix.
+
+Off by default (SIEM_TEMPLATES=true to enable): with templates on, events
+are embedded by template text instead of by summary.
+
+Reference: He et al., "Drain: An Online Log Parsing Approach with Fixed
+Depth Tree", ICWS 2017.
+"""
+import hashlib
+import os
+import re
+import threading
+
+TEMPLATES_ENABLED = os.getenv("SIEM_TEMPLATES", "false").lower() in ("1", "true", "yes")
+TEMPLATE_DEPTH = int(os.getenv("SIEM_TEMPLATE_DEPTH", "4"))
+TEMPLATE_SIM = float(os.getenv("SIEM_TEMPLATE_SIM", "0.4"))
+
+WILDCARD = "<*>"
+# Tokens that are always parameters (numbers, IPs, hex IDs, paths with digits...)
+_VARIABLE = re.compile(r"^(?:[\d.:/\-+]+|0x[0-9a-fA-F]+|[0-9a-fA-F]{8,}|.*\d+\.\d+\.\d+\.\d+.*)$")
+
+def _mask(token):
+    return WILDCARD if _VARIABLE.match(token) else token
+
+class _Template:
+    __slots__ = ("template_id", "tokens", "size")
+
+    def __init__(self, template_id, tokens):
+        self.template_id = template_id
+        self.tokens = list(tokens)
+        self.size = 0
+
+    @property
+    def text(self):
+        return " ".join(self.tokens)
+
+    def similarity(self, tokens):
+        same = sum(1 for a, b in zip(self.tokens, tokens) if a == b and a != WILDCARD)
+        return same / len(tokens) if tokens else 1.0
+
+    def merge(self, tokens):
+        self.tokens = [a if a == b else WILDCARD for a, b in zip(self.tokens, tokens)]
+        self.size += 1
+
+class TemplateMiner:
+    def __init__(self, depth=TEMPLATE_DEPTH, sim_threshold=TEMPLATE_SIM, max_children=100):
+        self.depth = max(depth, 3)
+        self.sim_threshold = sim_threshold
+        self.max_children = max_children
+        self._root = {}  # token count -> prefix tree node
+        self._lock = threading.Lock()
+        self.templates = {}
+        self.lines = 0
+
+    def _leaf(self, tokens):
+        node = self._root.setdefault(len(tokens), {"children": {}, "templates": []})
+        for token in tokens[:self.depth - 2]:
+            key = WILDCARD if any(ch.isdigit() for ch in token) else token
+            children = node["children"]
+            if key not in children and len(children) >= self.max_children:
+                key = WILDCARD
+            node = children.setdefault(key, {"children": {}, "templates": []})
+        return node["templates"]
+
+    def add(self, line: str):
+        """Assign the line to a template -> (template_id, template text, params)."""
+        raw = line.split()
+        tokens = [_mask(t) for t in raw]
+        with self._lock:
+            self.lines += 1
+            candidates = self._leaf(tokens)
+            best, best_sim = None, -1.0
+            for tpl in candidates:
+                sim = tpl.similarity(tokens)
+                if sim > best_sim:
+                    best, best_sim = tpl, sim
+            if best is None or best_sim < self.sim_threshold:
+                best = _Template(self._new_id(tokens), tokens)
+                candidates.append(best)
+                self.templates[best.template_id] = best
+            best.merge(tokens)
+            params = [r for r, t in zip(raw, best.tokens) if t == WILDCARD]
+            return best.template_id, best.text, params
+
+    def _new_id(self, tokens):
+        # Stable across runs for the first template of a shape; later ones
+        # from an identical shape get a suffix instead of replacing it
+        digest = hashlib.blake2b(" ".join(tokens).encode("utf-8"), digest_size=6).hexdigest()
+        template_id, n = f"tpl-{digest}", 1
+        while template_id in self.templates:
+            n += 1
+            template_id = f"tpl-{digest}-{n}"
+        return template_id
+
+    def stats(self) -> dict:
+        n = len(self.templates)
+        return {
+            "lines": self.lines,
+            "templates": n,
+            "compression_ratio": self.lines / n if n else 0.0,
+        }
+
+_miner = None
+
+def get_template_miner():
+    """Process-wide miner, or None when SIEM_TEMPLATES is disabled"""
+    global _miner
+    if not TEMPLATES_ENABLED:
+        return None
+    if _miner is None:
+        _miner = TemplateMiner()
+    return _miner
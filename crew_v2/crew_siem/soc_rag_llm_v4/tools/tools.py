@@ -2,10 +2,11 @@
 Tools: Embedding and Milvus operations
 """
 
-from sentence_transformers import SentenceTransformer
-from pymilvus import connections, FieldSchema, CollectionSchema, DataType, Collection, utility
+import numpy as np
 import os
 from dotenv import load_dotenv
+from tools.embed_engines import load_engine
+from tools.milvus_conn import MilvusConnection
 
 load_dotenv()
 
@@ -14,79 +15,79 @@ MILVUS_HOST = os.getenv("MILVUS_HOST")
 MILVUS_TOKEN = os.getenv("MILVUS_TOKEN")
 COLLECTION_NAME = os.getenv("MILVUS_COLLECTION", "malware_incidents")
 VECTOR_DIM = int(os.getenv("VECTOR_DIM", "384"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+# torch | onnx | onnx-int8 (see tools/embed_engines.py)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+# Session consistency: our own inserts are searchable without collection.flush()
+CONSISTENCY_LEVEL = os.getenv("MILVUS_CONSISTENCY_LEVEL", "Session")
+SEARCH_MAX_NQ = int(os.getenv("MILVUS_SEARCH_MAX_NQ", "1024"))
 
 # ============= EMBEDDINGS =============
 
-print("Loading embedding model...")
-model = SentenceTransformer("all-MiniLM-L6-v2")
+_engine = None
+
+def get_engine():
+    """Embedding engine for EMBED_BACKEND, imported and loaded on first embed (not at import)"""
+    global _engine
+    if _engine is None:
+        print(f"Loading embedding model ({EMBED_BACKEND})...")
+        _engine = load_engine(EMBED_BACKEND, EMBED_MODEL_NAME)
+    return _engine
 
 def embed_text(text: str) -> list:
-    """Convert text to 384-dim vector"""
-    if not text:
-        return [0.0] * VECTOR_DIM
-    vec = model.encode(text).tolist()
-    # Ensure correct dimension
-    if len(vec) < VECTOR_DIM:
-        vec += [0.0] * (VECTOR_DIM - len(vec))
-    elif len(vec) > VECTOR_DIM:
-        vec = vec[:VECTOR_DIM]
-    return vec
+    """Convert text to 384-dim vector (zero vector for empty text)"""
+    return embed_texts([text])[0].tolist()
+
+def embed_texts(texts, batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+    """Embed many texts in length-sorted mini-batches -> float32 array (n, VECTOR_DIM)"""
+    texts = list(texts)
+    out = np.zeros((len(texts), VECTOR_DIM), dtype=np.float32)
+    # Empty strings keep their zero vector, same as embed_text()
+    order = sorted((i for i, t in enumerate(texts) if t), key=lambda i: len(texts[i]), reverse=True)
+    for start in range(0, len(order), batch_size):
+        idx = order[start:start + batch_size]
+        vecs = get_engine().encode([texts[i] for i in idx])
+        dim = min(vecs.shape[1], VECTOR_DIM)
+        out[idx, :dim] = vecs[:, :dim]
+    return out
 
 # ============= MILVUS CONNECTION =============
 
-print(f"Connecting to Milvus at {MILVUS_HOST}...")
-
-# Detect cloud vs local
-is_cloud = "cloud" in MILVUS_HOST.lower() or "zilliz" in MILVUS_HOST.lower()
-
-if is_cloud:
-    connections.connect(
-        alias="default",
-        host=MILVUS_HOST,
-        port="443",
-        token=MILVUS_TOKEN,
-        secure=True
-    )
-else:
+def _connect_kwargs() -> dict:
+    """Cloud (Zilliz, TLS on 443) vs local Milvus connection settings"""
+    host = MILVUS_HOST or "localhost"
+    is_cloud = "cloud" in host.lower() or "zilliz" in host.lower()
+    if is_cloud:
+        return {"host": host, "port": "443", "token": MILVUS_TOKEN, "secure": True}
     # Local connection
     if MILVUS_TOKEN and ":" in MILVUS_TOKEN:
         user, pwd = MILVUS_TOKEN.split(":", 1)
-        connections.connect(
-            alias="default",
-            host=MILVUS_HOST or "localhost",
-            port="19530",
-            user=user,
-            password=pwd
-        )
-    else:
-        connections.connect(
-            alias="default",
-            host=MILVUS_HOST or "localhost",
-            port="19530"
-        )
+        return {"host": host, "port": "19530", "user": user, "password": pwd}
+    return {"host": host, "port": "19530"}
 
-print("✓ Connected to Milvus")
+# Connects on first use, not at import (and reconnects in forked workers)
+milvus = MilvusConnection(alias="default", **_connect_kwargs())
 
 # ============= COLLECTION SETUP =============
 
-def setup_collection():
-    """Create or load collection"""
-    if utility.has_collection(COLLECTION_NAME):
-        col = Collection(COLLECTION_NAME)
-        print(f"✓ Loaded collection: {COLLECTION_NAME}")
-        return col
-    
-    # Create new collection
+def _create_collection(name: str):
+    """Create collection + index"""
+    from pymilvus import FieldSchema, CollectionSchema, DataType, Collection
     fields = [
         FieldSchema(name="incident_id", dtype=DataType.VARCHAR, is_primary=True, max_length=64),
         FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=VECTOR_DIM),
         FieldSchema(name="malware_type", dtype=DataType.VARCHAR, max_length=128),
         FieldSchema(name="summary", dtype=DataType.VARCHAR, max_length=1024),
-        FieldSchema(name="raw", dtype=DataType.VARCHAR, max_length=4096)
+        FieldSchema(name="raw", dtype=DataType.VARCHAR, max_length=4096),
+        # Log template (tools/templates.py) and its parameters as a JSON list
+        FieldSchema(name="template_id", dtype=DataType.VARCHAR, max_length=64),
+        FieldSchema(name="template", dtype=DataType.VARCHAR, max_length=1024),
+        FieldSchema(name="params", dtype=DataType.VARCHAR, max_length=2048)
     ]
     
     schema = CollectionSchema(fields, description="Malware incidents")
-    col = Collection(name=COLLECTION_NAME, schema=schema)
+    col = Collection(name=name, schema=schema, consistency_level=CONSISTENCY_LEVEL)
     
     # Create index
     col.create_index(
@@ -94,10 +95,16 @@ def setup_collection():
         index_params={"index_type": "AUTOINDEX", "metric_type": "COSINE", "params": {}}
     )
     
-    print(f"✓ Created collection: {COLLECTION_NAME}")
+    print(f"✓ Created collection: {name}")
     return col
 
-collection = setup_collection()
+def setup_collection():
+    """Create or load collection (cached handle)"""
+    return milvus.get_collection(COLLECTION_NAME, create=_create_collection)
+
+def get_loaded_collection():
+    """Collection handle, load()ed once per process"""
+    return milvus.ensure_loaded(COLLECTION_NAME, create=_create_collection)
 
 # ============= INSERT DATA =============
 
@@ -107,55 +114,68 @@ def insert_data(records: list) -> int:
         print("⚠️  No records to insert")
         return 0
     
-    # Prepare columnar data
-    ids = [r["incident_id"] for r in records]
-    vecs = [r["vector"] for r in records]
-    types = [r.get("malware_type", "unknown") for r in records]
-    summaries = [r.get("summary", "") for r in records]
-    raws = [r.get("raw", "") for r in records]
+    collection = setup_collection()
     
-    # Insert
-    collection.insert([ids, vecs, types, summaries, raws])
-    collection.flush()
-    collection.load()
+    # Prepare columnar data following the collection's own schema, so
+    # collections created before the template fields were added still work
+    defaults = {"malware_type": "unknown"}
+    columns = [[r.get(f.name, defaults.get(f.name, "")) for r in records]
+               for f in collection.schema.fields]
     
-    print(f"✓ Inserted {len(ids)} records (Total: {collection.num_entities})")
-    return len(ids)
+    # Insert (no flush: sealing a segment per call fragments the collection;
+    # the rows are already searchable under Session consistency)
+    collection.insert(columns)
+    
+    print(f"✓ Inserted {len(records)} records")
+    return len(records)
 
 # ============= SEARCH DATA =============
 
+def search_many(vectors, top_k: int = 5, filter: str = None) -> list:
+    """Search many query vectors in one round trip -> one hit list per vector"""
+    if len(vectors) == 0:
+        return []
+    
+    # Loaded once per process, not on every search
+    collection = get_loaded_collection()
+    
+    data = [v.tolist() if hasattr(v, "tolist") else v for v in vectors]
+    out = []
+    # Milvus caps the number of queries (nq) per request
+    for start in range(0, len(data), SEARCH_MAX_NQ):
+        results = collection.search(
+            data=data[start:start + SEARCH_MAX_NQ],
+            anns_field="vector",
+            param={"metric_type": "COSINE", "params": {"nprobe": 10}},
+            limit=top_k,
+            expr=filter,
+            output_fields=["incident_id", "malware_type", "summary", "raw"],
+            consistency_level=CONSISTENCY_LEVEL
+        )
+        
+        # Parse results
+        for result in results:
+            hits = []
+            for hit in result:
+                hits.append({
+                    "incident_id": hit.entity.get("incident_id"),
+                    "malware_type": hit.entity.get("malware_type"),
+                    "summary": hit.entity.get("summary"),
+                    "raw": hit.entity.get("raw"),
+                    "score": float(hit.distance)
+                })
+            out.append(hits)
+    return out
+
 def search_data(query_text: str, top_k: int = 5) -> list:
     """Search for similar incidents"""
     # Embed query
     query_vec = embed_text(query_text)
     
-    # Ensure collection is loaded
-    collection.load()
-    
-    # Check if collection has data
-    if collection.num_entities == 0:
-        print("⚠️  Collection is empty!")
+    hits = search_many([query_vec], top_k=top_k)[0]
+    if not hits:
+        print("⚠️  No matches (collection may be empty)")
         return []
     
-    # Search
-    results = collection.search(
-        data=[query_vec],
-        anns_field="vector",
-        param={"metric_type": "COSINE", "params": {"nprobe": 10}},
-        limit=top_k,
-        output_fields=["incident_id", "malware_type", "summary", "raw"]
-    )
-    
-    # Parse results
-    hits = []
-    for hit in results[0]:
-        hits.append({
-            "incident_id": hit.entity.get("incident_id"),
-            "malware_type": hit.entity.get("malware_type"),
-            "summary": hit.entity.get("summary"),
-            "raw": hit.entity.get("raw"),
-            "score": float(hit.distance)
-        })
-    
     print(f"✓ Found {len(hits)} similar incidents")
     return hits